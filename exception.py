@@ -7,30 +7,47 @@ Reusable NLP Library - HW3
 exception.py: A set of framework-specific exception classes
 """
 
+# number of items of a large input (e.g., a list of words) that an exception keeps for reference
+MAX_PREVIEW = 20
+
+
+def _preview(values):
+    """ Keep the first few items of a possibly huge input, so that an exception never pins the whole input in memory
+    Args:
+        values (list): input of the failed step
+    Returns:
+        preview (list): at most MAX_PREVIEW items of the input
+    """
+    return list(values[:MAX_PREVIEW]) if isinstance(values, (list, tuple)) else values
+
 
 class DataResultsError(Exception):
     """ A user-defined exception for signaling an issue with creating a dictionary containing the word frequencies,
     overall word count, world length list, and average word lengths of a file
     Attributes:
-        clean_words (list): list of words of interest that are clean
+        labels (list): labels of (at most MAX_PREVIEW of) the documents whose statistics were being computed
+        num_labels (int): number of documents whose statistics were being computed
         msg (str): message shown to user
     """
-    def __init__(self, clean_words, msg=''):
+    def __init__(self, labels, msg=''):
         super().__init__('A dictionary containing the word frequencies, overall word count, world length list, and '
                          'average word lengths could not be made for this file')
-        self.clean_words = clean_words
+        self.labels = _preview(labels)
+        self.num_labels = len(labels)
         self.msg = msg
 
 
 class StopWordError(Exception):
     """ A user-defined exception for signaling an issue with filtering out the stop words from a list of words
     Attributes:
-        words (str): list of words that may have stop words
+        words (list): first words (at most MAX_PREVIEW) of the list that may have stop words
+        num_words (int): number of words in the list
         msg (str): message shown to user
     """
     def __init__(self, words, msg=''):
         super().__init__('Stop words could not be filtered out')
-        self.words = words
+        self.words = _preview(words)
+        self.num_words = len(words)
         self.msg = msg
 
 
@@ -50,13 +67,13 @@ class SaveResultsError(Exception):
     """A user-defined exception for signaling an issue with integrating parsing results into the internal state
     Attributes:
         label (str): unique label for a parsed text file
-        results (dict): the data extracted from the file as a dictionary attribute--> raw data
+        results (list): names of the data extracted from the file (the data itself is not kept)
         msg (str): message shown to user
     """
     def __init__(self, label, results, msg=''):
         super().__init__('Parsing results could not be saved into the internal state')
         self.label = label
-        self.results = results
+        self.results = list(results)
         self.msg = msg
 
 
@@ -116,3 +133,91 @@ class VisualizeError(Exception):
         super().__init__('Visualization(s) could not be plotted')
         self.name = name
         self.msg = msg
+
+
+class StoreError(Exception):
+    """ A user-defined exception for an issue with opening the disk-backed store of the framework's data
+    Attributes:
+        path (str): name of the file the data gets spilled to
+        msg (str): message shown to user
+    """
+    def __init__(self, path, msg=''):
+        super().__init__('The disk-backed store could not be opened')
+        self.path = path
+        self.msg = msg
+
+
+class MergeError(Exception):
+    """ A user-defined exception for an issue with merging two frameworks
+    Attributes:
+        on_conflict (str): label collision policy used for the merge
+        msg (str): message shown to user
+    """
+    def __init__(self, on_conflict='error', msg=''):
+        super().__init__('The frameworks could not be merged')
+        self.on_conflict = on_conflict
+        self.msg = msg
+
+
+class ShardError(Exception):
+    """ A user-defined exception for an issue with saving or loading a shard file
+    Attributes:
+        filename (str): name of the shard file
+        msg (str): message shown to user
+    """
+    def __init__(self, filename, msg=''):
+        super().__init__('The shard file could not be saved or loaded')
+        self.filename = filename
+        self.msg = msg
+
+
+class RegisterMetricError(Exception):
+    """ A user-defined exception for an issue with registering a new statistic with the framework
+    Attributes:
+        name (str): name of the statistic
+        msg (str): message shown to user
+    """
+    def __init__(self, name, msg=''):
+        super().__init__('The statistic could not be registered')
+        self.name = name
+        self.msg = msg
+
+
+class ServeError(Exception):
+    """ A user-defined exception for an issue with starting the analytics server
+    Attributes:
+        host (str): host name the server was supposed to listen on
+        port (int): port the server was supposed to listen on
+        msg (str): message shown to user
+    """
+    def __init__(self, host, port, msg=''):
+        super().__init__('The analytics server could not be started')
+        self.host = host
+        self.port = port
+        self.msg = msg
+
+
+class RemoveError(Exception):
+    """ A user-defined exception for an issue with removing a document from the framework
+    Attributes:
+        label (str): label of the document
+        msg (str): message shown to user
+    """
+    def __init__(self, label, msg=''):
+        super().__init__('The document could not be removed')
+        self.label = label
+        self.msg = msg
+
+
+class QueryParameterError(Exception):
+    """ A user-defined exception for an invalid query string parameter of a request to the analytics server
+    Attributes:
+        name (str): name of the parameter
+        value (str): value of the parameter in the request
+        msg (str): message shown to user
+    """
+    def __init__(self, name, value, msg=''):
+        super().__init__('The query string parameter is invalid')
+        self.name = name
+        self.value = value
+        self.msg = msg
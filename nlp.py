@@ -8,67 +8,305 @@ nlp.py: Core framework class for NLP Comparative Analysis
 """
 
 from collections import Counter, defaultdict
+import functools
+import os
+import pickle
+import threading
+import weakref
 from nltk.corpus import stopwords
+import numpy as np
+import nlp_batch
+import nlp_keyness
+import nlp_metrics
 import nlp_parsers as nlp_par
+import nlp_repeats
+import nlp_sample
+import nlp_topics
+from nlp_dedup import DuplicateIndex
+from nlp_groups import GroupRollups, group_data
+from nlp_server import AnalyticsServer
+from nlp_metrics import TokenBatch
+from nlp_store import DiskData, DiskStore, FilteredMetric, LazyData, Snapshot, SpilledMetric, Vocabulary
 from exception import *
 
+# number of times a snapshot is copied without holding the framework's lock before the copy is made while holding it
+# (a copy is thrown away when a document was registered while it was being made)
+SNAPSHOT_ATTEMPTS = 3
+
 
 class Nlp:
     """ Core framework class for NLP comparative analysis
     Attributes:
-        data (dict): dictionary managing data about the different texts that we register with the framework
+        data (dict): dictionary managing data about the different texts that we register with the framework. Each
+                     text is stored as an array of word ids under 'tokens', and the statistics about it (e.g.,
+                     'wordcount') are computed and memoized the first time they are read
         viz (dict): dictionary that maps the name of the visualization to a visualization function
+        vocab (Vocabulary): mapping between the words of the registered texts and their ids
+        metrics (dict): maps the name of each statistic that can be computed to its (function, dependencies)
+        duplicates (dict): maps the label of each document detected as a (near-)duplicate to the label of the document
+                           it duplicates and their estimated similarity
+        version (int): number of changes made to the registered documents and statistics, used to tell when cached
+                       results are stale
+        viz_version (int): number of changes made to the registered visualizations, used to tell when cached figures
+                           are stale
+        rollups (GroupRollups): running totals of the groups (e.g., albums and eras) that documents were registered
+                                with, updated as documents are registered and removed
+
+    The framework can be shared by several threads: documents are parsed in parallel and published one at a time, and
+    readers (visualize, the HTTP service, exports) work on a read-only snapshot of the data (see Nlp.snapshot)
     """
 
-    def __init__(self):
-        self.data = defaultdict(dict)
+    def __init__(self, store_path=None, dedup=None, dedup_threshold=0.9):
+        """ Initialize the framework
+        Args:
+            store_path (str): optional SQLite file that the data about each text gets spilled to as it is registered.
+                              Values are only paged back into memory when a visualization reads them, so corpora
+                              larger than memory can be analyzed. By default, the data is kept in memory
+            dedup (str): optional handling of documents that duplicate an already registered document: 'flag'
+                         (register them, but record them in duplicates) or 'skip' (record them in duplicates without
+                         registering them). By default, duplicates are not detected
+            dedup_threshold (float): minimum estimated Jaccard similarity of the word shingles of two documents for them
+                                     to be considered near-duplicates
+        """
+        assert dedup in (None, 'flag', 'skip'), 'Duplicates must be handled with "flag" or "skip"'
+
         self.viz = {}
+        self.metrics = dict(nlp_metrics.METRICS)
+        self.duplicates = {}
+        self.dedup = dedup
+        self.version = 0
+        self.viz_version = 0
+        self.rollups = GroupRollups()
+        self.samples = nlp_sample.SampleIndex()
+        self.topic_models = {}
+        self._dedup_index = None if dedup is None else DuplicateIndex(threshold=dedup_threshold)
 
-    @staticmethod
-    def _data_results(clean_words):
-        """ Return data results about an inputted list of words
+        # labels of the registered documents that are still missing each lazily computed statistic
+        self._pending = defaultdict(dict)
+
+        # number of times the tokens of each document were registered, so that snapshots can tell which documents
+        # were replaced since they were taken
+        self._revisions = {}
+
+        # writers hold the lock while publishing changes; readers only hold it to take a snapshot
+        self._lock = threading.RLock()
+        self._snapshot = None
+
+        if store_path is None:
+            self.data = LazyData(self._materialize)
+            self.vocab = Vocabulary()
+        else:
+            assert isinstance(store_path, str), 'The path of the store must be a string'
+            self.data = DiskData(store_path, self._materialize)
+
+            # pick up the documents registered with the store by an earlier session
+            self.vocab = Vocabulary(self.data.store.load_words())
+            self._find_pending()
+
+        # number of words of the vocabulary that are already saved in the store
+        self._saved_words = len(self.vocab)
+
+        # documents registered by an earlier session are indexed so that new documents can be checked against them
+        if self._dedup_index is not None:
+            for label, tokens in self.data.peek('tokens').items():
+                self._dedup_index.add(label, tokens)
+        self._index_groups()
+
+    def _check_duplicate(self, label, tokens):
+        """ Check a document about to be saved against the registered documents, and index it (the caller holds the
+        lock)
         Args:
-            clean_words (list): list of clean words
+            label (str): label of the document
+            tokens (np.ndarray): word ids of the document
         Returns:
-            results (dict): dictionary with data about the inputted words
+            skip (bool): whether the document duplicates a registered document and must not be saved (dedup='skip')
         """
-        # make sure the inputted parameters are valid based on their type
-        assert isinstance(clean_words, list), 'Clean words must be consolidated into a list'
-        assert all(isinstance(clean_word, str) for clean_word in clean_words), 'Clean word list must only contain ' \
-                                                                               'strings before getting used'
+        if self._dedup_index is None:
+            return False
+
+        # a document registered again under its own label is not a duplicate of its older version
+        self._dedup_index.remove(label)
+        duplicate, signature = self._dedup_index.query(tokens)
+
+        if duplicate is not None:
+            self.duplicates[label] = duplicate
+            if self.dedup == 'skip':
+                print('"' + label + '" duplicates "' + duplicate[0] + '" and was skipped')
+                return True
+        else:
+            self.duplicates.pop(label, None)
+
+        self._dedup_index.add(label, tokens, signature=signature)
+        return False
+
+    def _materialize(self, metric):
+        """ Compute and memoize a statistic for the registered documents that do not have it yet
+        Args:
+            metric (str): name of the statistic being read
+        Returns:
+            None (just fills in the internal variable, 'data')
+        """
+        if self._pending.get(metric):
+            self.compute_metrics([metric])
+
+    def compute_metrics(self, metrics=None, batch_size=1024):
+        """ Compute statistics for every registered document that does not have them yet, in one scheduled pass
+        Args:
+            metrics (list): optional names (str) of the statistics to compute (all registered statistics by default).
+                            The statistics they depend on are computed as well
+            batch_size (int): number of documents whose tokens are handed to the statistic functions at once
+        Returns:
+            None (just fills in the internal variable, 'data')
+        """
+        if metrics is None:
+            metrics = list(self.metrics)
+
+        with self._lock:
+            # dependencies come first, and statistics that are already computed for every document are skipped
+            order = [metric for metric in nlp_metrics.schedule(metrics, self.metrics) if self._pending.get(metric)]
+            if not order:
+                return
+
+            # every document missing at least one of the statistics is read once per pass
+            labels = list(dict.fromkeys(label for metric in order for label in self._pending[metric]))
+            tokens = self.data.peek('tokens')
+            line_offsets = self.data.peek('lineoffsets')
+
+            for start in range(0, len(labels), batch_size):
+                chunk = labels[start:start + batch_size]
+                values = self._evaluate(order, chunk, tokens, line_offsets,
+                                        lambda dep, label: self.data.peek(dep)[label])
+
+                # memoize the values of the documents that were missing the statistics
+                for metric in order:
+                    stored = self.data.peek(metric)
+                    pending = self._pending[metric]
+                    for label, value in zip(chunk, values[metric]):
+                        if label in pending:
+                            stored[label] = value
+                            del pending[label]
+
+                self._commit()
+
+    def _evaluate(self, order, chunk, tokens, line_offsets, lookup):
+        """ Compute statistics for one batch of documents
+        Args:
+            order (list): names (str) of the statistics to compute, each after the statistics it depends on
+            chunk (list): labels (str) of the documents
+            tokens (Mapping): maps the label of each document to its tokens
+            line_offsets (Mapping): maps the label of each document to where its lines start
+            lookup (function): returns the stored value of a statistic outside of order for one document
+        Returns:
+            values (dict): maps the name of each statistic in order to its list of values (one per document)
+        """
+        batch = TokenBatch(chunk, [tokens[label] for label in chunk], self.vocab,
+                           [line_offsets[label] if label in line_offsets else None for label in chunk])
+        values = {}
+
+        for metric in order:
+            func, deps = self.metrics[metric]
+            dep_values = {dep: values[dep] if dep in values else [lookup(dep, label) for label in chunk]
+                          for dep in deps}
+
+            try:
+                values[metric] = func(batch, dep_values)
+                assert len(values[metric]) == len(chunk), 'Statistic "' + metric + '" must return one value ' \
+                                                                                   'per document'
+
+            except Exception as e:
+                # throw an error message if the statistic cannot be computed
+                raise DataResultsError(chunk, str(e))
+
+        return values
+
+    def register_metric(self, name, func, deps=()):
+        """ Register a new statistic, computed (like the built-in ones) the first time it is read from data
+        Args:
+            name (str): name that the statistic is stored under in data
+            func (function): function that receives a TokenBatch of documents and a dictionary with the values of the
+                             statistics in deps (one list per statistic), and returns a list with one value per document
+            deps (tuple): names (str) of the statistics that func needs
+        Returns:
+            None (just registers the statistic)
+        """
+        # Ensure the inputted parameters are valid based on their type
+        assert isinstance(name, str), 'The name of the statistic must be a string'
+        assert name != 'tokens', 'The name "tokens" is reserved for the word ids of the documents'
+        assert callable(func), 'You must input a callable function to compute the statistic'
+        assert all(dep in self.metrics for dep in deps), 'A statistic can only depend on registered statistics'
+
+        # the statistic registered under the name so far (if any) comes back if the new one cannot be registered
+        previous = self.metrics.get(name)
 
         try:
-            length = 0
-            for word in clean_words:
-                # add length of word to length variable
-                length += len(word)
-            # compute average word length
-            avg_wl = length / len(clean_words)
-
-            # initialize empty list
-            word_length_list = []
-            for word in clean_words:
-                # append length of word to the new list
-                word_length_list.append(len(word))
-
-            # create a dictionary with info on the frequency of each unique word in a file, the word count of the file,
-            # the lengths of the words, and the average word length of a file
-            results = {
-                'wordcount': Counter(clean_words),
-                'numwords': len(clean_words),
-                'wordlengthlist': word_length_list,
-                'avgwordlength': avg_wl
-            }
+            with self._lock:
+                self.metrics[name] = (func, tuple(deps))
+                nlp_metrics.schedule([name], self.metrics)
+
+                # the statistic (and any statistic relying on a previous version of it) is computed for every document
+                labels = list(self.data.peek('tokens').keys())
+                for metric in nlp_metrics.schedule(list(self.metrics), self.metrics):
+                    if metric == name or name in nlp_metrics.schedule([metric], self.metrics):
+                        self._pending[metric] = dict.fromkeys(labels)
+                self.version += 1
+                self._retire_snapshot()
+
         except Exception as e:
-            # throw an error message if the dictionary cannot be created
-            raise DataResultsError(clean_words, str(e))
+            # throws an error message if the statistic cannot be registered
+            with self._lock:
+                if previous is None:
+                    self.metrics.pop(name, None)
+                else:
+                    self.metrics[name] = previous
+            raise RegisterMetricError(name, str(e))
 
         else:
-            # throw a success message if the dictionary gets created
-            print('Dictionary containing the word frequencies, overall word count, world length list, and average'
-                  'word lengths successfully created')
+            # throws a success message if the statistic is registered
+            print(name, 'is successfully registered as a statistic')
 
-            return results
+    def _find_pending(self):
+        """ Mark the statistics that still have to be computed for documents whose tokens were registered elsewhere
+        (e.g., read from a store or shard)
+        Returns:
+            None (just updates the lazily computed statistics that are pending)
+        """
+        if isinstance(self.data, DiskData):
+            # the store finds every missing (document, statistic) pair at once, instead of one lookup per pair
+            pending = {metric: {} for metric in self.metrics}
+            for label, metric in self.data.store.missing(list(self.metrics)):
+                pending[metric][label] = None
+            self._pending.update(pending)
+
+        else:
+            labels = list(self.data.peek('tokens').keys())
+            for metric in self.metrics:
+                computed = self.data.peek(metric)
+                self._pending[metric] = {label: None for label in labels if label not in computed}
+
+    def _index_groups(self):
+        """ Rebuild the group totals and the sample index from the documents registered elsewhere (e.g., read from a
+        store or shard)
+        Returns:
+            None (just updates rollups and samples)
+        """
+        self.rollups = GroupRollups()
+        self.samples = nlp_sample.SampleIndex()
+        tokens = self.data.peek('tokens')
+        for label in tokens.keys():
+            self.samples.add(label)
+        for label, groups in self.data.peek('groups').items():
+            if label in tokens:
+                self.rollups.add(label, tokens[label], groups)
+
+    def _commit(self):
+        """ Flush the data and any new vocabulary to disk when running out-of-core
+        Returns:
+            None
+        """
+        if isinstance(self.data, DiskData):
+            self.data.store.save_words(self.vocab.words, self._saved_words)
+            self._saved_words = len(self.vocab)
+            self.data.commit()
 
     @staticmethod
     def _filter_stopwords(words):
@@ -101,12 +339,13 @@ class Nlp:
             return clean_words
 
     @staticmethod
-    def _default_parser(filename):
+    def _default_parser(filename, by_line=False):
         """ Parser that reads in a txt file
         Args:
             filename (str): name of the file of interest
+            by_line (bool): whether to return the words of each line of the file separately
         Returns:
-            words (list): list of words (str) from the file
+            words (list): list of words (str) from the file, or one such list per line if by_line is True
         """
         # Checking that the inputted parameters are valid based on their type
         assert filename[-3:] in ('csv', 'txt', 'son', 'xls', 'lsx', 'lsm'), 'File type unsupported. Must input a' \
@@ -115,8 +354,8 @@ class Nlp:
         assert isinstance(filename, str), 'File must be inputted as a string'
 
         try:
-            # initialize empty list to store words
-            words = []
+            # initialize empty lists to store the words of each line
+            lines = []
 
             # open and read the file of interest
             text_file = open(filename, 'r')
@@ -126,22 +365,8 @@ class Nlp:
 
             # filtering the file
             for row in rows_of_text:
-                # remove all break lines
-                row = row.replace('\n', '')
-                # separate the words from each row in the txt file
-                row_words = row.split(' ')
-
-                for word in row_words:
-                    # change all letters to lower case
-                    word = word.lower()
-                    # remove leading and trailing white-spaces
-                    word = word.strip()
-                    # filter out blank words and possible non-words (e.g., 'words' that start with a number)
-                    if word != '' and word[0].isalpha():
-                        # remove punctuation from the end of words
-                        while not word[-1].isalpha():
-                            word = word[:-1]
-                        words.append(word)
+                # remove all break lines, and separate the clean words from each row in the txt file
+                lines.append(nlp_par.line_words(row.replace('\n', '')))
 
             # close the file
             text_file.close()
@@ -153,7 +378,65 @@ class Nlp:
         else:
             # throws a success message if the file is successfully parsed
             print('File is successfully parsed')
-            return words
+            if by_line:
+                return lines
+            return [word for words in lines for word in words]
+
+    def _tokenize_parallel(self, filename, n_jobs, normalize=None):
+        """ Tokenize a large txt file with several processes and join their results
+        Args:
+            filename (str): name of the file of interest
+            n_jobs (int): number of processes
+            normalize (str): optional stemmer or lemmatizer applied to the clean words (see load_text)
+        Returns:
+            tokens (np.ndarray): ids (int32) of the clean words of the file
+            line_offsets (np.ndarray): index of the first clean word of each line, followed by the number of clean
+                                       words
+        """
+        try:
+            parts = nlp_par.tokenize_parallel(filename, Nlp._load_stop_words(), n_jobs)
+
+        except Exception as e:
+            # throws an error message if the file is not parsed
+            raise DefaultParsingError(filename, str(e))
+
+        # each range numbers its words locally, so only its distinct words are looked up in the vocabulary (and
+        # normalized), and its ids are translated with one array lookup
+        token_parts = []
+        line_parts = []
+        shift = 0
+        for words, ids, offsets in parts:
+            if normalize is not None:
+                words = nlp_par.normalize_words(words, normalize)
+            token_parts.append(self.vocab.encode(words)[ids])
+            line_parts.append(offsets[:-1] + shift)
+            shift += len(ids)
+
+        tokens = np.concatenate(token_parts) if token_parts else np.zeros(0, dtype=np.int32)
+        line_offsets = np.concatenate(line_parts + [np.array([shift])]).astype(np.int32)
+
+        # throws a success message if the file is successfully parsed
+        print('File is successfully parsed')
+        return tokens, line_offsets
+
+    @staticmethod
+    def _line_offsets(lines, clean_words):
+        """ Find where each line of a document starts among its clean words (after the stop words are filtered out)
+        Args:
+            lines (list): list of the words (str) of each line of the document
+            clean_words (list): clean words of the whole document
+        Returns:
+            offsets (np.ndarray): index of the first clean word of each line, followed by the number of clean words
+        """
+        offsets = np.zeros(len(lines) + 1, dtype=np.int32)
+        i = 0
+        for n, words in enumerate(lines):
+            # a word is kept exactly when its lower case version is the next clean word, since stop words never are
+            for word in words:
+                if i < len(clean_words) and word.lower() == clean_words[i]:
+                    i += 1
+            offsets[n + 1] = i
+        return offsets
 
     def _save_results(self, label, results):
         """ Integrate parsing results into internal state
@@ -168,23 +451,65 @@ class Nlp:
         assert isinstance(results, dict), 'The data extracted from this file must be stored in a dictionary'
 
         try:
-            # adds the parsing results into the internal state
-            for k, v in results.items():
-                self.data[k][label] = v
+            # the document is published all at once: snapshots are only taken between two writes
+            with self._lock:
+                # the group totals trade the document's earlier contribution (if any) for its new one
+                if 'tokens' in results or 'groups' in results:
+                    old_tokens = self.data.peek('tokens').get(label)
+                    if old_tokens is not None:
+                        self.rollups.remove(label, old_tokens)
+
+                    groups = results.get('groups', self.data.peek('groups').get(label))
+                    tokens = results.get('tokens', old_tokens)
+                    if groups and tokens is not None:
+                        self.rollups.add(label, tokens, groups)
+
+                # adds the parsing results into the internal state
+                for k, v in results.items():
+                    self.data.peek(k)[label] = v
+
+                # a repetition index built from the document's earlier tokens no longer applies
+                if 'tokens' in results:
+                    for k in nlp_repeats.RESULTS:
+                        if k not in results and k in self.data:
+                            self.data.peek(k).pop(label, None)
+
+                # the statistics about new or replaced tokens get (re)computed when they are next read
+                if 'tokens' in results:
+                    self.samples.add(label)
+                    for metric in self.metrics:
+                        self._pending[metric][label] = None
+                    self._revisions[label] = self._revisions.get(label, 0) + 1
+                self.version += 1
+                self._retire_snapshot()
+
+                # flush the results of the document to disk when running out-of-core
+                self._commit()
 
         except Exception as e:
             # throws an error message if the results cannot be saved
-            raise SaveResultsError(label, str(e))
+            raise SaveResultsError(label, results, str(e))
 
-    def load_text(self, filename, label=None, parser=None, text_column='text'):
+    def load_text(self, filename, label=None, parser=None, text_column='text', n_jobs=1, normalize=None, groups=None,
+                  repeats=None):
         """ Register a document with the framework
         Args:
             filename (str): name of the file of interest
             label (str): optional label for file
-            parser (str): optional type of parser to be used
+            parser (str): optional name of a parser registered with nlp_parsers.register_parser (e.g., 'lyrics')
             text_column (str): name of column that has the text of interest
+            n_jobs (int): number of processes that parse the file in parallel. A txt file read by the default parser
+                          (or a CSV file) is split into line-aligned byte ranges, one range per process at a time
+            normalize (str): optional stemmer or lemmatizer applied to the clean words ('porter', 'snowball',
+                             'lancaster', 'wordnet', or a name registered with nlp_parsers.register_normalizer)
+            groups (dict): optional groups of the document at each level of a hierarchy (e.g., {'album': 'Red',
+                           'era': '2012'}), whose totals are kept up to date (see Nlp.rollup)
+            repeats (int): optional minimum length (in clean words) of the repeated spans to look for. If given, a
+                           suffix array and LCP array of the document are stored ('suffixarray', 'lcp'), along with
+                           the share of its words in repeated spans ('repetitionratio'), its longest repeated phrases
+                           ('longestrepeats'), and its most repeated span ('toprepeat')
         Return:
-            None, just registers the document
+            registered (bool): whether the document was registered (False if it was skipped as a duplicate)
         """
         # Ensuring the inputted parameters are valid based on their type
         assert filename[-3:] in ('csv', 'txt', 'son', 'xls', 'lsx', 'lsm'), 'File type unsupported. Must input a' \
@@ -194,38 +519,189 @@ class Nlp:
 
         if label is not None:
             assert isinstance(label, str), 'Label for the text file must be a string'
+        if groups is not None:
+            assert isinstance(groups, dict) and all(isinstance(level, str) and isinstance(group, str)
+                                                    for level, group in groups.items()), \
+                'The groups of the document must map each level (str) to a group (str)'
+        if repeats is not None:
+            assert isinstance(repeats, int) and repeats > 0, 'The minimum length of the repeated spans must be a ' \
+                                                             'positive integer'
 
         try:
-            # do default parsing of standard .txt file
-            if parser is None:
-                words = Nlp._default_parser(filename)
+            # split a standard .txt file across processes, which tokenize it and filter out its stop words
+            if parser is None and n_jobs > 1:
+                tokens, line_offsets = self._tokenize_parallel(filename, n_jobs, normalize)
 
             else:
-                # checking that the custom parser is inputted as a string
-                assert isinstance(parser, str), 'Parser must be a string'
+                # do default parsing of standard .txt file
+                if parser is None:
+                    lines = Nlp._default_parser(filename, by_line=True)
+                    words = [word for line_words in lines for word in line_words]
+
+                else:
+                    # checking that the custom parser is inputted as a string
+                    assert isinstance(parser, str), 'Parser must be a string'
+
+                    # do custom parsing, one batch of rows at a time, keeping the lines the parser found (e.g., one
+                    # per row, or per line of the lyrics)
+                    lines = nlp_par.custom_parser(filename, text_column=text_column, parser=parser, n_jobs=n_jobs,
+                                                  by_line=True)
+                    words = [word for line_words in lines for word in line_words]
+
+                # clean the list of words, removing stopwords
+                clean_words = Nlp._filter_stopwords(words)
+
+                # find where each line starts before the words are normalized
+                line_offsets = Nlp._line_offsets(lines, clean_words)
+                if normalize is not None:
+                    clean_words = nlp_par.normalize_words(clean_words, normalize)
+                tokens = self.vocab.encode(clean_words)
 
-                # do custom parsing for non-.txt files
-                words = nlp_par.custom_parser(filename, text_column=text_column, parser=parser)
+            assert len(tokens) > 0, 'The file must contain at least one word that is not a stop word'
 
-            # clean the list of words, removing stopwords
-            clean_words = Nlp._filter_stopwords(words)
-            # compute statistics/calculations regarding the list of words
-            results = Nlp._data_results(clean_words)
+            # store the clean words compactly as ids, along with where each line starts; statistics about them are
+            # computed when they are first read
+            results = {'tokens': tokens, 'lineoffsets': line_offsets}
+            if groups:
+                results['groups'] = dict(groups)
+
+            # index the repeated spans (choruses, refrains, hooks) of the document
+            if repeats is not None:
+                results.update(nlp_repeats.analyze(results['tokens'], self.vocab, min_length=repeats))
 
             # defining the default label for a file
             if label is None:
                 label = filename
 
-            # Save/integrate the data we extracted from the file into the internal state of the framework
-            self._save_results(label, results)
+            # documents are parsed concurrently, but checked for duplicates and saved one at a time
+            with self._lock:
+                if self._check_duplicate(label, results['tokens']):
+                    return False
+
+                # Save/integrate the data we extracted from the file into the internal state of the framework
+                self._save_results(label, results)
 
         except Exception as e:
             # throws an error message if the document cannot be registered into the framework
-            raise ParserError(filename, str(e))
+            raise ParserError(filename, label=label, parser=parser, text_column=text_column, msg=str(e))
 
         else:
             # throws a success message if the document is successfully registered
             print('Document is successfully registered')
+            return True
+
+    def load_texts(self, filenames, labels=None, groups=None, retries=1, retry_on=(OSError,), quarantine_dir=None,
+                   max_errors=100, **kwargs):
+        """ Register a batch of documents, carrying on past the files that cannot be registered
+        Args:
+            filenames (list): names (str) of the files of interest
+            labels (list): optional label (str) of each file (the file names by default)
+            groups (list): optional groups (dict, see load_text) of each file
+            retries (int): number of times a failed file is attempted again, if the failure may be transient
+            retry_on (tuple): exception types (e.g., OSError for a flaky network share) that are worth retrying
+            quarantine_dir (str): optional directory the files that keep failing are moved to, each next to a JSON
+                                  file describing its error
+            max_errors (int): maximum number of error records kept (failures beyond it are only counted)
+            **kwargs (dict): parameters passed to load_text for every file (e.g., parser='lyrics')
+        Returns:
+            report (BatchReport): labels of the registered documents and of those skipped as duplicates, and
+                                  compact error records of the files that failed (the exceptions themselves are not
+                                  kept, so their tracebacks don't hold on to the words of the failed files)
+        """
+        # Ensure the inputted parameters are valid based on their type
+        assert isinstance(filenames, list), 'The files must be inputted as a list'
+        assert labels is None or (isinstance(labels, list) and len(labels) == len(filenames)), \
+            'There must be one label per file'
+        assert groups is None or (isinstance(groups, list) and len(groups) == len(filenames)), \
+            'There must be one dictionary of groups per file'
+        assert isinstance(retries, int) and retries >= 0, 'The number of retries must be a non-negative integer'
+        assert isinstance(max_errors, int) and max_errors >= 0, 'The number of error records must be a ' \
+                                                                'non-negative integer'
+
+        report = nlp_batch.BatchReport(max_errors=max_errors)
+
+        for i, filename in enumerate(filenames):
+            label = filename if labels is None or labels[i] is None else labels[i]
+            record = None
+            registered = False
+
+            for attempt in range(1, retries + 2):
+                try:
+                    registered = self.load_text(filename, label, groups=None if groups is None else groups[i],
+                                                **kwargs)
+
+                except Exception as e:
+                    # only failures that may be transient are attempted again
+                    if attempt <= retries and nlp_batch.retryable(e, retry_on):
+                        continue
+                    record = nlp_batch.error_record(filename, label, e, attempt)
+
+                break
+
+            if record is None:
+                (report.registered if registered else report.skipped).append(label)
+                continue
+
+            if quarantine_dir is not None and os.path.isfile(filename):
+                try:
+                    report.quarantined.append(nlp_batch.quarantine(record, quarantine_dir))
+                except OSError as e:
+                    record['message'] += ' (could not be quarantined: ' + str(e) + ')'
+            report.add_failure(record)
+
+        # throws a success message summarizing the batch
+        print(len(report.registered), 'of', len(filenames), 'documents successfully registered')
+        return report
+
+    def remove(self, label):
+        """ Unregister a document, along with its statistics and its contribution to the totals of its groups
+        Args:
+            label (str): label of a registered document
+        Returns:
+            None (just updates the internal variable, 'data')
+        """
+        assert isinstance(label, str), 'Label for the text file must be a string'
+
+        try:
+            with self._lock:
+                tokens = self.data.peek('tokens')
+                assert label in tokens, 'No document is registered as "' + label + '"'
+                self.rollups.remove(label, tokens[label])
+                self.samples.remove(label)
+
+                for values in list(dict.values(self.data)):
+                    if label in values:
+                        del values[label]
+                for pending in self._pending.values():
+                    pending.pop(label, None)
+
+                if self._dedup_index is not None:
+                    self._dedup_index.remove(label)
+                self.duplicates.pop(label, None)
+
+                # snapshots taken earlier still hold the document, and must not mistake a new one for it
+                self._revisions[label] = self._revisions.get(label, 0) + 1
+                self.version += 1
+                self._retire_snapshot()
+                self._commit()
+
+        except Exception as e:
+            # throws an error message if the document cannot be removed
+            raise RemoveError(label, str(e))
+
+        else:
+            # throws a success message if the document is removed
+            print(label, 'is successfully removed')
+
+    def close(self):
+        """ Flush and close the disk-backed store, if the framework was created with one
+        Returns:
+            None
+        """
+        with self._lock:
+            if isinstance(self.data, DiskData):
+                self._commit()
+                self.data.close()
 
     @staticmethod
     def _load_stop_words(stopfile=None, parser=None):
@@ -262,7 +738,7 @@ class Nlp:
 
         except Exception as e:
             # throws an error message if the stop words cannot get filtered out
-            raise LoadStopWordError(stopfile, str(e))
+            raise LoadStopWordError(stopfile, parser=parser, msg=str(e))
 
         else:
             # throws a success message if the stop words are filtered out
@@ -286,35 +762,53 @@ class Nlp:
 
         try:
             # add the visualization into the internal state
-            self.viz[name] = (vizfunc, args, kwargs)
+            with self._lock:
+                self.viz[name] = (vizfunc, args, kwargs)
+                self.viz_version += 1
 
         except Exception as e:
             # throws an error message if the visualization cannot get added to the internal state
-            raise LoadVisualizationError(vizfunc, str(e))
+            raise LoadVisualizationError(name, vizfunc, str(e))
 
         else:
             # throws a success message if the visualization is added to the internal state
             print(name, 'is successfully integrated into the internal state')
 
-    def visualize(self, name=None):
+    def visualize(self, name=None, level=None, sample=None, seed=0):
         """ Call the vizfunc to plot the visualization(s)
         Args:
             name (str): optional parameter for the name of a visualization
+            level (str): optional level of the group hierarchy (e.g., 'album') to plot one entry per group of, instead
+                         of one per document
+            sample (float): optional share of the documents (e.g., 0.05) to preview the visualization(s) with, drawn
+                            at random (within each group of level, if given); the figures are labeled with the size of
+                            the sample and the margin of error of the statistic they show
+            seed (int): seed of the sample (the same seed previews the same documents)
         Returns:
             None (just plots the specified visualization(s))
         """
         try:
+            # documents registered while the visualizations are drawn don't show up halfway through
+            with self._lock:
+                data = self.snapshot()
+                viz = dict(self.viz)
+
+            if sample is not None:
+                data = self.sample(sample, seed=seed, stratify=level, data=data)
+            if level is not None:
+                data = self.rollup(level, data)
+
             # run all the visualizations
             if name is None:
-                for _, v in self.viz.items():
+                for _, v in viz.items():
                     vizfunc, args, kwargs = v
-                    vizfunc(self.data, *args, **kwargs)
+                    vizfunc(data, *args, **kwargs)
 
             else:
                 # run only the named visualization
                 assert isinstance(name, str), 'The name of the visualization must be a string'
-                vizfunc, args, kwargs = self.viz[name]
-                vizfunc(self.data, *args, **kwargs)
+                vizfunc, args, kwargs = viz[name]
+                vizfunc(data, *args, **kwargs)
 
         except Exception as e:
             # throws an error message if the visualization(s) cannot get plotted
@@ -323,3 +817,792 @@ class Nlp:
         else:
             # throws a success message if the visualization gets plotted
             print('Visualization(s) successfully plotted')
+
+    def labels(self):
+        """ Return the labels of every registered document, in the order they were registered
+        Returns:
+            labels (list): labels (str) of the registered documents
+        """
+        return Nlp._snapshot_labels(self.snapshot())
+
+    def snapshot(self):
+        """ Return a consistent, read-only view of the registered documents and their statistics, which does not
+        change while other threads keep registering documents. The snapshot is shared by every reader until the data
+        changes, so taking one is cheap
+        Returns:
+            snapshot (Snapshot): the data as of the current version (read it like the data dictionary)
+
+        Statistics that are still computed lazily are filled in the first time they are read from the snapshot. For
+        out-of-core frameworks, the snapshot reads the store through its own read transaction, and the statistics it
+        fills in are kept in memory (call compute_metrics before taking the snapshot to avoid it). The transaction is
+        released as soon as no reader holds the snapshot anymore, since it keeps SQLite from checkpointing the
+        write-ahead log while new documents are registered.
+
+        The data is copied without holding the lock that writers publish documents under, so taking a snapshot of a
+        large corpus doesn't stall them.
+        """
+        with self._lock:
+            snapshot = self._cached_snapshot()
+            if snapshot is not None:
+                return snapshot
+            version = self.version
+
+        # a copy that a writer published a document during is thrown away: the version tells, since writers change it
+        # before releasing the lock
+        for _ in range(SNAPSHOT_ATTEMPTS):
+            snapshot = self._take_snapshot(version)
+            with self._lock:
+                if self.version == version:
+                    return self._cache_snapshot(snapshot)
+                version = self.version
+
+        # the corpus keeps changing, so the last copy is made while writers wait
+        with self._lock:
+            snapshot = self._cached_snapshot()
+            return snapshot if snapshot is not None else self._cache_snapshot(self._take_snapshot(self.version))
+
+    def _cached_snapshot(self):
+        """ Return the cached snapshot if it is still current (the caller holds the lock)
+        Returns:
+            snapshot (Snapshot): the snapshot of the current version, or None
+        """
+        snapshot = self._snapshot
+        if isinstance(snapshot, weakref.ref):
+            snapshot = snapshot()
+        if snapshot is None or snapshot.version != self.version:
+            return None
+        return snapshot
+
+    def _cache_snapshot(self, snapshot):
+        """ Share a snapshot of the current version with the next readers (the caller holds the lock)
+        Args:
+            snapshot (Snapshot): snapshot of the current version
+        Returns:
+            snapshot (Snapshot): the cached snapshot (one taken meanwhile by another reader, if any)
+        """
+        cached = self._cached_snapshot()
+        if cached is not None:
+            return cached
+
+        # the framework only keeps a disk-backed snapshot while its readers do, so that it doesn't hold the read
+        # transaction open until the next snapshot is taken
+        self._snapshot = weakref.ref(snapshot) if isinstance(self.data, DiskData) else snapshot
+        return snapshot
+
+    def _retire_snapshot(self):
+        """ Let go of the cached snapshot once the data has changed (the caller holds the lock). The views derived
+        from a disk-backed snapshot (e.g., group rollups) refer back to it, so they are dropped for the snapshot and its
+        read transaction to be freed as soon as its readers are done, instead of whenever the garbage collector runs
+        Returns:
+            None
+        """
+        snapshot = self._snapshot
+        if isinstance(snapshot, weakref.ref):
+            snapshot = snapshot()
+            if snapshot is not None:
+                # readers still holding the snapshot rebuild the views they ask for again
+                snapshot.views.clear()
+        self._snapshot = None
+
+    def _take_snapshot(self, version):
+        """ Copy the current state of the data into a new snapshot. The caller may not hold the lock, so every
+        dictionary is copied in one step (while holding the GIL), and the caller checks that the version didn't change
+        Args:
+            version (int): version of the data being copied
+        Returns:
+            snapshot (Snapshot): the data as of the version
+        """
+        snapshot = Snapshot(version, dict(self._revisions), self._fill_snapshot)
+
+        # the values memoized for documents that were registered again describe their earlier tokens, so they are left
+        # out and filled in again when the statistic is read
+        pending = {metric: labels for metric, labels in list(self._pending.items()) if labels}
+
+        if isinstance(self.data, DiskData):
+            # the read transaction keeps seeing the store as of now, while new documents are committed
+            store = DiskStore(self.data.store.path, snapshot=True)
+            snapshot.close_with(store)
+            for metric in store.metrics():
+                values = SpilledMetric(store, metric)
+                snapshot.publish(metric, FilteredMetric(values, pending[metric]) if metric in pending else values)
+
+        else:
+            # the copies are shallow: values are replaced when documents are registered again, never modified
+            for metric, values in list(dict.items(self.data)):
+                values = dict(values)
+                if metric in pending:
+                    for label in values.keys() & pending[metric].keys():
+                        del values[label]
+                snapshot.publish(metric, values)
+
+        snapshot.complete.update(metric for metric in list(self.metrics) if metric not in pending)
+        return snapshot
+
+    def _fill_snapshot(self, snapshot, metric):
+        """ Fill in a statistic that was still pending for some documents of a snapshot when it was taken
+        Args:
+            snapshot (Snapshot): snapshot being read
+            metric (str): name of the statistic being read
+        Returns:
+            None (just publishes the complete statistic in the snapshot)
+        """
+        if metric in snapshot.complete or metric not in self.metrics:
+            return
+
+        with snapshot.lock:
+            if metric in snapshot.complete:
+                return
+
+            tokens = snapshot.peek('tokens')
+            known = snapshot.peek(metric)
+            known_labels = set(known.keys())
+            missing = [label for label in tokens.keys() if label not in known_labels]
+            found = {}
+
+            # documents that were not registered again since the snapshot share the framework's memoized values
+            with self._lock:
+                live = self.data.peek(metric)
+                pending = self._pending.get(metric, {})
+                for label in missing:
+                    if label not in pending and self._revisions.get(label, 0) == snapshot.revisions.get(label, 0) \
+                            and label in live:
+                        found[label] = live[label]
+
+            # the others are computed from the tokens the snapshot saw, without holding the lock, so that writers keep
+            # registering documents meanwhile
+            stale = [label for label in missing if label not in found]
+            computed = self._evaluate_labels(metric, stale, tokens, snapshot.peek('lineoffsets'))
+            found.update(computed)
+
+            # the values of documents that weren't registered again since are memoized for the framework's readers
+            with self._lock:
+                stored = self.data.peek(metric)
+                pending = self._pending.get(metric)
+                if pending:
+                    for label, value in computed.items():
+                        if label in pending and self._revisions.get(label, 0) == snapshot.revisions.get(label, 0):
+                            stored[label] = value
+                            del pending[label]
+                    self._commit()
+
+            snapshot.publish(metric, {label: found[label] if label in found else known[label]
+                                      for label in tokens.keys()})
+            snapshot.complete.add(metric)
+
+    def sample(self, fraction, seed=0, stratify=None, data=None):
+        """ Return the data of a random sample of the registered documents, keyed like the data dictionary, so that
+        visualizations can be previewed without computing statistics for every document
+        Args:
+            fraction (float): share of the documents to draw, between 0 and 1 (at least one document is drawn)
+            seed (int): seed of the sample (the same seed draws the same documents)
+            stratify (str): optional level of the hierarchy (e.g., 'album') whose groups are each sampled at fraction
+            data (Snapshot): optional snapshot to draw the documents from (the current one by default)
+        Returns:
+            sample (Snapshot): read-only data of the sampled documents, whose statistics are computed only for them;
+                               its sample attribute describes the sample ('fraction', 'seed', 'size', 'population',
+                               'level')
+
+        Every document gets a random key when it is registered, so drawing a sample never reads the documents.
+        """
+        # Ensure the inputted parameters are valid based on their type
+        assert isinstance(fraction, (int, float)) and 0 < fraction <= 1, 'The share of the documents to sample must ' \
+                                                                         'be between 0 and 1'
+        assert isinstance(seed, int), 'The seed of the sample must be an integer'
+        if stratify is not None:
+            assert isinstance(stratify, str), 'The level of the hierarchy must be a string'
+
+        with self._lock:
+            if data is None:
+                data = self.snapshot()
+            key = ('sample', float(fraction), seed, stratify)
+            if key in data.views:
+                return data.views[key]
+
+            # the sample index describes the current version; older snapshots derive the keys of their documents
+            index = self.samples.freeze() if data.version == self.version else None
+
+        tokens = data.peek('tokens')
+        if index is None:
+            index = nlp_sample.SampleIndex.build(tokens.keys())
+        labels, keys = index
+        assert labels, 'No document is registered'
+
+        strata = None
+        if stratify is not None:
+            groups = data.peek('groups')
+            strata = [groups[label].get(stratify) if label in groups else None for label in labels]
+        drawn = nlp_sample.draw(labels, keys, fraction, seed=seed, strata=strata)
+
+        info = {'fraction': fraction, 'seed': seed, 'size': len(drawn), 'population': len(labels),
+                'level': stratify}
+        with data.lock:
+            return data.views.setdefault(key, nlp_sample.sample_data(
+                data, drawn, info, functools.partial(self._evaluate_sample, data)))
+
+    def _evaluate_sample(self, data, metric, labels):
+        """ Compute a statistic for the sampled documents of a snapshot that don't have it yet
+        Args:
+            data (Snapshot): snapshot the documents were sampled from
+            metric (str): name of the statistic
+            labels (list): labels (str) of the sampled documents missing the statistic
+        Returns:
+            values (dict): maps the label of each document to its value of the statistic (empty for data that isn't a
+                           registered statistic)
+        """
+        if metric not in self.metrics:
+            return {}
+
+        # documents that were not registered again since the snapshot share the framework's memoized values
+        values = {}
+        with self._lock:
+            live = self.data.peek(metric)
+            for label in labels:
+                if self._revisions.get(label, 0) == data.revisions.get(label, 0) and label in live:
+                    values[label] = live[label]
+
+        stale = [label for label in labels if label not in values]
+        values.update(self._evaluate_labels(metric, stale, data.peek('tokens'), data.peek('lineoffsets')))
+        return values
+
+    def levels(self):
+        """ Return the levels of the group hierarchy that documents were registered with
+        Returns:
+            levels (list): levels (str), e.g., ['album', 'era']
+        """
+        with self._lock:
+            return list(self.rollups.levels)
+
+    def rollup(self, level, data=None):
+        """ Return the data of every group at one level of the hierarchy (e.g., every album), keyed like the data
+        dictionary but by group instead of by document, so that it can be queried or handed to any visualization
+        Args:
+            level (str): level of the hierarchy (e.g., 'album')
+            data (Snapshot): optional snapshot that the groups must be consistent with (the current one by default)
+        Returns:
+            rollup (Snapshot): read-only data of every group (e.g., rollup('album')['wordcount']['Red'])
+
+        Word counts, numbers of words and documents, word lengths, type-token ratios, and hapax counts come straight
+        from the running totals of the groups, without reading their documents.
+        """
+        assert isinstance(level, str), 'The level of the hierarchy must be a string'
+
+        with self._lock:
+            if data is None:
+                data = self.snapshot()
+            if ('rollup', level) in data.views:
+                return data.views[('rollup', level)]
+
+            # the running totals describe the current version; older snapshots and samples add up their own documents
+            totals = self.rollups.freeze(level) if data.version == self.version and data.sample is None else None
+
+        if totals is None:
+            totals = GroupRollups.build(data.peek('tokens'), data.peek('groups'), level)
+        assert totals, 'No document is registered with a group at level "' + level + '"'
+
+        with data.lock:
+            return data.views.setdefault(('rollup', level), group_data(
+                totals, data, level, self.vocab, functools.partial(self._evaluate_groups, data)))
+
+    def _evaluate_groups(self, data, metric, members):
+        """ Compute a statistic for groups of documents, each read as one text (e.g., a whole album)
+        Args:
+            data (Snapshot): snapshot the documents are read from
+            metric (str): name of the statistic
+            members (dict): maps each group (str) to the labels of its documents, in the order they are read
+        Returns:
+            values (dict): maps each group with at least one document to its value of the statistic
+        """
+        tokens, line_offsets = data.peek('tokens'), data.peek('lineoffsets')
+        group_tokens = {}
+        group_lines = {}
+        for group, labels in members.items():
+            labels = [label for label in labels if label in tokens]
+            if not labels:
+                continue
+
+            # the lines of each document start after the tokens of the documents before it
+            group_tokens[group] = np.concatenate([tokens[label] for label in labels])
+            lines = [np.zeros(1, dtype=np.int64)]
+            for label in labels:
+                offsets = line_offsets[label] if label in line_offsets else np.array([0, len(tokens[label])])
+                lines.append(np.asarray(offsets[1:], dtype=np.int64) + lines[-1][-1])
+            group_lines[group] = np.concatenate(lines)
+
+        return self._evaluate_labels(metric, list(group_tokens), group_tokens, group_lines)
+
+    def _evaluate_labels(self, metric, labels, tokens, line_offsets, batch_size=1024):
+        """ Compute a statistic (and the statistics it depends on) from scratch for some documents, in batches
+        Args:
+            metric (str): name of the statistic
+            labels (list): labels (str) of the documents
+            tokens (Mapping): maps the label of each document to its tokens
+            line_offsets (Mapping): maps the label of each document to where its lines start
+            batch_size (int): number of documents per batch
+        Returns:
+            values (dict): maps the label of each document to its value of the statistic
+        """
+        order = nlp_metrics.schedule([metric], self.metrics)
+        values = {}
+        for start in range(0, len(labels), batch_size):
+            chunk = labels[start:start + batch_size]
+            values.update(zip(chunk, self._evaluate(order, chunk, tokens, line_offsets, None)[metric]))
+        return values
+
+    def repeats(self, label, min_length=3, top=nlp_repeats.TOP_REPEATS):
+        """ Find the repeated spans of a registered document with its suffix array (built on the spot if the document
+        was registered without one, see load_text)
+        Args:
+            label (str): label of a registered document
+            min_length (int): minimum length (in clean words) of the repeated spans
+            top (int): number of longest repeated phrases to return
+        Returns:
+            repeats (dict): the share of the document's words in repeated spans ('repetitionratio'), its longest
+                            repeated phrases ('longestrepeats'), and its most repeated span ('toprepeat'), as
+                            described in nlp_repeats
+        """
+        # Ensure the inputted parameters are valid based on their type
+        assert isinstance(label, str), 'Label for the text file must be a string'
+        assert isinstance(min_length, int) and min_length > 0, 'The minimum length of the repeated spans must be ' \
+                                                               'a positive integer'
+
+        data = self.snapshot()
+        assert label in data.peek('tokens'), 'No document is registered as "' + label + '"'
+        tokens = data.peek('tokens')[label]
+
+        if label in data.peek('suffixarray'):
+            suffixes, lcp = data.peek('suffixarray')[label], data.peek('lcp')[label]
+        else:
+            suffixes, lcp = nlp_repeats.suffix_array(tokens)
+
+        return {'repetitionratio': nlp_repeats.repetition_ratio(tokens, suffixes, lcp, min_length=min_length),
+                'longestrepeats': nlp_repeats.longest_repeats(tokens, suffixes, lcp, self.vocab, top=top),
+                'toprepeat': nlp_repeats.most_repeated(tokens, suffixes, lcp, self.vocab, min_length=min_length)}
+
+    def keyness(self, group_a, group_b, level=None, measure='loglikelihood', top=nlp_keyness.TOP_TERMS):
+        """ Find the words that distinguish two groups of documents (e.g., early songs from recent ones), scoring the
+        whole vocabulary at once from the word counts of each group
+        Args:
+            group_a (list or str): labels (str) of the documents of the first group, or the name of a group at level
+            group_b (list or str): labels (str) of the documents of the second group, or the name of a group at level
+            level (str): optional level of the hierarchy that group_a and group_b belong to (e.g., 'era')
+            measure (str): score that ranks the words: 'loglikelihood' (Dunning's G2), 'logodds' (log-odds ratio with
+                           an informative Dirichlet prior), or 'chisquare'
+            top (int): number of words returned for each group
+        Returns:
+            keyness (dict): the groups ('groups'), the measure ('measure'), and the most distinctive words of the first
+                            group ('a') and of the second ('b'), each a list of (word, score, count in the first group,
+                            count in the second group), as described in nlp_keyness
+
+        Groups at a level are read from their running totals, without rescanning their documents.
+        """
+        # Ensure the inputted parameters are valid based on their type
+        assert measure in nlp_keyness.MEASURES, 'The measure must be one of ' + ', '.join(nlp_keyness.MEASURES)
+        assert isinstance(top, int) and top > 0, 'The number of words per group must be a positive integer'
+        if level is None:
+            assert isinstance(group_a, list) and isinstance(group_b, list), 'Without a level, the groups must be ' \
+                                                                              'lists of labels'
+        else:
+            assert isinstance(level, str), 'The level of the hierarchy must be a string'
+            assert isinstance(group_a, str) and isinstance(group_b, str), 'The groups at a level must be strings'
+
+        with self._lock:
+            data = self.snapshot()
+            counts = [self._group_counts(data, group, level) for group in (group_a, group_b)]
+
+        results = nlp_keyness.keyness(counts[0], counts[1], self.vocab, measure=measure, top=top)
+        results['groups'] = (group_a if level is not None else 'Group A', group_b if level is not None else 'Group B')
+        return results
+
+    def _group_counts(self, data, group, level):
+        """ Count the words of a group of documents
+        Args:
+            data (Snapshot): snapshot the documents are read from
+            group (list or str): labels (str) of the documents, or the name of a group at level
+            level (str): level of the hierarchy that group belongs to (None for a list of labels)
+        Returns:
+            counts (np.ndarray): number of times each word id (the index) appears in the documents of the group
+        """
+        tokens = data.peek('tokens')
+        if level is None:
+            missing = [label for label in group if label not in tokens]
+            assert not missing, 'No document is registered as "' + '", "'.join(missing[:5]) + '"'
+            labels = group
+
+        else:
+            # the running totals describe the current version, so they can be read directly
+            rollups = self.rollups.levels.get(level, {})
+            if data.version == self.version and group in rollups:
+                return rollups[group].counts.copy()
+            labels = [label for label, groups in data.peek('groups').items() if groups.get(level) == group]
+            assert labels, 'No document is registered with group "' + group + '" at level "' + level + '"'
+
+        if not labels:
+            return np.zeros(0, dtype=np.int64)
+        return np.bincount(np.concatenate([tokens[label] for label in labels]), minlength=len(self.vocab))
+
+    def topics(self, n_topics, level=None, top=nlp_topics.TOPIC_WORDS, seed=0, batch_size=nlp_topics.BATCH_SIZE):
+        """ Find the topics (themes) of the registered documents and how much of each document is about each topic
+        Args:
+            n_topics (int): number of topics
+            level (str): optional level of the hierarchy (e.g., 'era') to give the topic shares of each group of,
+                         instead of each document
+            top (int): number of words describing each topic
+            seed (int): seed of the random initialization of the topics
+            batch_size (int): number of documents per minibatch of the training
+        Returns:
+            topics (dict): the heaviest words of each topic ('topics', a list of (word, weight) per topic) and the share
+                           of each topic in each document, or group of documents ('shares', maps each label or group to
+                           an array of n_topics shares that add up to 1)
+
+        The model is trained online, one minibatch at a time: the first call trains it on every registered document,
+        and later calls (with the same number of topics and seed) only train it on the documents registered (or
+        registered again) since, so topics refine as the corpus grows instead of being refit from scratch.
+        """
+        # Ensure the inputted parameters are valid based on their type
+        assert isinstance(n_topics, int) and n_topics > 0, 'The number of topics must be a positive integer'
+        assert isinstance(top, int) and top > 0, 'The number of words per topic must be a positive integer'
+        assert isinstance(seed, int), 'The seed of the topics must be an integer'
+        assert isinstance(batch_size, int) and batch_size > 0, 'The number of documents per minibatch must be a ' \
+                                                               'positive integer'
+        if level is not None:
+            assert isinstance(level, str), 'The level of the hierarchy must be a string'
+
+        # documents registered while the model is trained are picked up by the next call
+        with self._lock:
+            data = self.snapshot()
+            model = self.topic_models.setdefault((n_topics, seed), nlp_topics.TopicModel(n_topics, seed=seed))
+
+        tokens = data.peek('tokens')
+        assert len(tokens) > 0, 'No document is registered'
+
+        with model.lock:
+            stale = [label for label in tokens.keys() if model.revisions.get(label) != data.revisions.get(label, 0)]
+            for start in range(0, len(stale), batch_size):
+                chunk = stale[start:start + batch_size]
+                batch = TokenBatch(chunk, [tokens[label] for label in chunk], self.vocab)
+                model.partial_fit(chunk, nlp_topics.count_matrix(batch),
+                                  [data.revisions.get(label, 0) for label in chunk], len(tokens))
+
+            # documents removed since the model was trained on them are left out
+            weights = {label: model.weights[label] for label in tokens.keys() if label in model.weights}
+            topics = model.top_words(self.vocab, top=top)
+
+        # groups are described by the topics of all of their documents together
+        if level is not None:
+            members = {}
+            for label, groups in data.peek('groups').items():
+                if level in groups and label in weights:
+                    members.setdefault(groups[level], []).append(weights[label])
+            assert members, 'No document is registered with a group at level "' + level + '"'
+            weights = {group: np.sum(rows, axis=0) for group, rows in members.items()}
+
+        shares = {name: row / max(float(row.sum()), nlp_topics.EPSILON) for name, row in weights.items()}
+        return {'topics': topics, 'shares': shares}
+
+    @staticmethod
+    def _snapshot_labels(snapshot):
+        """ Return the labels of the documents of a snapshot, in the order they were registered
+        Args:
+            snapshot (Snapshot): snapshot of the data of a framework
+        Returns:
+            labels (list): labels (str) of the documents
+        """
+        # a document may be missing some statistics, so take the union across all of them
+        labels = {}
+        for values in dict.values(snapshot):
+            labels.update(dict.fromkeys(values.keys()))
+        return list(labels)
+
+    def _document_results(self, label, data=None):
+        """ Collect the stored data of one registered document (its tokens and any statistics saved directly, but not
+        the lazily computed statistics, which can always be recomputed from the tokens)
+        Args:
+            label (str): label of a registered document
+            data (dict): optional snapshot to read the document from (the live data by default)
+        Returns:
+            results (dict): the data of the document, keyed by the name of the statistic
+        """
+        if data is None:
+            data = self.data
+        return {metric: values[label] for metric, values in dict.items(data)
+                if metric not in self.metrics and label in values}
+
+    @staticmethod
+    def _combine_results(results, other_results):
+        """ Combine the data of two parts of the same document (e.g., a text split across shards)
+        Args:
+            results (dict): data of the first part
+            other_results (dict): data of the second part
+        Returns:
+            combined (dict): data of both parts together
+        """
+        combined = {}
+        for metric in set(results) | set(other_results):
+            if metric in nlp_repeats.RESULTS:
+                # the repetition index of either part doesn't describe the combined document (see Nlp.repeats)
+                continue
+            elif metric not in results or metric not in other_results:
+                combined[metric] = results.get(metric, other_results.get(metric))
+            elif metric == 'lineoffsets':
+                # the lines of the second part start after the last word of the first
+                combined[metric] = np.concatenate([results[metric], other_results[metric][1:] + results[metric][-1]])
+            elif isinstance(results[metric], np.ndarray):
+                # the tokens of the second part follow those of the first
+                combined[metric] = np.concatenate([results[metric], other_results[metric]])
+            elif isinstance(results[metric], Counter):
+                combined[metric] = results[metric] + other_results[metric]
+            elif isinstance(results[metric], list):
+                combined[metric] = results[metric] + other_results[metric]
+            elif isinstance(results[metric], dict):
+                # e.g., groups: the first part's group wins at the levels both parts have
+                combined[metric] = {**other_results[metric], **results[metric]}
+            elif isinstance(results[metric], (int, float)):
+                combined[metric] = results[metric] + other_results[metric]
+            else:
+                raise TypeError('Statistic "' + metric + '" cannot be combined')
+
+        return combined
+
+    def merge(self, other, on_conflict='error'):
+        """ Merge the documents registered with another framework into this one
+        Args:
+            other (Nlp): framework whose documents (and visualizations) get merged in
+            on_conflict (str): what to do when both frameworks registered a document with the same label:
+                               'error' (raise a MergeError), 'keep' (keep this framework's document),
+                               'replace' (take the other framework's document), 'rename' (register the other document
+                               under a new label, e.g., 'Red (2)'), or 'combine' (treat both as parts of one document,
+                               whose statistics are recomputed from the tokens of both)
+        Returns:
+            self (Nlp): this framework, so that merges can be chained
+        """
+        # Ensure the inputted parameters are valid based on their type and value
+        assert isinstance(other, Nlp), 'Only another Nlp framework can be merged'
+        assert on_conflict in ('error', 'keep', 'replace', 'rename', 'combine'), 'The label collision policy must be ' \
+                                                                                 'one of "error", "keep", "replace", ' \
+                                                                                 '"rename", or "combine"'
+
+        try:
+            # the other framework is read from a snapshot, so it can keep registering documents meanwhile
+            snapshot = other.snapshot()
+            labels = other._snapshot_labels(snapshot)
+
+            with self._lock:
+                existing = set(self.labels())
+
+                # every collision is found before anything is merged, so that a failed merge leaves this framework
+                # unchanged
+                if on_conflict == 'error':
+                    collisions = [label for label in labels if label in existing]
+                    if collisions:
+                        raise KeyError('Label(s) ' + ', '.join('"' + label + '"' for label in collisions) +
+                                       ' registered with both frameworks')
+
+                # maps the word ids of the other framework to the word ids of this one
+                id_map = self.vocab.encode(other.vocab.words)
+
+                for label in labels:
+                    results = other._document_results(label, snapshot)
+                    if 'tokens' in results:
+                        results['tokens'] = id_map[results['tokens']]
+                    target = label
+
+                    if label in existing:
+                        if on_conflict == 'keep':
+                            continue
+                        elif on_conflict == 'rename':
+                            # find the first free label of the form "label (n)"
+                            n = 2
+                            while target in existing:
+                                target = label + ' (' + str(n) + ')'
+                                n += 1
+                        elif on_conflict == 'combine':
+                            results = Nlp._combine_results(self._document_results(label), results)
+
+                    # merged documents are checked for duplicates like the documents registered with load_text
+                    if 'tokens' in results and self._check_duplicate(target, results['tokens']):
+                        continue
+
+                    self._save_results(target, results)
+                    existing.add(target)
+
+            # visualizations registered only with the other framework come along as well
+            with self._lock:
+                for name, viz in dict(other.viz).items():
+                    if name not in self.viz:
+                        self.viz[name] = viz
+                        self.viz_version += 1
+
+        except Exception as e:
+            # throws an error message if the frameworks cannot be merged
+            raise MergeError(on_conflict, str(e))
+
+        else:
+            # throws a success message if the frameworks are merged
+            print('Frameworks successfully merged')
+            return self
+
+    def __add__(self, other):
+        """ Merge two frameworks into a new, in-memory framework (label collisions raise a MergeError)
+        Args:
+            other (Nlp): framework to be added to this one
+        Returns:
+            merged (Nlp): new framework with the documents of both (checked for duplicates like this framework)
+        """
+        if not isinstance(other, Nlp):
+            return NotImplemented
+        threshold = 0.9 if self._dedup_index is None else self._dedup_index.threshold
+        return Nlp(dedup=self.dedup, dedup_threshold=threshold).merge(self).merge(other)
+
+    def save_shard(self, filename):
+        """ Serialize the registered documents to a shard file that can later be merged with other shards
+        Args:
+            filename (str): name of the shard file to write
+        Returns:
+            None (just writes the shard file)
+
+        The shard file is a stream of pickled records: a header dictionary ({'format': 'nlp-shard', 'version': 1,
+        'vocab': list of the words that the token ids refer to}), followed by one (statistic, label, value) tuple per
+        statistic of each document. Records are written and read one at a time, so shards of out-of-core frameworks
+        never have to fit in memory.
+        """
+        assert isinstance(filename, str), 'The name of the shard file must be a string'
+
+        try:
+            # the shard is written from a snapshot (taken before the vocabulary is read, so that every token id of
+            # the snapshot is covered), while documents may keep being registered
+            snapshot = self.snapshot()
+            words = list(self.vocab.words)
+
+            with open(filename, 'wb') as shard:
+                pickle.dump({'format': 'nlp-shard', 'version': 1, 'vocab': words}, shard,
+                            protocol=pickle.HIGHEST_PROTOCOL)
+                for metric, values in dict.items(snapshot):
+                    for label, value in values.items():
+                        pickle.dump((metric, label, value), shard, protocol=pickle.HIGHEST_PROTOCOL)
+
+        except Exception as e:
+            # throws an error message if the shard cannot be written
+            raise ShardError(filename, str(e))
+
+        else:
+            # throws a success message if the shard is written
+            print('Shard successfully saved to', filename)
+
+    @classmethod
+    def load_shard(cls, filename, store_path=None, dedup=None, dedup_threshold=0.9):
+        """ Create a framework from a shard file written by save_shard
+        Args:
+            filename (str): name of the shard file to read
+            store_path (str): optional SQLite file that the loaded data gets spilled to (see Nlp.__init__)
+            dedup (str): optional handling of the documents of the shard that duplicate an earlier one (see
+                         Nlp.__init__), which also applies to the documents later merged into the framework
+            dedup_threshold (float): minimum estimated Jaccard similarity of near-duplicates (see Nlp.__init__)
+        Returns:
+            nlp (Nlp): framework with the documents of the shard registered
+        """
+        assert isinstance(filename, str), 'The name of the shard file must be a string'
+
+        nlp = cls(store_path=store_path, dedup=dedup, dedup_threshold=dedup_threshold)
+        try:
+            with open(filename, 'rb') as shard:
+                header = pickle.load(shard)
+                assert isinstance(header, dict) and header.get('format') == 'nlp-shard', 'Not an Nlp shard file'
+
+                # maps the word ids of the shard to the word ids of the framework
+                id_map = nlp.vocab.encode(header['vocab'])
+                labels = []
+
+                while True:
+                    try:
+                        metric, label, value = pickle.load(shard)
+                    except EOFError:
+                        break
+                    if metric == 'tokens':
+                        value = id_map[value]
+                        labels.append(label)
+                    nlp.data.peek(metric)[label] = value
+
+            # the documents of the shard are checked for duplicates in the order they were registered
+            if nlp._dedup_index is not None:
+                for label in labels:
+                    if nlp._check_duplicate(label, nlp.data.peek('tokens')[label]):
+                        for values in list(dict.values(nlp.data)):
+                            values.pop(label, None)
+
+            nlp._find_pending()
+            nlp._index_groups()
+            nlp._commit()
+
+        except Exception as e:
+            # throws an error message if the shard cannot be read
+            raise ShardError(filename, str(e))
+
+        else:
+            # throws a success message if the shard is read
+            print('Shard successfully loaded from', filename)
+            return nlp
+
+    @classmethod
+    def reduce_shards(cls, filenames, on_conflict='error', fanout=2, dedup=None, dedup_threshold=0.9):
+        """ Merge the shards written by several workers with a tree reduction
+        Args:
+            filenames (list): names (str) of the shard files written by the workers
+            on_conflict (str): label collision policy passed to Nlp.merge
+            fanout (int): number of frameworks merged together at each level of the tree
+            dedup (str): optional handling of duplicate documents, within and across shards (see Nlp.__init__)
+            dedup_threshold (float): minimum estimated Jaccard similarity of near-duplicates (see Nlp.__init__)
+        Returns:
+            nlp (Nlp): framework with the documents of every shard registered
+        """
+        # Ensure the inputted parameters are valid based on their type and value
+        assert isinstance(filenames, list) and len(filenames) > 0, 'Must input the shard files as a non-empty list'
+        assert isinstance(fanout, int) and fanout >= 2, 'The fanout of the reduction must be an integer of at least 2'
+
+        level = [cls.load_shard(filename, dedup=dedup, dedup_threshold=dedup_threshold) for filename in filenames]
+
+        # merge groups of `fanout` frameworks until one is left, preserving the order of the shards
+        while len(level) > 1:
+            level = [functools.reduce(lambda a, b: a.merge(b, on_conflict=on_conflict), level[i:i + fanout])
+                     for i in range(0, len(level), fanout)]
+
+        return level[0]
+
+    def serve(self, host='127.0.0.1', port=8000, block=True):
+        """ Serve the results of the framework over HTTP (JSON endpoints /labels, /counts?k=, /topk?k=, /lengths,
+        /sentiment, /sankey?k=, and /figures/<visualization name>.png for the registered matplotlib visualizations)
+        Args:
+            host (str): host name to listen on
+            port (int): port to listen on
+            block (bool): whether to serve until interrupted; otherwise, the server runs in a background thread
+        Returns:
+            server (AnalyticsServer): the running server (call its shutdown method to stop it)
+
+        Responses are computed once per version of the corpus and carry an ETag, so clients polling with
+        If-None-Match get a 304 (and nothing is recomputed) until a document is registered or replaced.
+        """
+        # Ensure the inputted parameters are valid based on their type
+        assert isinstance(host, str), 'The host must be a string'
+        assert isinstance(port, int), 'The port must be an integer'
+
+        try:
+            server = AnalyticsServer(self, host=host, port=port)
+            server.precompute()
+
+        except Exception as e:
+            # throws an error message if the server cannot be started
+            raise ServeError(host, port, str(e))
+
+        # throws a success message once the server is ready
+        print('Serving results on http://' + host + ':' + str(server.server_address[1]))
+
+        if not block:
+            threading.Thread(target=server.serve_forever, daemon=True).start()
+            return server
+
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
+        return server
@@ -0,0 +1,151 @@
+"""
+Jethro Lee and Michelle Wang
+DS 3500
+Reusable NLP Library - HW3
+2/27/2023
+
+nlp_batch.py: Bookkeeping for registering many files at once: compact error records that describe why a file failed
+without keeping the exception (and the words its traceback refers to) alive, and the quarantine of bad files
+"""
+# import necessary libraries
+import json
+import os
+import shutil
+import traceback
+
+# maximum number of characters kept from the message and from the traceback of each failure
+MAX_MESSAGE = 500
+MAX_TRACEBACK = 2000
+
+# number of innermost stack frames kept in the traceback of each failure
+TRACEBACK_FRAMES = 3
+
+# I/O errors that another attempt cannot fix
+PERMANENT_ERRORS = (FileNotFoundError, IsADirectoryError, NotADirectoryError, PermissionError)
+
+
+def _truncate(text, size):
+    """ Shorten a text to at most size characters, keeping its end (where tracebacks name the failing line) """
+    return text if len(text) <= size else '...' + text[-(size - 3):]
+
+
+def _chain(error):
+    """ List an exception and the exceptions it was raised while handling, outermost first
+    Args:
+        error (Exception): exception raised by a failed step
+    Returns:
+        chain (list): the exceptions (Exception)
+    """
+    chain = []
+    while error is not None and error not in chain:
+        chain.append(error)
+        error = error.__cause__ or error.__context__
+    return chain
+
+
+def retryable(error, retry_on):
+    """ Tell whether a failure may go away if the step is attempted again (e.g., a file on a flaky network share)
+    Args:
+        error (Exception): exception raised by a failed step
+        retry_on (tuple): exception types (e.g., OSError) worth another attempt, wherever they appear in the chain
+    Returns:
+        retryable (bool): whether the step should be attempted again
+    """
+    chain = _chain(error)
+    return any(isinstance(cause, retry_on) for cause in chain) and \
+        not any(isinstance(cause, PERMANENT_ERRORS) for cause in chain)
+
+
+def error_record(filename, label, error, attempts):
+    """ Describe a failure with a small dictionary of strings and release the stack frames of the exception
+    Args:
+        filename (str): file that could not be registered
+        label (str): label the file was registered under
+        error (Exception): exception raised by the last attempt
+        attempts (int): number of attempts made
+    Returns:
+        record (dict): filename, label, attempts, errors (the exception types, outermost first, e.g.,
+                       'ParserError <- StopWordError <- TypeError'), message (of the innermost exception), and the
+                       innermost frames of its traceback, with messages and tracebacks cut to MAX_MESSAGE and
+                       MAX_TRACEBACK characters
+    """
+    chain = _chain(error)
+    root = chain[-1]
+
+    # framework exceptions keep the details of the failure in msg rather than in their own message
+    message = getattr(root, 'msg', '') or str(root)
+    frames = ''.join(traceback.format_exception(type(root), root, root.__traceback__, limit=-TRACEBACK_FRAMES,
+                                                chain=False))
+
+    # the frames hold the local variables of the failed step (e.g., every word of the file) until they are cleared
+    for cause in chain:
+        if cause.__traceback__ is not None:
+            traceback.clear_frames(cause.__traceback__)
+
+    return {'filename': filename, 'label': label, 'attempts': attempts,
+            'errors': ' <- '.join(type(cause).__name__ for cause in chain),
+            'message': _truncate(message, MAX_MESSAGE), 'traceback': _truncate(frames, MAX_TRACEBACK)}
+
+
+def quarantine(record, directory):
+    """ Move a file that could not be registered to a quarantine directory, next to a JSON file with its error record,
+    so that later runs over the same inputs don't trip on it again
+    Args:
+        record (dict): error record of the file (see error_record)
+        directory (str): quarantine directory (created if needed)
+    Returns:
+        path (str): new path of the file
+    """
+    os.makedirs(directory, exist_ok=True)
+
+    # files with the same name from different directories don't overwrite each other
+    base = os.path.basename(record['filename'])
+    path = os.path.join(directory, base)
+    n = 2
+    while os.path.exists(path):
+        path = os.path.join(directory, str(n) + '_' + base)
+        n += 1
+
+    shutil.move(record['filename'], path)
+    with open(path + '.error.json', 'w') as record_file:
+        json.dump(record, record_file, indent=2)
+    return path
+
+
+class BatchReport:
+    """ Outcome of registering a batch of files
+    Attributes:
+        registered (list): labels (str) of the documents that were registered
+        skipped (list): labels (str) of the documents that were not registered because they duplicate a registered
+                        document (see Nlp's dedup)
+        failures (list): error records (dict, see error_record) of the first max_errors files that failed
+        num_failed (int): number of files that failed (including those beyond max_errors)
+        quarantined (list): paths (str) the failed files were moved to
+        max_errors (int): maximum number of error records kept
+    """
+
+    def __init__(self, max_errors=100):
+        self.registered = []
+        self.skipped = []
+        self.failures = []
+        self.num_failed = 0
+        self.quarantined = []
+        self.max_errors = max_errors
+
+    def add_failure(self, record):
+        """ Count a failed file, keeping its record if there is still room
+        Args:
+            record (dict): error record of the file
+        Returns:
+            None
+        """
+        self.num_failed += 1
+        if len(self.failures) < self.max_errors:
+            self.failures.append(record)
+
+    def __len__(self):
+        return len(self.registered) + len(self.skipped) + self.num_failed
+
+    def __repr__(self):
+        return 'BatchReport({} registered, {} skipped, {} failed, {} quarantined)'.format(
+            len(self.registered), len(self.skipped), self.num_failed, len(self.quarantined))
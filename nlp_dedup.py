@@ -0,0 +1,174 @@
+"""
+Jethro Lee and Michelle Wang
+DS 3500
+Reusable NLP Library - HW3
+2/27/2023
+
+nlp_dedup.py: Detection of duplicate and near-duplicate documents (e.g., live versions, re-recordings, and remixes)
+with content hashes, MinHash signatures, and locality-sensitive hashing (LSH)
+"""
+# import necessary libraries
+from collections import defaultdict
+import hashlib
+import numpy as np
+
+# prime larger than every 32-bit shingle hash, used by the universal hash functions of the MinHash signatures
+_PRIME = np.uint64(4294967311)
+_MAX_HASH = np.uint64(0xFFFFFFFF)
+
+
+class DuplicateIndex:
+    """ Index of the registered documents used to flag documents that are (near-)duplicates of one already registered.
+
+    Exact duplicates are found with a hash of the document's tokens. Other documents are compared through MinHash
+    signatures of their token shingles, split into bands: only documents sharing at least one band are compared, so
+    finding the duplicates of a document does not require comparing it with every registered document.
+    Attributes:
+        threshold (float): minimum estimated Jaccard similarity for two documents to be near-duplicates
+        num_perm (int): number of hash functions in each MinHash signature
+        bands (int): number of LSH bands the signatures are split into
+        shingle_size (int): number of consecutive tokens in each shingle
+        signatures (dict): maps the label of each indexed document to its MinHash signature
+    """
+
+    def __init__(self, threshold=0.9, num_perm=128, bands=16, shingle_size=3, seed=1):
+        assert 0 < threshold <= 1, 'The similarity threshold must be between 0 and 1'
+        assert num_perm % bands == 0, 'The number of hash functions must be a multiple of the number of bands'
+
+        self.threshold = threshold
+        self.num_perm = num_perm
+        self.bands = bands
+        self.shingle_size = shingle_size
+        self.signatures = {}
+
+        # coefficients of the hash functions h(x) = (a * x + b) mod prime
+        rng = np.random.RandomState(seed)
+        self._a = rng.randint(1, 2 ** 32, size=(num_perm, 1), dtype=np.uint64)
+        self._b = rng.randint(0, 2 ** 32, size=(num_perm, 1), dtype=np.uint64)
+
+        # content hash -> label, and (band, band hash) -> labels
+        self._exact = {}
+        self._content_hashes = {}
+        self._buckets = defaultdict(list)
+
+    @staticmethod
+    def content_hash(tokens):
+        """ Hash the exact contents of a document
+        Args:
+            tokens (np.ndarray): word ids of the document
+        Returns:
+            digest (str): hexadecimal digest of the tokens
+        """
+        return hashlib.sha1(np.ascontiguousarray(tokens, dtype=np.int32).tobytes()).hexdigest()
+
+    def _shingles(self, tokens):
+        """ Hash every run of shingle_size consecutive tokens to a 32-bit integer
+        Args:
+            tokens (np.ndarray): word ids of the document
+        Returns:
+            shingles (np.ndarray): unique 32-bit hashes (uint64) of the shingles
+        """
+        tokens = np.asarray(tokens, dtype=np.uint64)
+        size = min(self.shingle_size, len(tokens))
+        n = len(tokens) - size + 1
+
+        # mix the ids of each window into one hash (unsigned overflow wraps around)
+        shingles = np.zeros(n, dtype=np.uint64)
+        for i in range(size):
+            shingles = (shingles * np.uint64(1000003)) ^ tokens[i:i + n]
+        return np.unique(shingles & _MAX_HASH)
+
+    def signature(self, tokens):
+        """ Compute the MinHash signature of a document
+        Args:
+            tokens (np.ndarray): word ids of the document
+        Returns:
+            signature (np.ndarray): minimum hash (uint64) of the shingles under each hash function
+        """
+        shingles = self._shingles(tokens)
+        signature = np.full(self.num_perm, _PRIME, dtype=np.uint64)
+
+        # hash the shingles in blocks so that long documents don't need a huge num_perm x shingles matrix
+        for start in range(0, len(shingles), 4096):
+            block = shingles[start:start + 4096]
+            hashes = (self._a * block + self._b) % _PRIME
+            signature = np.minimum(signature, hashes.min(axis=1))
+        return signature
+
+    def _band_keys(self, signature):
+        """ Split a signature into its LSH bands
+        Args:
+            signature (np.ndarray): MinHash signature of a document
+        Returns:
+            keys (list): one (band, hash of the band) tuple per band
+        """
+        rows = self.num_perm // self.bands
+        return [(band, signature[band * rows:(band + 1) * rows].tobytes()) for band in range(self.bands)]
+
+    def query(self, tokens):
+        """ Find a registered document that the given document duplicates
+        Args:
+            tokens (np.ndarray): word ids of the document
+        Returns:
+            match (tuple): (label of the registered document, estimated Jaccard similarity), or None if the document
+                           is not a duplicate
+            signature (np.ndarray): MinHash signature of the document (None for exact duplicates)
+        """
+        digest = DuplicateIndex.content_hash(tokens)
+        if digest in self._exact:
+            return (self._exact[digest], 1.0), None
+
+        signature = self.signature(tokens)
+        best = None
+        seen = set()
+
+        # only documents that share a band with this one are candidates
+        for key in self._band_keys(signature):
+            for label in self._buckets.get(key, ()):
+                if label in seen:
+                    continue
+                seen.add(label)
+                similarity = float(np.mean(self.signatures[label] == signature))
+                if similarity >= self.threshold and (best is None or similarity > best[1]):
+                    best = (label, similarity)
+
+        return best, signature
+
+    def add(self, label, tokens, signature=None):
+        """ Index a registered document
+        Args:
+            label (str): label of the document
+            tokens (np.ndarray): word ids of the document
+            signature (np.ndarray): optional MinHash signature of the document, if already computed by query
+        Returns:
+            None (just updates the index)
+        """
+        self.remove(label)
+        if signature is None:
+            signature = self.signature(tokens)
+
+        digest = DuplicateIndex.content_hash(tokens)
+        self._exact.setdefault(digest, label)
+        self._content_hashes[label] = digest
+        self.signatures[label] = signature
+        for key in self._band_keys(signature):
+            self._buckets[key].append(label)
+
+    def remove(self, label):
+        """ Remove a document from the index (e.g., before it is registered again with new contents)
+        Args:
+            label (str): label of the document
+        Returns:
+            None (just updates the index)
+        """
+        if label not in self.signatures:
+            return
+
+        for key in self._band_keys(self.signatures.pop(label)):
+            self._buckets[key].remove(label)
+            if not self._buckets[key]:
+                del self._buckets[key]
+
+        digest = self._content_hashes.pop(label)
+        if self._exact.get(digest) == label:
+            del self._exact[digest]
@@ -0,0 +1,135 @@
+"""
+Jethro Lee and Michelle Wang
+DS 3500
+Reusable NLP Library - HW3
+2/27/2023
+
+nlp_diversity.py: Vocabulary richness measures that, unlike the type-token ratio, don't shrink just because a text is
+longer: the moving-average type-token ratio (MATTR), the measure of textual lexical diversity (MTLD), and the growth
+curve of the number of distinct words. Each is computed in a single pass over the tokens, with windowed counts instead
+of recounting every window
+"""
+# import necessary libraries
+import numpy as np
+
+# number of words in each window of the moving-average type-token ratio
+MATTR_WINDOW = 50
+
+# type-token ratio at which MTLD closes a segment of text (McCarthy and Jarvis, 2010)
+MTLD_THRESHOLD = 0.72
+
+# number of points each type-token growth curve is resampled to
+GROWTH_POINTS = 100
+
+
+def mattr(batch, deps, window=MATTR_WINDOW):
+    """ Compute the moving-average type-token ratio of each document: the mean type-token ratio of every window of
+    `window` consecutive words (the plain type-token ratio for documents shorter than the window)
+    Args:
+        batch (TokenBatch): tokens of the documents
+        deps (dict): values of the statistics this one depends on (none), one list per statistic
+        window (int): number of words per window
+    Returns:
+        mattrs (list): moving-average type-token ratio (float) of each document
+    """
+    starts, ends = batch.offsets[:-1], batch.offsets[1:]
+    sizes = np.minimum(ends - starts, window)
+    positions = np.arange(len(batch.tokens), dtype=np.int64)
+    doc_starts, doc_last_window = starts[batch.doc_ids], (ends - sizes)[batch.doc_ids]
+    previous = batch.previous()
+
+    # a word is new to the windows starting after its previous occurrence (and at most window - 1 words before it),
+    # so each token adds one type to a contiguous range of window starts, marked with +1 at its first start and -1
+    # after its last one
+    first = np.maximum.reduce([previous + 1, positions - sizes[batch.doc_ids] + 1, doc_starts])
+    last = np.minimum(positions, doc_last_window)
+    counted = first <= last
+    size = len(batch.tokens) + 1
+    marks = np.bincount(first[counted], minlength=size) - np.bincount(last[counted] + 1, minlength=size)
+    types = np.cumsum(marks[:-1])
+
+    # average the type-token ratio of the windows starting in each document
+    valid = positions <= doc_last_window
+    ratios = np.bincount(batch.doc_ids[valid], weights=types[valid] / sizes[batch.doc_ids][valid],
+                         minlength=len(batch))
+    windows = np.bincount(batch.doc_ids[valid], minlength=len(batch))
+    return (ratios / np.maximum(windows, 1)).tolist()
+
+
+def _mtld_pass(tokens, threshold):
+    """ Count the segments of a text in which the type-token ratio stays above the threshold
+    Args:
+        tokens (list): word ids (int) of the text
+        threshold (float): type-token ratio that closes a segment
+    Returns:
+        factors (float): number of segments, including the share of a segment that the last words make up
+    """
+    # the segment each word was last seen in, so that a new segment doesn't require clearing a set of types
+    seen = {}
+    segment = 0
+    types = 0
+    size = 0
+    factors = 0.0
+    ratio = 1.0
+
+    for token in tokens:
+        size += 1
+        if seen.get(token) != segment:
+            seen[token] = segment
+            types += 1
+        ratio = types / size
+        if ratio <= threshold:
+            factors += 1
+            segment += 1
+            types = 0
+            size = 0
+
+    # the words after the last full segment count as the fraction of a segment that their ratio has covered
+    if size > 0:
+        factors += (1 - ratio) / (1 - threshold)
+    return factors
+
+
+def mtld(batch, deps, threshold=MTLD_THRESHOLD):
+    """ Compute the measure of textual lexical diversity of each document: the mean length of the segments over which
+    the type-token ratio stays above the threshold, averaged over a forward and a backward pass
+    Args:
+        batch (TokenBatch): tokens of the documents
+        deps (dict): values of the statistics this one depends on (none), one list per statistic
+        threshold (float): type-token ratio that closes a segment
+    Returns:
+        mtlds (list): MTLD (float) of each document
+    """
+    values = []
+    for tokens in batch.split(batch.tokens):
+        tokens = tokens.tolist()
+        lengths = []
+        for ordered in (tokens, tokens[::-1]):
+            factors = _mtld_pass(ordered, threshold)
+            lengths.append(len(ordered) / factors if factors > 0 else float(len(ordered)))
+        values.append(sum(lengths) / 2)
+    return values
+
+
+def ttr_growth(batch, deps, points=GROWTH_POINTS):
+    """ Trace how the number of distinct words of each document grows as more of it is read
+    Args:
+        batch (TokenBatch): tokens of the documents
+        deps (dict): values of the statistics this one depends on (none), one list per statistic
+        points (int): number of points of each curve
+    Returns:
+        curves (list): array (int64) of shape (2, points) per document, with the number of words read in the first row
+                       and the number of distinct words among them in the second
+    """
+    # a word is new exactly when it has no previous occurrence in its document
+    new_types = (batch.previous() == -1).astype(np.int64)
+    curves = []
+    for types in batch.split(new_types):
+        growth = np.cumsum(types)
+        read = np.unique(np.linspace(1, len(growth), min(points, len(growth))).round().astype(np.int64))
+        curves.append(np.vstack([read, growth[read - 1]]))
+    return curves
+
+
+# statistics that depend on the order of the words, which a group gets by reading its documents one after the other
+SEQUENCE_METRICS = ('mattr', 'mtld', 'ttrgrowth')
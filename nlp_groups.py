@@ -0,0 +1,243 @@
+"""
+Jethro Lee and Michelle Wang
+DS 3500
+Reusable NLP Library - HW3
+2/27/2023
+
+nlp_groups.py: Hierarchical groups of documents (e.g., the album and era of each song) with running totals per group,
+updated as documents are registered and removed, so that group-level statistics never require rescanning the songs
+"""
+# import necessary libraries
+from collections import Counter
+import numpy as np
+import nlp_diversity
+import nlp_sentiment
+from nlp_store import Snapshot
+
+
+class Rollup:
+    """ Running totals of the documents of one group
+    Attributes:
+        counts (np.ndarray): number of times each word id (the index) appears in the documents of the group
+        numdocs (int): number of documents in the group
+        numwords (int): number of clean words in the documents of the group
+    """
+
+    def __init__(self, counts=None, numdocs=0, numwords=0):
+        self.counts = np.zeros(0, dtype=np.int64) if counts is None else counts
+        self.numdocs = numdocs
+        self.numwords = numwords
+
+    def update(self, ids, counts, sign):
+        """ Add (or subtract) the contribution of one document
+        Args:
+            ids (np.ndarray): unique word ids of the document
+            counts (np.ndarray): number of times each of them appears in the document
+            sign (int): 1 to add the document, -1 to subtract it
+        Returns:
+            None (just updates the totals)
+        """
+        if len(ids) and ids[-1] >= len(self.counts):
+            # grow geometrically, so that a growing vocabulary doesn't copy the totals on every document
+            grown = np.zeros(max(int(ids[-1]) + 1, 2 * len(self.counts)), dtype=np.int64)
+            grown[:len(self.counts)] = self.counts
+            self.counts = grown
+
+        self.counts[ids] += sign * counts
+        self.numdocs += sign
+        self.numwords += sign * int(counts.sum())
+
+    def copy(self):
+        """ Return an independent copy of the totals """
+        return Rollup(self.counts.copy(), self.numdocs, self.numwords)
+
+
+class GroupRollups:
+    """ Running totals of every group at every level of the hierarchy
+    Attributes:
+        members (dict): maps the label of each grouped document to its groups ({level: group})
+        levels (dict): maps each level (e.g., 'album') to the Rollup of each of its groups (e.g., 'Red')
+    """
+
+    def __init__(self):
+        self.members = {}
+        self.levels = {}
+
+    def add(self, label, tokens, groups):
+        """ Add a document to its groups (replacing its earlier contribution is up to the caller, see remove)
+        Args:
+            label (str): label of the document
+            tokens (np.ndarray): word ids of the document
+            groups (dict): maps each level (str) to the group (str) of the document at that level
+        Returns:
+            None (just updates the totals)
+        """
+        if not groups:
+            return
+
+        # np.unique returns the ids sorted, so the largest one tells how far the totals must grow
+        ids, counts = np.unique(tokens, return_counts=True)
+        for level, group in groups.items():
+            rollups = self.levels.setdefault(level, {})
+            rollups.setdefault(group, Rollup()).update(ids, counts, 1)
+        self.members[label] = dict(groups)
+
+    def remove(self, label, tokens):
+        """ Remove a document from its groups
+        Args:
+            label (str): label of the document
+            tokens (np.ndarray): word ids the document was added with
+        Returns:
+            None (just updates the totals)
+        """
+        groups = self.members.pop(label, None)
+        if groups is None:
+            return
+
+        ids, counts = np.unique(tokens, return_counts=True)
+        for level, group in groups.items():
+            rollups = self.levels[level]
+            rollups[group].update(ids, counts, -1)
+
+            # groups (and levels) disappear with their last document
+            if rollups[group].numdocs == 0:
+                del rollups[group]
+                if not rollups:
+                    del self.levels[level]
+
+    def freeze(self, level):
+        """ Copy the totals of every group of a level, so that they can be read while documents keep being added
+        Args:
+            level (str): level of the hierarchy (e.g., 'album')
+        Returns:
+            totals (dict): maps each group (str) to a copy of its Rollup
+        """
+        return {group: rollup.copy() for group, rollup in self.levels.get(level, {}).items()}
+
+    @staticmethod
+    def build(tokens, groups, level):
+        """ Compute the totals of every group of a level from scratch
+        Args:
+            tokens (Mapping): maps the label of each document to its word ids
+            groups (Mapping): maps the label of each grouped document to its groups ({level: group})
+            level (str): level of the hierarchy (e.g., 'album')
+        Returns:
+            totals (dict): maps each group (str) to its Rollup
+        """
+        rollups = GroupRollups()
+        for label, doc_groups in groups.items():
+            if level in doc_groups and label in tokens:
+                rollups.add(label, tokens[label], {level: doc_groups[level]})
+        return rollups.levels.get(level, {})
+
+
+def _word_count(rollup, vocab):
+    ids = np.flatnonzero(rollup.counts)
+    words = vocab.words
+    return Counter({words[i]: count for i, count in zip(ids.tolist(), rollup.counts[ids].tolist())})
+
+
+def _word_length_list(rollup, vocab):
+    # the length of each word, repeated as many times as it appears (in order of id rather than of appearance)
+    ids = np.flatnonzero(rollup.counts)
+    return np.repeat(vocab.lengths()[ids], rollup.counts[ids]).tolist()
+
+
+def _avg_word_length(rollup, vocab):
+    # the totals may have grown past the vocabulary, but only with zeros
+    lengths = vocab.lengths()
+    size = min(len(lengths), len(rollup.counts))
+    return float(np.dot(rollup.counts[:size], lengths[:size])) / rollup.numwords
+
+
+# statistics computed directly from the totals of a group: name -> function(Rollup, Vocabulary)
+ROLLUP_METRICS = {
+    'wordcount': _word_count,
+    'numwords': lambda rollup, vocab: rollup.numwords,
+    'numdocs': lambda rollup, vocab: rollup.numdocs,
+    'wordlengthlist': _word_length_list,
+    'avgwordlength': _avg_word_length,
+    'typetokenratio': lambda rollup, vocab: int(np.count_nonzero(rollup.counts)) / rollup.numwords,
+    'hapaxcount': lambda rollup, vocab: int(np.count_nonzero(rollup.counts == 1))
+}
+
+
+def _concatenate(parts):
+    """ Join the values of a statistic for the documents of a group (e.g., their line sentiment scores)
+    Args:
+        parts (list): value of each document, in registration order
+    Returns:
+        combined (object): the joined value, or None if values of this type cannot be joined
+    """
+    if all(isinstance(part, np.ndarray) for part in parts):
+        return np.concatenate(parts)
+    elif all(isinstance(part, Counter) for part in parts):
+        return sum(parts, Counter())
+    elif all(isinstance(part, list) for part in parts):
+        return [value for part in parts for value in part]
+    return None
+
+
+def group_data(totals, data, level, vocab, evaluate=None):
+    """ Build the data dictionary of a level of the hierarchy: keyed like the framework's data, but with one entry per
+    group instead of one per document, so that it can be handed to any visualization
+    Args:
+        totals (dict): maps each group (str) of the level to its Rollup
+        data (Snapshot): snapshot of the framework's data that the totals are consistent with
+        level (str): level of the hierarchy (e.g., 'album')
+        vocab (Vocabulary): vocabulary the word ids of the totals refer to
+        evaluate (function): computes a statistic over the documents of each group read one after the other, given
+                             the name of the statistic and the labels of each group's documents ({group: labels})
+    Returns:
+        group_data (Snapshot): read-only data of every group, computed per statistic the first time it is read
+
+    Statistics in ROLLUP_METRICS come straight from the totals, and statistics that depend on the order of the words
+    (nlp_diversity.SEQUENCE_METRICS, e.g., MTLD) are computed over the whole group with evaluate. Other statistics
+    join the values of the documents of each group (arrays and lists are concatenated, Counters are added), and
+    sentiment arcs are resampled from the joined line sentiment.
+    """
+    # labels of the documents of each group, in registration order
+    members = {group: [] for group in totals}
+    for label, groups in data.peek('groups').items():
+        if groups.get(level) in members:
+            members[groups[level]].append(label)
+
+    def resolve(view, metric):
+        if metric in view.complete:
+            return
+
+        with view.lock:
+            if metric in view.complete:
+                return
+
+            if metric in ROLLUP_METRICS:
+                values = {group: ROLLUP_METRICS[metric](rollup, vocab) for group, rollup in totals.items()}
+
+            elif metric == 'sentimentarc':
+                line_sentiments = view['linesentiment']
+                groups = list(line_sentiments.keys())
+                arcs = nlp_sentiment.sentiment_arc(None, {'linesentiment': [line_sentiments[g] for g in groups]})
+                values = dict(zip(groups, arcs))
+
+            elif metric in nlp_diversity.SEQUENCE_METRICS and evaluate is not None:
+                # a diversity measure of a whole album is not an average of its songs'
+                values = evaluate(metric, members)
+
+            else:
+                doc_values = data[metric]
+                values = {}
+                for group, labels in members.items():
+                    parts = [doc_values[label] for label in labels if label in doc_values]
+                    combined = _concatenate(parts) if parts else None
+                    if combined is not None:
+                        values[group] = combined
+
+            view.publish(metric, values)
+            view.complete.add(metric)
+
+    view = Snapshot(data.version, {}, resolve)
+
+    # the groups of a sample of the documents are only previews of the full groups
+    if data.sample is not None:
+        view.sample = dict(data.sample, rollup=level)
+    return view
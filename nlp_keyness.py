@@ -0,0 +1,129 @@
+"""
+Jethro Lee and Michelle Wang
+DS 3500
+Reusable NLP Library - HW3
+2/27/2023
+
+nlp_keyness.py: Keyness scores that tell which words distinguish one group of documents from another (e.g., early
+songs from recent ones), computed for the whole vocabulary at once from the word count arrays of the two groups
+"""
+# import necessary libraries
+import numpy as np
+
+# number of distinctive words returned for each side of a comparison
+TOP_TERMS = 20
+
+# scores that can rank the words of a comparison
+MEASURES = ('loglikelihood', 'logodds', 'chisquare')
+
+
+def _xlogy(x, y):
+    """ Compute x * log(y) element-wise, taking 0 * log(0) as 0 """
+    return np.where(x > 0, x * np.log(np.where(x > 0, y, 1)), 0.0)
+
+
+def log_likelihood(counts_a, counts_b):
+    """ Compute Dunning's log-likelihood (G2) of every word, signed by the group that uses it more often
+    Args:
+        counts_a (np.ndarray): number of times each word id (the index) appears in the first group
+        counts_b (np.ndarray): number of times each word id appears in the second group
+    Returns:
+        scores (np.ndarray): G2 (float) of each word, positive if the word is relatively more frequent in the first
+                             group and negative if it is relatively more frequent in the second
+    """
+    total_a, total_b = counts_a.sum(), counts_b.sum()
+    share = (counts_a + counts_b) / (total_a + total_b)
+
+    # observed counts against the counts expected if both groups used the word at the same rate
+    g2 = 2 * (_xlogy(counts_a, counts_a / np.maximum(share * total_a, 1e-300)) +
+              _xlogy(counts_b, counts_b / np.maximum(share * total_b, 1e-300)))
+    return np.sign(counts_a * total_b - counts_b * total_a) * g2
+
+
+def log_odds(counts_a, counts_b, prior=None, prior_strength=None):
+    """ Compute the z-scores of the log-odds ratio of every word with an informative Dirichlet prior (Monroe et al.,
+    2008), which keeps rare words from dominating the comparison
+    Args:
+        counts_a (np.ndarray): number of times each word id (the index) appears in the first group
+        counts_b (np.ndarray): number of times each word id appears in the second group
+        prior (np.ndarray): background count of each word id (the two groups together by default)
+        prior_strength (float): total weight of the prior, in words (the size of the background by default)
+    Returns:
+        scores (np.ndarray): z-score (float) of each word, positive if the word is more likely in the first group and
+                             negative if it is more likely in the second
+    """
+    if prior is None:
+        prior = counts_a + counts_b
+    if prior_strength is None:
+        prior_strength = float(prior.sum())
+    alpha = prior_strength * prior / max(float(prior.sum()), 1.0)
+    total_a, total_b = counts_a.sum() + prior_strength, counts_b.sum() + prior_strength
+
+    # log-odds of the word in each group, smoothed by its share of the prior
+    with np.errstate(divide='ignore', invalid='ignore'):
+        delta = np.log((counts_a + alpha) / (total_a - counts_a - alpha)) - \
+                np.log((counts_b + alpha) / (total_b - counts_b - alpha))
+        scores = delta / np.sqrt(1 / (counts_a + alpha) + 1 / (counts_b + alpha))
+    return np.nan_to_num(scores, nan=0.0, posinf=0.0, neginf=0.0)
+
+
+def chi_square(counts_a, counts_b):
+    """ Compute Pearson's chi-square statistic of the 2x2 table (word or not, first group or second) of every word,
+    signed by the group that uses it more often
+    Args:
+        counts_a (np.ndarray): number of times each word id (the index) appears in the first group
+        counts_b (np.ndarray): number of times each word id appears in the second group
+    Returns:
+        scores (np.ndarray): chi-square (float) of each word, positive if the word is relatively more frequent in the
+                             first group and negative if it is relatively more frequent in the second
+    """
+    total_a, total_b = counts_a.sum(), counts_b.sum()
+    other_a, other_b = total_a - counts_a, total_b - counts_b
+    difference = counts_a * other_b - counts_b * other_a
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        chi2 = (total_a + total_b) * difference.astype(np.float64) ** 2 / \
+               ((counts_a + counts_b) * (other_a + other_b) * float(total_a) * float(total_b))
+    return np.sign(difference) * np.nan_to_num(chi2, nan=0.0, posinf=0.0)
+
+
+def _top(scores, top):
+    """ Return the positions of the top highest scores, highest first, without sorting the whole array """
+    if len(scores) > top:
+        candidates = np.argpartition(-scores, top)[:top]
+    else:
+        candidates = np.arange(len(scores))
+    candidates = candidates[np.argsort(-scores[candidates], kind='stable')]
+    return candidates[scores[candidates] > 0]
+
+
+def keyness(counts_a, counts_b, vocab, measure='loglikelihood', top=TOP_TERMS):
+    """ Find the words that distinguish two groups of documents
+    Args:
+        counts_a (np.ndarray): number of times each word id (the index) appears in the first group
+        counts_b (np.ndarray): number of times each word id appears in the second group
+        vocab (Vocabulary): vocabulary the word ids refer to
+        measure (str): score that ranks the words (one of MEASURES)
+        top (int): number of words returned for each group
+    Returns:
+        keyness (dict): the measure ('measure'), and the most distinctive words of the first group ('a') and of the
+                        second ('b'), each a list of (word (str), score (float), count in the first group (int),
+                        count in the second group (int)), most distinctive first, with scores of the second group's
+                        words made positive
+    """
+    # only the words that appear in either group can be scored
+    size = max(len(counts_a), len(counts_b))
+    counts_a = np.pad(counts_a.astype(np.int64), (0, size - len(counts_a)))
+    counts_b = np.pad(counts_b.astype(np.int64), (0, size - len(counts_b)))
+    ids = np.flatnonzero(counts_a + counts_b)
+    counts_a, counts_b = counts_a[ids], counts_b[ids]
+
+    scorers = {'loglikelihood': log_likelihood, 'logodds': log_odds, 'chisquare': chi_square}
+    scores = scorers[measure](counts_a, counts_b)
+
+    words = vocab.words
+    results = {'measure': measure}
+    for side, signed in (('a', scores), ('b', -scores)):
+        positions = _top(signed, top).tolist()
+        results[side] = [(words[ids[i]], float(signed[i]), int(counts_a[i]), int(counts_b[i])) for i in positions]
+    return results
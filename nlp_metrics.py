@@ -0,0 +1,229 @@
+"""
+Jethro Lee and Michelle Wang
+DS 3500
+Reusable NLP Library - HW3
+2/27/2023
+
+nlp_metrics.py: Statistics that the framework computes on demand from the token ids of the registered documents.
+
+Every statistic is a function that receives a TokenBatch (array views over many documents at once) and a dictionary
+with the values of the statistics it depends on, and returns one value per document of the batch. Built-in statistics
+are listed in METRICS; more can be added to a framework with Nlp.register_metric.
+"""
+# import necessary libraries
+from collections import Counter
+import numpy as np
+import nlp_diversity
+import nlp_sentiment
+
+
+class TokenBatch:
+    """ Array views over the tokens of several documents, handed to the statistic functions in one pass
+    Attributes:
+        labels (list): labels (str) of the documents in the batch
+        tokens (np.ndarray): ids of the clean words of every document, concatenated
+        offsets (np.ndarray): start of each document in tokens, followed by the total number of tokens
+        doc_ids (np.ndarray): index of the document (in labels) that each token belongs to
+        lengths (np.ndarray): number of characters of each token
+        vocab (Vocabulary): vocabulary the ids refer to
+        line_offsets (np.ndarray): start of each line of every document in tokens, followed by the total number of
+                                   tokens (a document registered without line information is one line)
+        line_doc_ids (np.ndarray): index of the document that each line belongs to
+        line_ids (np.ndarray): index of the line (in line_offsets) that each token belongs to
+    """
+
+    def __init__(self, labels, token_arrays, vocab, line_arrays=None):
+        self.labels = labels
+        self.vocab = vocab
+        self.tokens = np.concatenate(token_arrays) if token_arrays else np.zeros(0, dtype=np.int32)
+        self.offsets = np.concatenate([[0], np.cumsum([len(tokens) for tokens in token_arrays])]).astype(np.int64)
+        self.doc_ids = np.repeat(np.arange(len(labels)), np.diff(self.offsets))
+        self.lengths = vocab.lengths()[self.tokens]
+        self._counts = None
+        self._previous = None
+
+        # shift the line offsets of each document by the start of the document in the batch
+        if line_arrays is None:
+            line_arrays = [None] * len(labels)
+        line_starts = [np.asarray(lines[:-1], dtype=np.int64) + self.offsets[i] if lines is not None
+                       else self.offsets[i:i + 1] for i, lines in enumerate(line_arrays)]
+        self.line_offsets = np.concatenate(line_starts + [self.offsets[-1:]])
+        self.line_doc_ids = np.repeat(np.arange(len(labels)), [len(starts) for starts in line_starts])
+        self.line_ids = np.repeat(np.arange(len(self.line_offsets) - 1), np.diff(self.line_offsets))
+
+    def __len__(self):
+        return len(self.labels)
+
+    def num_words(self):
+        """ Return the number of tokens of each document
+        Returns:
+            num_words (np.ndarray): number of tokens (int64) in each document of the batch
+        """
+        return np.diff(self.offsets)
+
+    def split(self, values):
+        """ Split an array with one value per token into one array per document
+        Args:
+            values (np.ndarray): one value per token of the batch
+        Returns:
+            parts (list): array of the values of each document
+        """
+        return np.split(values, self.offsets[1:-1])
+
+    def counts(self):
+        """ Count the unique tokens of every document (computed once per batch and shared by all the statistics)
+        Returns:
+            doc_ids (np.ndarray): index of the document of each (document, token) pair
+            tokens (np.ndarray): id of the token of each pair
+            counts (np.ndarray): number of times the token appears in the document
+
+        Pairs are grouped by document and, within a document, ordered by the first appearance of the token.
+        """
+        if self._counts is None:
+            # one combined key per (document, token) pair, so that a single np.unique counts every document
+            vocab_size = max(len(self.vocab), 1)
+            keys = self.doc_ids.astype(np.int64) * vocab_size + self.tokens
+            unique_keys, first, counts = np.unique(keys, return_index=True, return_counts=True)
+
+            # np.unique sorts by key, so restore the order in which the pairs first appear
+            order = np.argsort(first, kind='stable')
+            unique_keys, counts = unique_keys[order], counts[order]
+            self._counts = (unique_keys // vocab_size, unique_keys % vocab_size, counts)
+        return self._counts
+
+    def previous(self):
+        """ Find where each token last appeared in its document (computed once per batch and shared by all the
+        statistics)
+        Returns:
+            previous (np.ndarray): position (int64, in tokens) of the previous occurrence of the same word in the same
+                                   document, or -1 for its first occurrence
+        """
+        if self._previous is None:
+            # sorting the positions by (document, token) puts the occurrences of each word of a document next to
+            # each other, in order
+            order = np.lexsort((self.tokens, self.doc_ids))
+            same = np.concatenate([[False], (self.tokens[order][1:] == self.tokens[order][:-1]) &
+                                   (self.doc_ids[order][1:] == self.doc_ids[order][:-1])])
+            self._previous = np.full(len(self.tokens), -1, dtype=np.int64)
+            self._previous[order[same]] = order[np.flatnonzero(same) - 1]
+        return self._previous
+
+
+def word_count(batch, deps):
+    """ Count how often each unique word appears in each document
+    Args:
+        batch (TokenBatch): tokens of the documents
+        deps (dict): values of the statistics this one depends on (none), one list per statistic
+    Returns:
+        word_counts (list): Counter of the frequency (int) of each word (str) in each document, in order of first
+                            appearance
+    """
+    doc_ids, tokens, counts = batch.counts()
+    bounds = np.searchsorted(doc_ids, np.arange(len(batch) + 1))
+    words = batch.vocab.words
+    tokens, counts = tokens.tolist(), counts.tolist()
+    return [Counter({words[token]: count for token, count in zip(tokens[bounds[i]:bounds[i + 1]],
+                                                                 counts[bounds[i]:bounds[i + 1]])})
+            for i in range(len(batch))]
+
+
+def num_words(batch, deps):
+    """ Count the words in each document
+    Args:
+        batch (TokenBatch): tokens of the documents
+        deps (dict): values of the statistics this one depends on (none), one list per statistic
+    Returns:
+        num_words (list): number of clean words (int) in each document
+    """
+    return batch.num_words().tolist()
+
+
+def word_length_list(batch, deps):
+    """ List the length of every word in each document
+    Args:
+        batch (TokenBatch): tokens of the documents
+        deps (dict): values of the statistics this one depends on (none), one list per statistic
+    Returns:
+        word_length_lists (list): list of the length (int) of each clean word, in order, for each document
+    """
+    return [lengths.tolist() for lengths in batch.split(batch.lengths)]
+
+
+def avg_word_length(batch, deps):
+    """ Compute the average word length of each document
+    Args:
+        batch (TokenBatch): tokens of the documents
+        deps (dict): values of the statistics this one depends on ('numwords'), one list per statistic
+    Returns:
+        avg_word_lengths (list): average number of characters per clean word (float) of each document
+    """
+    total_lengths = np.bincount(batch.doc_ids, weights=batch.lengths, minlength=len(batch))
+    return (total_lengths / np.asarray(deps['numwords'])).tolist()
+
+
+def type_token_ratio(batch, deps):
+    """ Compute the type-token ratio (unique words / words) of each document
+    Args:
+        batch (TokenBatch): tokens of the documents
+        deps (dict): values of the statistics this one depends on ('numwords'), one list per statistic
+    Returns:
+        type_token_ratios (list): type-token ratio (float) of each document
+    """
+    doc_ids, _, _ = batch.counts()
+    types = np.bincount(doc_ids, minlength=len(batch))
+    return (types / np.asarray(deps['numwords'])).tolist()
+
+
+def hapax_count(batch, deps):
+    """ Count the words that appear exactly once (hapax legomena) in each document
+    Args:
+        batch (TokenBatch): tokens of the documents
+        deps (dict): values of the statistics this one depends on (none), one list per statistic
+    Returns:
+        hapax_counts (list): number of hapax legomena (int) in each document
+    """
+    doc_ids, _, counts = batch.counts()
+    return np.bincount(doc_ids[counts == 1], minlength=len(batch)).tolist()
+
+
+# statistics every framework knows how to compute: name -> (function, names of the statistics the function needs)
+METRICS = {
+    'wordcount': (word_count, ()),
+    'numwords': (num_words, ()),
+    'wordlengthlist': (word_length_list, ()),
+    'avgwordlength': (avg_word_length, ('numwords',)),
+    'typetokenratio': (type_token_ratio, ('numwords',)),
+    'hapaxcount': (hapax_count, ()),
+    'mattr': (nlp_diversity.mattr, ()),
+    'mtld': (nlp_diversity.mtld, ()),
+    'ttrgrowth': (nlp_diversity.ttr_growth, ()),
+    'linesentiment': (nlp_sentiment.line_sentiment, ()),
+    'versesentiment': (nlp_sentiment.verse_sentiment, ()),
+    'sentimentarc': (nlp_sentiment.sentiment_arc, ('linesentiment',))
+}
+
+
+def schedule(metrics, registry):
+    """ Order a set of statistics so that each one comes after the statistics it depends on
+    Args:
+        metrics (list): names (str) of the statistics to compute
+        registry (dict): maps the name of each statistic to its (function, dependencies)
+    Returns:
+        order (list): names of the statistics and all of their dependencies, dependencies first
+    """
+    order = []
+    visiting = set()
+
+    def visit(metric):
+        if metric in order:
+            return
+        assert metric not in visiting, 'Statistic "' + metric + '" depends on itself'
+        visiting.add(metric)
+        for dep in registry[metric][1]:
+            visit(dep)
+        visiting.discard(metric)
+        order.append(metric)
+
+    for metric in metrics:
+        visit(metric)
+    return order
@@ -5,66 +5,435 @@ Reusable NLP Library - HW3
 2/27/2023
 
 nlp_parsers.py: JSON, CSV, Excel, and optional custom parsers to store the contents of a file into a list of its words
+
+Parsers are registered by name with register_parser. Each parser receives a batch of texts (a Pandas series, one
+entry per row of the text column) and returns the words (str) of each line found in that batch (e.g., one line per
+row, or per line of a song's lyrics), or just the list of its words. custom_parser reads the file in chunks, hands each
+chunk to the parser (optionally in parallel), and joins the lines of every chunk.
+
+Large text and CSV files can also be split into byte ranges that start at the beginning of a line, each parsed by a
+separate process that maps the file into memory (mmap) and reads only its own range, so a single huge file is spread
+over every core without its contents ever being pickled to the workers.
 """
 # import necessary libraries
+from concurrent.futures import ProcessPoolExecutor
+import functools
+import io
+import locale
+import mmap
+import os
+import pickle
+import numpy as np
 import pandas as pd
 
+# number of rows of a file handed to a parser at once
+CHUNKSIZE = 10000
+
+# number of distinct words whose normalized form each normalizer remembers
+NORMALIZE_CACHE_SIZE = 200000
+
+# number of byte ranges a file is split into per process, so that a slow range doesn't leave the other processes idle
+RANGES_PER_JOB = 4
+
+# parsers that can be used by name: name -> function
+PARSERS = {}
+
+# word normalizers (stemmers and lemmatizers) that can be used by name: name -> memoized function
+NORMALIZERS = {}
+
+
+def register_parser(name, parser=None):
+    """ Register a parser so that it can be used by name in custom_parser and Nlp.load_text
+    Args:
+        name (str): name of the parser (case-insensitive)
+        parser (function): function that receives a batch of texts (pd.Series) and returns a list with the list of
+                           words (str) of each line of the batch, so that statistics per line (e.g., linesentiment)
+                           are kept. It may instead return a flat list of words (str), in which case the whole batch
+                           counts as a single line. If omitted, register_parser returns a decorator
+    Returns:
+        parser (function): the registered parser
+
+    To parse with several processes (n_jobs > 1), the parser is pickled to the workers, so it must be defined at the
+    top level of a module (not a lambda or a function nested in another one). Other parsers still work, but parse
+    files with a single process.
+    """
+    assert isinstance(name, str), 'The name of the parser must be a string'
+
+    def decorator(func):
+        assert callable(func), 'The parser must be a callable function'
+        PARSERS[name.lower()] = func
+        return func
+
+    if parser is None:
+        return decorator
+    return decorator(parser)
+
+
+@register_parser('csv')
+@register_parser('json')
+@register_parser('excel')
+def _strip_parser(texts):
+    """ Default parser for JSON, CSV, and Excel files: each entry of the text column is one word, on its own line
+    Args:
+        texts (pd.Series): batch of texts
+    Returns:
+        lines (list): one list per row, holding its entry (str) without leading and trailing white-spaces
+    """
+    return [[text] for text in texts.astype(str).str.strip().tolist()]
+
+
+@register_parser('lyrics')
+def lyrics_parser(texts):
+    """ Parser for song lyrics that drops section tags (e.g., [Chorus]) and ad-libs in parentheses (e.g., (Ooh, ooh))
+    before splitting the lyrics into lowercase words the way the default text parser does
+    Args:
+        texts (pd.Series): batch of lyrics
+    Returns:
+        lines (list): one list per line of the lyrics, holding its words (str)
+    """
+    texts = texts.astype(str).str.replace(r'\[[^\]]*\]', ' ', regex=True).str.replace(r'\([^)]*\)', ' ', regex=True)
+
+    # number the lines of every song, so that each word remembers the line it came from (its index)
+    lines = texts.str.split(r'\r?\n', regex=True).explode().reset_index(drop=True)
+    words = lines.str.lower().str.split().explode().dropna()
+
+    # filter out possible non-words (e.g., 'words' that start with a number) and remove punctuation from their ends
+    words = words[words.str[0].str.isalpha()]
+    words = words.str.replace(r'[\W\d_]+$', '', regex=True)
+
+    # cut the words back into their lines (blank lines stay as empty lines, like in a txt file)
+    bounds = [0] + np.cumsum(np.bincount(words.index.to_numpy(dtype=np.int64), minlength=len(lines))).tolist()
+    words = words.tolist()
+    return [words[start:end] for start, end in zip(bounds[:-1], bounds[1:])]
 
-def custom_parser(filename, text_column, parser):
-    """ Reads in a file to make a Pandas dataframe out of and returns a list of only the words of interest
+
+def _read_batches(filename, text_column, chunksize=CHUNKSIZE):
+    """ Read the texts of a file in batches of rows
     Args:
         filename (str): name of the file of interest
         text_column (str): name of column of interest from the dataframe (which contains the texts)
-        parser (str): type of custom parser to be used
+        chunksize (int): number of rows per batch
+    Returns:
+        batches (generator): batches of texts (pd.Series)
+    """
+    # CSV files are streamed, so only one chunk of a large file is in memory at a time
+    if filename.endswith('csv'):
+        for df in pd.read_csv(filename, usecols=[text_column], chunksize=chunksize):
+            yield df[text_column].dropna()
+
+    # each line of a txt file is one text
+    elif filename.endswith('txt'):
+        with open(filename, 'r') as text_file:
+            lines = []
+            for line in text_file:
+                lines.append(line)
+                if len(lines) == chunksize:
+                    yield pd.Series(lines)
+                    lines = []
+            if lines:
+                yield pd.Series(lines)
+
+    else:
+        # read in JSON or Excel file into a dataframe
+        df = pd.read_json(filename) if filename.endswith('json') else pd.read_excel(filename)
+        df_text = df[text_column].dropna()
+        for start in range(0, len(df_text), chunksize):
+            yield df_text.iloc[start:start + chunksize]
+
+
+def line_words(row):
+    """ Split one line of a txt file into words the way the default parser does
+    Args:
+        row (str): line of text (without its line break)
     Returns:
-        clean_words_list (list): list of words (str) from the file without whitespace characters
+        words (list): lowercase words (str) of the line, without blank words, possible non-words (e.g., 'words' that
+                      start with a number), and punctuation at their ends
+    """
+    words = []
+    for word in row.split(' '):
+        # change all letters to lower case and remove leading and trailing white-spaces
+        word = word.lower().strip()
+        # filter out blank words and possible non-words (e.g., 'words' that start with a number)
+        if word != '' and word[0].isalpha():
+            # remove punctuation from the end of words
+            while not word[-1].isalpha():
+                word = word[:-1]
+            words.append(word)
+    return words
 
-    These parsers are for non-txt files only.
+
+def split_ranges(filename, n_ranges, start=0):
+    """ Split a file into byte ranges of about the same size that each start at the beginning of a line
+    Args:
+        filename (str): name of the file of interest
+        n_ranges (int): number of ranges wanted (fewer are returned for files with fewer lines)
+        start (int): byte the first range starts at (e.g., after the header of a CSV file)
+    Returns:
+        ranges (list): (start, end) byte offsets (int) of each range
+    """
+    size = os.path.getsize(filename)
+    if size <= start:
+        return []
+
+    bounds = [start]
+    with open(filename, 'rb') as file, mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+        for i in range(1, n_ranges):
+            # each range ends right after the first line break past its share of the file
+            target = max(start + (size - start) * i // n_ranges, bounds[-1])
+            line_break = mapped.find(b'\n', target)
+            if line_break == -1 or line_break + 1 >= size:
+                break
+            if line_break + 1 > bounds[-1]:
+                bounds.append(line_break + 1)
+
+    bounds.append(size)
+    return list(zip(bounds[:-1], bounds[1:]))
+
+
+def _read_range(filename, start, end):
+    """ Read one byte range of a file through a memory map of the file
+    Args:
+        filename (str): name of the file of interest
+        start (int): first byte of the range
+        end (int): byte after the last byte of the range
+    Returns:
+        contents (bytes): the bytes of the range
+    """
+    with open(filename, 'rb') as file, mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+        return mapped[start:end]
+
+
+def _tokenize_range(filename, start, end, stop_words, encoding):
+    """ Tokenize the lines of one byte range of a txt file, leaving out stop words (runs in a worker process)
+    Args:
+        filename (str): name of the file of interest
+        start (int): first byte of the range (the start of a line)
+        end (int): byte after the last byte of the range (the end of a line)
+        stop_words (frozenset): stop words to leave out
+        encoding (str): encoding of the file
+    Returns:
+        words (list): the distinct clean words (str) of the range, in order of first appearance
+        ids (np.ndarray): index (int32) in words of each clean word of the range
+        line_offsets (np.ndarray): index (int32) of the first clean word of each line of the range, followed by the
+                                   number of clean words
+    """
+    # universal newlines, as when the file is read in text mode
+    text = _read_range(filename, start, end).decode(encoding).replace('\r\n', '\n').replace('\r', '\n')
+    rows = text.split('\n')
+    if rows[-1] == '':
+        rows.pop()
+
+    # the words of the range are numbered locally, so only the distinct words and compact ids go back to the parent
+    local_ids = {}
+    words = []
+    ids = []
+    line_offsets = [0]
+    for row in rows:
+        for word in line_words(row):
+            if word not in stop_words:
+                token = local_ids.get(word)
+                if token is None:
+                    token = local_ids[word] = len(words)
+                    words.append(word)
+                ids.append(token)
+        line_offsets.append(len(ids))
+
+    return words, np.array(ids, dtype=np.int32), np.array(line_offsets, dtype=np.int32)
+
+
+def tokenize_parallel(filename, stop_words, n_jobs):
+    """ Tokenize a large txt file with several processes, each reading a line-aligned byte range of it through mmap
+    Args:
+        filename (str): name of the file of interest
+        stop_words (list): stop words (str) to leave out
+        n_jobs (int): number of processes
+    Returns:
+        parts (list): (words, ids, line_offsets) of each range in file order, as returned by _tokenize_range
+    """
+    assert isinstance(n_jobs, int) and n_jobs > 0, 'The number of processes must be a positive integer'
+
+    ranges = split_ranges(filename, n_jobs * RANGES_PER_JOB)
+    starts = [start for start, _ in ranges]
+    ends = [end for _, end in ranges]
+    stop_words = frozenset(stop_words)
+    encoding = locale.getpreferredencoding(False)
+
+    with ProcessPoolExecutor(max_workers=n_jobs) as executor:
+        return list(executor.map(_tokenize_range, [filename] * len(ranges), starts, ends,
+                                 [stop_words] * len(ranges), [encoding] * len(ranges)))
+
+
+def _parse_csv_range(filename, start, end, columns, text_column, func):
+    """ Parse the texts of one byte range of a CSV file (runs in a worker process)
+    Args:
+        filename (str): name of the file of interest
+        start (int): first byte of the range (the start of a record)
+        end (int): byte after the last byte of the range (the end of a record)
+        columns (list): names (str) of the columns of the file, read from its header
+        text_column (str): name of column of interest (which contains the texts)
+        func (function): registered parser
+    Returns:
+        lines (list): lines found in the range, as returned by the parser
+    """
+    df = pd.read_csv(io.BytesIO(_read_range(filename, start, end)), header=None, names=columns,
+                     usecols=[text_column])
+    return func(df[text_column].dropna())
+
+
+def _csv_ranges(filename, n_ranges):
+    """ Split the records of a CSV file (after its header) into line-aligned byte ranges
+    Args:
+        filename (str): name of the CSV file
+        n_ranges (int): number of ranges wanted
+    Returns:
+        columns (list): names (str) of the columns of the file
+        ranges (list): (start, end) byte offsets (int) of each range
+    """
+    columns = pd.read_csv(filename, nrows=0).columns.tolist()
+    with open(filename, 'rb') as csv_file:
+        header_end = len(csv_file.readline())
+    return columns, split_ranges(filename, n_ranges, start=header_end)
+
+
+def _picklable(func):
+    """ Check whether a parser can be sent to worker processes
+    Args:
+        func (function): the parser
+    Returns:
+        picklable (bool): whether the parser can be pickled (i.e., is defined at the top level of a module)
+    """
+    try:
+        pickle.dumps(func)
+    except (pickle.PicklingError, AttributeError, TypeError):
+        return False
+    return True
+
+
+def custom_parser(filename, text_column, parser, chunksize=CHUNKSIZE, n_jobs=1, by_line=False):
+    """ Reads in a file in batches of rows and returns a list of only the words of interest
+    Args:
+        filename (str): name of the file of interest
+        text_column (str): name of column of interest from the dataframe (which contains the texts)
+        parser (str): name of a registered parser (e.g., "CSV", "JSON", "Excel", "lyrics")
+        chunksize (int): number of rows handed to the parser at once
+        n_jobs (int): number of processes that parse batches in parallel
+        by_line (bool): whether to return the words of each line of the file separately
+    Returns:
+        clean_words_list (list): list of words (str) from the file without whitespace characters, or one such list
+                                 per line if by_line is True
 
     The default parsers contained in this function include "CSV" for CSV files, "JSON" for JSON files, and "Excel" for
-    Excel files. Any others with different names are assumed to be custom and must be imported.
+    Excel files, which keep each entry of the text column as one word on its own line, and "lyrics", which keeps the
+    lines of the lyrics. Any others must be registered with register_parser first; a parser that returns a flat list
+    of words makes each of its batches a single line.
+
+    With several processes, a CSV file is split into line-aligned byte ranges that each process reads on its own
+    through mmap, so its records must not contain line breaks (e.g., inside quoted texts). A parser that cannot be
+    pickled (e.g., a lambda) cannot be sent to the processes, so the file is then parsed by a single process.
     """
     assert isinstance(filename, str), 'File name must be specified as a string'
     assert filename[-3:] in ('csv', 'txt', 'son', 'xls', 'lsx', 'lsm'), 'File type unsupported'
     assert isinstance(text_column, str), 'The column of the new dataframe which contains the texts must be specified ' \
                                          'as a string'
+    assert isinstance(parser, str), 'The parser must be specified by its name as a string'
+    assert parser.lower() in PARSERS, 'Unknown parser "' + parser + '". Register it with register_parser first'
+    assert isinstance(chunksize, int) and chunksize > 0, 'The number of rows per batch must be a positive integer'
+    assert isinstance(n_jobs, int) and n_jobs > 0, 'The number of processes must be a positive integer'
 
-    # initialize empty list
-    clean_words_list = []
+    # initialize empty list of lines
+    lines = []
 
-    # read in JSON file into a dataframe
-    if filename[-3:] == 'json':
-        df = pd.read_json(filename)
+    func = PARSERS[parser.lower()]
 
-    # read in CSV file into a dataframe
-    elif filename[-3:] == 'csv':
-        df = pd.read_csv(filename)
+    # the pool would fail on a parser it cannot pickle, so such parsers run in this process instead
+    if n_jobs > 1 and not _picklable(func):
+        print('Parser "' + parser + '" cannot be pickled (it must be defined at the top level of a module to run in '
+              'several processes), so the file is parsed by a single process')
+        n_jobs = 1
 
-    # read in Excel file into a dataframe
+    # parse the batches in order, in separate processes if requested
+    if n_jobs > 1 and filename.endswith('csv'):
+        # each process reads its own range of the file instead of receiving pickled batches
+        columns, ranges = _csv_ranges(filename, n_jobs * RANGES_PER_JOB)
+        with ProcessPoolExecutor(max_workers=n_jobs) as executor:
+            parsed_batches = list(executor.map(_parse_csv_range, [filename] * len(ranges),
+                                               [start for start, _ in ranges], [end for _, end in ranges],
+                                               [columns] * len(ranges), [text_column] * len(ranges),
+                                               [func] * len(ranges)))
+    elif n_jobs > 1:
+        with ProcessPoolExecutor(max_workers=n_jobs) as executor:
+            parsed_batches = list(executor.map(func, _read_batches(filename, text_column, chunksize=chunksize)))
     else:
-        df = pd.read_excel(filename)
+        parsed_batches = map(func, _read_batches(filename, text_column, chunksize=chunksize))
+
+    for batch_lines in parsed_batches:
+        # Ensures the parser returns a list of words, or a list of lines of words
+        assert isinstance(batch_lines, list), 'The parser must return a list of words or of lines of words'
+        if batch_lines and all(isinstance(word, str) for word in batch_lines):
+            batch_lines = [batch_lines]
+        assert all(isinstance(words, list) and all(isinstance(word, str) for word in words) for words in batch_lines), \
+            'The parser must return a list of words or of lines of words'
+        lines += batch_lines
+
+    if by_line:
+        return lines
+    return [word for words in lines for word in words]
+
+
+def register_normalizer(name, normalizer):
+    """ Register a word normalizer (e.g., a stemmer or lemmatizer) so that it can be used by name in Nlp.load_text.
+    Its results are memoized in a bounded LRU cache, so each distinct word is only normalized once per process (worker
+    processes forked after the cache is warm share its contents)
+    Args:
+        name (str): name of the normalizer (case-insensitive)
+        normalizer (function): function that receives a word (str) and returns its normalized form (str)
+    Returns:
+        normalizer (function): the memoized normalizer
+    """
+    assert isinstance(name, str), 'The name of the normalizer must be a string'
+    assert callable(normalizer), 'The normalizer must be a callable function'
 
-    # get the column that has the texts
-    df_text = df[text_column]
+    NORMALIZERS[name.lower()] = functools.lru_cache(maxsize=NORMALIZE_CACHE_SIZE)(normalizer)
+    return NORMALIZERS[name.lower()]
 
-    # turn the column of texts into a list
-    words_list = list(df_text)
 
-    # parse a JSON, CSV, or Excel file with an appropriate default parser
-    if parser.lower() in ['json', 'csv', 'excel']:
-        for word in words_list:
-            # remove leading and trailing white-spaces
-            word = word.strip()
-            clean_words_list.append(word)
+def _nltk_normalizer(name):
+    """ Create one of the NLTK stemmers or lemmatizers the first time it is used
+    Args:
+        name (str): 'porter', 'snowball', 'lancaster', or 'wordnet' (which needs nltk.download('wordnet'))
+    Returns:
+        normalizer (function): function normalizing one word (str)
+    """
+    from nltk.stem import LancasterStemmer, PorterStemmer, SnowballStemmer, WordNetLemmatizer
+
+    if name == 'porter':
+        return PorterStemmer().stem
+    elif name == 'snowball':
+        return SnowballStemmer('english').stem
+    elif name == 'lancaster':
+        return LancasterStemmer().stem
     else:
-        # If a user wants to use a custom parser, make sure they input a string indicating a callable function
-        assert (callable(parser)), "The name of your parser must be a callable function. Don't forget to import it " \
-                                   "if necessary"
-        # parse a JSON, CSV, or Excel file with a custom parser
-        clean_words_list = parser(words_list)
-        # Ensures the custom parser returns a list of words
-        assert isinstance(clean_words_list, list), 'The custom parser must return a list of words'
-        assert all(isinstance(clean_word, str) for clean_word in clean_words_list), 'The custom parser must return a ' \
-                                                                                    'list of words '
-
-    return clean_words_list
+        lemmatizer = WordNetLemmatizer()
+        # lemmatize words as verbs first (loved -> love), then as nouns (songs -> song)
+        return lambda word: lemmatizer.lemmatize(lemmatizer.lemmatize(word, pos='v'), pos='n')
+
+
+def normalize_words(words, normalizer):
+    """ Normalize a list of words (e.g., to their stems, so that "love", "loved", and "loving" are counted together)
+    Args:
+        words (list): list of words (str)
+        normalizer (str): name of a registered normalizer, or one of the NLTK normalizers 'porter', 'snowball',
+                          'lancaster', and 'wordnet'
+    Returns:
+        normalized_words (list): normalized form (str) of each word
+    """
+    assert isinstance(normalizer, str), 'The normalizer must be specified by its name as a string'
+
+    name = normalizer.lower()
+    if name not in NORMALIZERS:
+        assert name in ('porter', 'snowball', 'lancaster', 'wordnet'), 'Unknown normalizer "' + normalizer + \
+                                                                       '". Register it with register_normalizer first'
+        register_normalizer(name, _nltk_normalizer(name))
+
+    func = NORMALIZERS[name]
+    return [func(word) for word in words]
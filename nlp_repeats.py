@@ -0,0 +1,184 @@
+"""
+Jethro Lee and Michelle Wang
+DS 3500
+Reusable NLP Library - HW3
+2/27/2023
+
+nlp_repeats.py: Repeated multi-word spans (choruses, refrains, hooks) found with a suffix array and an LCP array over
+the token ids of a document, both built with NumPy in O(n log n) time by prefix doubling
+"""
+# import necessary libraries
+import numpy as np
+
+# number of longest repeated phrases kept for each document
+TOP_REPEATS = 5
+
+# data stored for a document whose repetitions are indexed (index arrays, then the statistics derived from them)
+RESULTS = ('suffixarray', 'lcp', 'repetitionratio', 'longestrepeats', 'toprepeat')
+
+
+def suffix_array(tokens):
+    """ Sort the suffixes of a document and measure how much each one shares with the one before it
+    Args:
+        tokens (np.ndarray): word ids of the document
+    Returns:
+        suffixes (np.ndarray): start (int32) of each suffix, in lexicographic order of the suffixes
+        lcp (np.ndarray): length (int32) of the longest common prefix of each suffix (in sorted order) and the one
+                          before it (0 for the first)
+    """
+    n = len(tokens)
+    if n == 0:
+        return np.zeros(0, dtype=np.int32), np.zeros(0, dtype=np.int32)
+
+    # ranks[j] orders the suffixes by their first 2 ** j tokens (equal ranks mean equal prefixes)
+    rank = np.unique(tokens, return_inverse=True)[1].astype(np.int64).ravel()
+    ranks = [rank]
+    order = np.argsort(rank, kind='stable')
+    width = 1
+
+    while width < n and rank[order[-1]] < n - 1:
+        # sort by (rank of the first half, rank of the second half), where a missing second half comes first
+        second = np.full(n, -1, dtype=np.int64)
+        second[:n - width] = rank[width:]
+        order = np.lexsort((second, rank))
+
+        # suffixes get the same new rank only if both halves match
+        changed = (rank[order][1:] != rank[order][:-1]) | (second[order][1:] != second[order][:-1])
+        rank = np.empty(n, dtype=np.int64)
+        rank[order] = np.concatenate([[0], np.cumsum(changed)])
+        ranks.append(rank)
+        width *= 2
+
+    # the common prefix of neighbouring suffixes is measured one power of two at a time, longest first, with the
+    # rank tables of the doubling steps (equal ranks at step j mean the next 2 ** j tokens are equal)
+    left, right = order[:-1].astype(np.int64), order[1:].astype(np.int64)
+    lcp = np.zeros(n - 1, dtype=np.int64)
+    for j in range(len(ranks) - 1, -1, -1):
+        i, k = left + lcp, right + lcp
+        valid = (i < n) & (k < n)
+        same = valid & (ranks[j][np.minimum(i, n - 1)] == ranks[j][np.minimum(k, n - 1)])
+        lcp += same * (1 << j)
+
+    return order.astype(np.int32), np.concatenate([[0], lcp]).astype(np.int32)
+
+
+def _phrase(tokens, start, length, vocab):
+    """ Decode the span of a document starting at start into a phrase (str) """
+    return ' '.join(vocab.decode(tokens[start:start + length]))
+
+
+def repetition_ratio(tokens, suffixes, lcp, min_length=3):
+    """ Compute the share of a document's words that belong to a span of at least min_length words which appears
+    more than once
+    Args:
+        tokens (np.ndarray): word ids of the document
+        suffixes (np.ndarray): suffix array of the document
+        lcp (np.ndarray): LCP array of the document
+        min_length (int): minimum length (in words) of the repeated spans
+    Returns:
+        ratio (float): share of the words (between 0 and 1) covered by repeated spans
+    """
+    n = len(tokens)
+    if n == 0:
+        return 0.0
+
+    # the longest repeated span starting at each position is its longest common prefix with either neighbour
+    longest = np.zeros(n, dtype=np.int64)
+    longest[suffixes] = np.maximum(lcp, np.concatenate([lcp[1:], [0]]))
+
+    # mark every repeated span with +1 at its start and -1 past its end, and count the covered positions
+    starts = np.flatnonzero(longest >= min_length)
+    marks = np.zeros(n + 1, dtype=np.int64)
+    np.add.at(marks, starts, 1)
+    np.add.at(marks, starts + longest[starts], -1)
+    return float(np.count_nonzero(np.cumsum(marks[:-1]))) / n
+
+
+def _occurrences(lcp, position, length):
+    """ Count the suffixes that share their first length tokens with the suffix at a position of the suffix array """
+    start = position
+    while start > 0 and lcp[start] >= length:
+        start -= 1
+    end = position + 1
+    while end < len(lcp) and lcp[end] >= length:
+        end += 1
+    return end - start
+
+
+def longest_repeats(tokens, suffixes, lcp, vocab, top=TOP_REPEATS):
+    """ Find the longest phrases that appear more than once in a document
+    Args:
+        tokens (np.ndarray): word ids of the document
+        suffixes (np.ndarray): suffix array of the document
+        lcp (np.ndarray): LCP array of the document
+        vocab (Vocabulary): vocabulary the word ids refer to
+        top (int): number of phrases to return
+    Returns:
+        repeats (list): (phrase (str), length in words (int), occurrences (int)) of the longest repeated phrases,
+                        longest first, leaving out phrases that are part of a longer one already listed
+    """
+    repeats = []
+    spans = []
+    for position in np.argsort(-lcp, kind='stable').tolist():
+        length = int(lcp[position])
+        if length == 0 or len(repeats) == top:
+            break
+
+        span = tuple(tokens[suffixes[position]:suffixes[position] + length].tolist())
+        if any(_contains(longer, span) for longer in spans):
+            continue
+        spans.append(span)
+        repeats.append((_phrase(tokens, suffixes[position], length, vocab), length,
+                        _occurrences(lcp, position, length)))
+    return repeats
+
+
+def _contains(longer, span):
+    """ Tell whether a span of token ids (tuple) appears inside a longer one """
+    return any(longer[i:i + len(span)] == span for i in range(len(longer) - len(span) + 1))
+
+
+def most_repeated(tokens, suffixes, lcp, vocab, min_length=3):
+    """ Find the span of at least min_length words that appears the most times in a document (e.g., the hook)
+    Args:
+        tokens (np.ndarray): word ids of the document
+        suffixes (np.ndarray): suffix array of the document
+        lcp (np.ndarray): LCP array of the document
+        vocab (Vocabulary): vocabulary the word ids refer to
+        min_length (int): minimum length (in words) of the span
+    Returns:
+        repeat (tuple): (phrase (str), length in words (int), occurrences (int)) of the span, extended to everything
+                        its occurrences have in common, or None if no span of min_length words repeats
+    """
+    # suffixes sharing their first min_length words sit next to each other in the suffix array, linked by LCP
+    # values of at least min_length, so the most repeated span is the longest such run
+    linked = np.concatenate([[False], lcp[1:] >= min_length, [False]]).astype(np.int8)
+    edges = np.flatnonzero(np.diff(linked))
+    if len(edges) == 0:
+        return None
+
+    run_starts, run_ends = edges[0::2], edges[1::2]
+    best = int(np.argmax(run_ends - run_starts))
+    first, last = int(run_starts[best]), int(run_ends[best])
+
+    # every occurrence of the span shares the smallest LCP value of the run
+    length = int(lcp[first + 1:last + 1].min())
+    return _phrase(tokens, suffixes[first], length, vocab), length, last - first + 1
+
+
+def analyze(tokens, vocab, min_length=3):
+    """ Index the repetitions of a document and summarize them
+    Args:
+        tokens (np.ndarray): word ids of the document
+        vocab (Vocabulary): vocabulary the word ids refer to
+        min_length (int): minimum length (in words) of the repeated spans counted by the summaries
+    Returns:
+        results (dict): the suffix array ('suffixarray') and LCP array ('lcp') of the document, the share of its words
+                        in repeated spans ('repetitionratio'), its longest repeated phrases ('longestrepeats'), and its
+                        most repeated span ('toprepeat')
+    """
+    suffixes, lcp = suffix_array(tokens)
+    return {'suffixarray': suffixes, 'lcp': lcp,
+            'repetitionratio': repetition_ratio(tokens, suffixes, lcp, min_length=min_length),
+            'longestrepeats': longest_repeats(tokens, suffixes, lcp, vocab),
+            'toprepeat': most_repeated(tokens, suffixes, lcp, vocab, min_length=min_length)}
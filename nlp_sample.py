@@ -0,0 +1,217 @@
+"""
+Jethro Lee and Michelle Wang
+DS 3500
+Reusable NLP Library - HW3
+2/27/2023
+
+nlp_sample.py: Random samples of the registered documents for quick previews of the visualizations. Every document
+gets a random priority when it is registered, and a sample of any size is the documents with the lowest priorities
+(a bottom-k sample, which is what reservoir sampling keeps, but which also survives documents being removed), either
+over the whole corpus or within each group of a level of the hierarchy (stratified)
+"""
+# import necessary libraries
+import hashlib
+import math
+import numpy as np
+from nlp_store import Snapshot
+
+# z-score of the confidence level of the margins of error shown on previews (95%)
+CONFIDENCE_Z = 1.96
+
+
+def _mix(keys):
+    """ Scramble 64-bit keys into uniformly distributed 64-bit priorities (the finalizer of SplitMix64)
+    Args:
+        keys (np.ndarray): keys (uint64)
+    Returns:
+        mixed (np.ndarray): scrambled keys (uint64)
+    """
+    keys = keys.copy()
+    keys ^= keys >> np.uint64(30)
+    keys *= np.uint64(0xBF58476D1CE4E5B9)
+    keys ^= keys >> np.uint64(27)
+    keys *= np.uint64(0x94D049BB133111EB)
+    keys ^= keys >> np.uint64(31)
+    return keys
+
+
+def document_key(label):
+    """ Derive the random key of a document from its label, so that the same document always gets the same key
+    Args:
+        label (str): label of the document
+    Returns:
+        key (int): 64-bit key of the document
+    """
+    return int.from_bytes(hashlib.blake2b(label.encode('utf-8'), digest_size=8).digest(), 'little')
+
+
+class SampleIndex:
+    """ Random keys of the registered documents, kept up to date as documents are registered and removed, from which
+    samples of any size and seed are drawn without reading the documents
+    Attributes:
+        labels (list): labels (str) of the indexed documents (in no particular order)
+        keys (np.ndarray): random key (uint64) of each document in labels, followed by unused room
+        positions (dict): maps the label of each indexed document to its position in labels
+    """
+
+    def __init__(self):
+        self.labels = []
+        self.keys = np.zeros(0, dtype=np.uint64)
+        self.positions = {}
+
+    def add(self, label):
+        """ Index a document (documents already indexed keep their key)
+        Args:
+            label (str): label of the document
+        Returns:
+            None (just updates the index)
+        """
+        if label in self.positions:
+            return
+
+        if len(self.labels) == len(self.keys):
+            # grow geometrically, so that indexing a document doesn't copy the keys every time
+            grown = np.zeros(max(16, 2 * len(self.keys)), dtype=np.uint64)
+            grown[:len(self.keys)] = self.keys
+            self.keys = grown
+
+        self.positions[label] = len(self.labels)
+        self.keys[len(self.labels)] = document_key(label)
+        self.labels.append(label)
+
+    def remove(self, label):
+        """ Stop indexing a document
+        Args:
+            label (str): label of the document
+        Returns:
+            None (just updates the index)
+        """
+        position = self.positions.pop(label, None)
+        if position is None:
+            return
+
+        # the last document takes the place of the removed one
+        last = self.labels.pop()
+        if last != label:
+            self.labels[position] = last
+            self.keys[position] = self.keys[len(self.labels)]
+            self.positions[last] = position
+
+    def freeze(self):
+        """ Copy the index, so that samples can be drawn while documents keep being registered
+        Returns:
+            labels (list): labels (str) of the indexed documents
+            keys (np.ndarray): random key (uint64) of each of them
+        """
+        return list(self.labels), self.keys[:len(self.labels)].copy()
+
+    @staticmethod
+    def build(labels):
+        """ Compute the keys of a set of documents from scratch
+        Args:
+            labels (Iterable): labels (str) of the documents
+        Returns:
+            labels (list): labels (str) of the documents
+            keys (np.ndarray): random key (uint64) of each of them
+        """
+        labels = list(labels)
+        return labels, np.array([document_key(label) for label in labels], dtype=np.uint64)
+
+
+def draw(labels, keys, fraction, seed=0, strata=None):
+    """ Draw a random sample of documents without replacement
+    Args:
+        labels (list): labels (str) of the documents
+        keys (np.ndarray): random key (uint64) of each document
+        fraction (float): share of the documents to draw (at least one document, or one per stratum, is drawn)
+        seed (int): seed of the sample (the same seed draws the same documents, and larger samples with the same seed
+                    contain smaller ones)
+        strata (list): optional stratum (e.g., the album) of each document; the fraction is then drawn from each one
+    Returns:
+        sample (set): labels (str) of the drawn documents
+    """
+    if not labels:
+        return set()
+
+    # the seed reshuffles the priorities of every document at once
+    seed_key = _mix(np.array([seed & 0xFFFFFFFFFFFFFFFF], dtype=np.uint64))[0]
+    priorities = _mix(keys ^ seed_key)
+    if strata is None:
+        strata = np.zeros(len(labels), dtype=np.int64)
+    else:
+        strata = np.unique(np.array([str(stratum) for stratum in strata]), return_inverse=True)[1].ravel()
+
+    # rank the documents of each stratum by priority and keep the lowest ranks
+    order = np.lexsort((priorities, strata))
+    sizes = np.bincount(strata)
+    starts = np.concatenate([[0], np.cumsum(sizes)[:-1]])
+    ranks = np.arange(len(order)) - starts[strata[order]]
+    quotas = np.maximum(1, np.ceil(fraction * sizes)).astype(np.int64)
+    chosen = order[ranks < quotas[strata[order]]]
+    return {labels[i] for i in chosen.tolist()}
+
+
+def mean_bounds(values, population):
+    """ Estimate the mean of a per-document statistic over all the documents from a sample of them
+    Args:
+        values (list): value (float) of the statistic for each sampled document
+        population (int): number of documents the sample was drawn from
+    Returns:
+        mean (float): mean of the sample
+        margin (float): margin of error of the mean at 95% confidence (with the finite population correction, so it
+                        shrinks to 0 as the sample covers every document)
+    """
+    values = np.asarray(values, dtype=np.float64)
+    size = len(values)
+    if size < 2 or population <= 1:
+        return (float(values.mean()) if size else 0.0), 0.0
+
+    correction = math.sqrt(max(population - size, 0) / (population - 1))
+    margin = CONFIDENCE_Z * values.std(ddof=1) / math.sqrt(size) * correction
+    return float(values.mean()), float(margin)
+
+
+def sample_data(data, sample, info, evaluate):
+    """ Build the data dictionary of a sample of the documents: keyed like the framework's data, but holding only the
+    sampled documents, so that it can be handed to any visualization
+    Args:
+        data (Snapshot): snapshot of the framework's data that the sample was drawn from
+        sample (set): labels (str) of the sampled documents
+        info (dict): description of the sample ('fraction', 'seed', 'size', 'population', 'level'), kept as the
+                     sample attribute of the view so that visualizations can label their figures as previews
+        evaluate (function): computes a statistic for some documents of data, given the name of the statistic and the
+                             labels of the documents, and returns a dictionary from label to value
+    Returns:
+        sample_data (Snapshot): read-only data of the sampled documents, computed per statistic (only for the sampled
+                                documents) the first time it is read
+    """
+    # the sampled documents, in registration order
+    labels = [label for label in data.peek('tokens').keys() if label in sample]
+
+    def resolve(view, metric):
+        if metric in view.complete:
+            return
+
+        with view.lock:
+            if metric in view.complete:
+                return
+
+            # values already in the snapshot are reused, the rest are computed for the sampled documents only
+            known = data.peek(metric)
+            values = {label: known[label] for label in labels if label in known}
+            missing = [label for label in labels if label not in values]
+            if missing:
+                values.update(evaluate(metric, missing))
+                # the computed values go back in registration order, like in the framework's data
+                values = {label: values[label] for label in labels if label in values}
+
+            view.publish(metric, values)
+            view.complete.add(metric)
+
+    view = Snapshot(data.version, {label: data.revisions.get(label, 0) for label in labels}, resolve)
+    view.sample = info
+
+    # the documents themselves are read (e.g., to roll the sample up into groups) without going through resolve
+    for key in ('tokens', 'lineoffsets', 'groups'):
+        resolve(view, key)
+    return view
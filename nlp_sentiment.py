@@ -0,0 +1,163 @@
+"""
+Jethro Lee and Michelle Wang
+DS 3500
+Reusable NLP Library - HW3
+2/27/2023
+
+nlp_sentiment.py: Line- and verse-level sentiment scores computed for many documents at once with a vectorized lookup
+of the VADER lexicon over token ids
+"""
+# import necessary libraries
+import functools
+import numpy as np
+
+# normalization constant VADER uses to map a sum of valences to a compound score between -1 and 1
+ALPHA = 15
+
+# number of points each song's sentiment arc is resampled to, so that songs of different lengths can be compared
+ARC_POINTS = 20
+
+
+@functools.lru_cache(maxsize=None)
+def load_lexicon():
+    """ Load the VADER lexicon (requires nltk.download('vader_lexicon'))
+    Returns:
+        lexicon (dict): valence (float) of each word (str) in the lexicon
+    """
+    from nltk.sentiment import SentimentIntensityAnalyzer
+    return SentimentIntensityAnalyzer().lexicon
+
+
+def valences(batch):
+    """ Look up the VADER valence of every token of a batch
+    Args:
+        batch (TokenBatch): tokens of the documents
+    Returns:
+        valences (np.ndarray): valence of each token (0 for words outside the lexicon)
+    """
+    lexicon = load_lexicon()
+    return batch.vocab.feature('valence', lambda word: lexicon.get(word, 0.0), np.float64)[batch.tokens]
+
+
+def split_by_doc(values, doc_ids, num_docs):
+    """ Split an array with one value per line or verse into one array per document
+    Args:
+        values (np.ndarray): one value per line or verse, grouped by document
+        doc_ids (np.ndarray): index of the document of each value (sorted)
+        num_docs (int): number of documents
+    Returns:
+        parts (list): array of the values of each document
+    """
+    bounds = np.searchsorted(doc_ids, np.arange(1, num_docs))
+    return np.split(values, bounds)
+
+
+def compound(sums):
+    """ Normalize sums of valences to compound scores between -1 and 1, like VADER does
+    Args:
+        sums (np.ndarray): sum of the valences of each line or verse
+    Returns:
+        scores (np.ndarray): compound score of each line or verse
+    """
+    return sums / np.sqrt(sums * sums + ALPHA)
+
+
+def _line_sums(batch):
+    """ Sum the valences of the tokens of every line of a batch
+    Returns:
+        sums (np.ndarray): sum of the valences of each line
+        sizes (np.ndarray): number of tokens of each line
+    """
+    sums = np.bincount(batch.line_ids, weights=valences(batch), minlength=len(batch.line_offsets) - 1)
+    return sums, np.diff(batch.line_offsets)
+
+
+def line_sentiment(batch, deps):
+    """ Score the sentiment of every line of each document
+    Args:
+        batch (TokenBatch): tokens of the documents
+        deps (dict): values of the statistics this one depends on (none), one list per statistic
+    Returns:
+        line_sentiments (list): compound score of each line with at least one clean word (np.ndarray), per document
+    """
+    sums, sizes = _line_sums(batch)
+    scores = compound(sums)
+
+    # lines without clean words (blank lines, section tags) carry no sentiment
+    keep = sizes > 0
+    return split_by_doc(scores[keep], batch.line_doc_ids[keep], len(batch))
+
+
+def verse_sentiment(batch, deps):
+    """ Score the sentiment of every verse (block of lines separated by blank lines or section tags) of each document
+    Args:
+        batch (TokenBatch): tokens of the documents
+        deps (dict): values of the statistics this one depends on (none), one list per statistic
+    Returns:
+        verse_sentiments (list): compound score of each verse (np.ndarray), per document
+    """
+    sums, sizes = _line_sums(batch)
+    filled = sizes > 0
+
+    # a verse starts at every non-blank line that follows a blank line or starts a document
+    previous_filled = np.concatenate([[False], filled[:-1]])
+    new_doc = np.concatenate([[True], batch.line_doc_ids[1:] != batch.line_doc_ids[:-1]])
+    starts = filled & (~previous_filled | new_doc)
+    verse_ids = np.cumsum(starts) - 1
+
+    verse_sums = np.bincount(verse_ids[filled], weights=sums[filled], minlength=int(starts.sum()))
+    verse_doc_ids = batch.line_doc_ids[starts]
+    return split_by_doc(compound(verse_sums), verse_doc_ids, len(batch))
+
+
+def sentiment_arc(batch, deps):
+    """ Resample the line sentiment of each document to ARC_POINTS evenly spaced points
+    Args:
+        batch (TokenBatch): tokens of the documents
+        deps (dict): values of the statistics this one depends on ('linesentiment'), one list per statistic
+    Returns:
+        arcs (list): sentiment (np.ndarray of ARC_POINTS floats) from the start to the end of each document
+    """
+    points = np.linspace(0, 1, ARC_POINTS)
+    arcs = []
+    for scores in deps['linesentiment']:
+        if len(scores) == 0:
+            arcs.append(np.zeros(ARC_POINTS))
+        else:
+            arcs.append(np.interp(points, np.linspace(0, 1, len(scores)), scores))
+    return arcs
+
+
+def timeline(line_sentiments, groups=None):
+    """ Aggregate the line sentiment of several documents into one point per document or per group (e.g., era)
+    Args:
+        line_sentiments (dict): maps the label of each document to its line sentiment scores (np.ndarray)
+        groups (dict): optional mapping from the label of each document to its group (str); documents without a
+                       group are left out. Groups keep the order in which they first appear
+    Returns:
+        names (list): name of each point (the document labels, or the groups)
+        means (np.ndarray): mean line sentiment of each point
+        stds (np.ndarray): standard deviation of the line sentiment of each point
+        counts (np.ndarray): number of lines behind each point
+    """
+    labels = list(line_sentiments.keys())
+    if groups is None:
+        names = labels
+        keys = labels
+    else:
+        labels = [label for label in labels if label in groups]
+        keys = [groups[label] for label in labels]
+        names = list(dict.fromkeys(keys))
+
+    # one flat array of every line's score, tagged with the index of its point
+    index = {name: i for i, name in enumerate(names)}
+    scores = [np.asarray(line_sentiments[label], dtype=np.float64) for label in labels]
+    point_ids = np.repeat([index[key] for key in keys], [len(s) for s in scores]).astype(np.int64)
+    flat = np.concatenate(scores) if scores else np.zeros(0)
+
+    counts = np.bincount(point_ids, minlength=len(names))
+    sums = np.bincount(point_ids, weights=flat, minlength=len(names))
+    squares = np.bincount(point_ids, weights=flat * flat, minlength=len(names))
+    means = np.divide(sums, counts, out=np.zeros(len(names)), where=counts > 0)
+    stds = np.sqrt(np.maximum(np.divide(squares, counts, out=np.zeros(len(names)), where=counts > 0) - means ** 2, 0))
+    return names, means, stds, counts
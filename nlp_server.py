@@ -0,0 +1,246 @@
+"""
+Jethro Lee and Michelle Wang
+DS 3500
+Reusable NLP Library - HW3
+2/27/2023
+
+nlp_server.py: Lightweight local HTTP service exposing the framework's results as JSON (and rendered figures), with
+responses cached per version of the corpus and ETag/If-None-Match support so unchanged results are never recomputed
+"""
+# import necessary libraries
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+import hashlib
+import json
+import threading
+import numpy as np
+from exception import QueryParameterError
+
+
+def _param(params, name, default, type_=int, minimum=None):
+    """ Read one query string parameter
+    Args:
+        params (dict): parsed query string (name -> list of values)
+        name (str): name of the parameter
+        default (object): value used when the parameter is missing
+        type_ (type): type the value is converted to
+        minimum (object): optional smallest valid value
+    Returns:
+        value (object): value of the parameter
+    """
+    values = params.get(name)
+    if not values:
+        return default
+
+    # a malformed parameter is the client's mistake, answered with 400 rather than 500
+    try:
+        value = type_(values[0])
+    except ValueError:
+        raise QueryParameterError(name, values[0], 'must be of type ' + type_.__name__)
+    if minimum is not None and value < minimum:
+        raise QueryParameterError(name, values[0], 'must be at least ' + str(minimum))
+    return value
+
+
+def _counts(data, params):
+    """ Top-k words of each document: /counts?k=10 """
+    k = _param(params, 'k', 10, minimum=1)
+    return {label: word_count.most_common(k) for label, word_count in data['wordcount'].items()}
+
+
+def _topk(data, params):
+    """ Top-k words of the whole corpus: /topk?k=10 """
+    total = Counter()
+    for word_count in data['wordcount'].values():
+        total.update(word_count)
+    return total.most_common(_param(params, 'k', 10, minimum=1))
+
+
+def _lengths(data, params):
+    """ Number of words and average word length of each document: /lengths """
+    return {'numwords': dict(data['numwords'].items()), 'avgwordlength': dict(data['avgwordlength'].items())}
+
+
+def _sentiment(data, params):
+    """ Mean line sentiment, number of scored lines, and sentiment arc of each document: /sentiment """
+    arcs = data['sentimentarc']
+    return {label: {'mean': float(np.mean(scores)) if len(scores) else 0.0, 'lines': len(scores),
+                    'arc': arcs[label].tolist()}
+            for label, scores in data['linesentiment'].items()}
+
+
+def _sankey(data, params):
+    """ Links between each document and its top-k words, as used by taylorviz.wordcount_sankey: /sankey?k=5 """
+    k = _param(params, 'k', 5, minimum=1)
+    word_counts = dict(data['wordcount'].items())
+    words = set(word for word_count in word_counts.values() for word, _ in word_count.most_common(k))
+    return [{'source': label, 'target': word, 'value': count}
+            for label, word_count in word_counts.items() for word, count in word_count.items() if word in words]
+
+
+# JSON endpoints: path -> function building the response from a snapshot of the framework's data and the query string
+ENDPOINTS = {
+    '/labels': lambda data, params: list(data['tokens'].keys()),
+    '/counts': _counts,
+    '/topk': _topk,
+    '/lengths': _lengths,
+    '/sentiment': _sentiment,
+    '/sankey': _sankey
+}
+
+
+class ResponseCache:
+    """ Responses of the service, kept until the corpus or the registered visualizations change
+    Attributes:
+        version (tuple): versions of the corpus and of the registered visualizations the cached responses were
+                         computed for
+        responses (dict): maps (path, query string) to (ETag, content type, body)
+    """
+
+    def __init__(self):
+        self.version = None
+        self.responses = {}
+        self._lock = threading.Lock()
+
+    def get(self, key, version, build):
+        """ Return the cached response for a request, building it if the corpus changed since it was cached
+        Args:
+            key (tuple): (path, query string) of the request
+            version (tuple): current versions (int) of the corpus and of the registered visualizations
+            build (function): computes the (content type, body) of the response
+        Returns:
+            response (tuple): (ETag, content type, body)
+        """
+        with self._lock:
+            if version != self.version:
+                # every cached response is stale once a document is added or replaced, or a visualization changes
+                self.responses = {}
+                self.version = version
+            if key in self.responses:
+                return self.responses[key]
+
+        content_type, body = build()
+        etag = '"' + '-'.join(str(part) for part in version) + '-' + hashlib.sha1(body).hexdigest()[:16] + '"'
+
+        with self._lock:
+            if version == self.version:
+                self.responses[key] = (etag, content_type, body)
+        return etag, content_type, body
+
+
+def can_render(vizfunc):
+    """ Tell whether a visualization can be rendered to a PNG image by the service: only matplotlib visualizations
+    drawn on their own figures (marked with taylorviz.offscreen) can, while others (e.g., the plotly Sankey diagram)
+    would open a window or browser tab from the request thread
+    Args:
+        vizfunc (function): the visualization
+    Returns:
+        renderable (bool): whether the visualization can be served as a figure
+    """
+    return getattr(vizfunc, 'offscreen', False)
+
+
+def render_figure(nlp, name, data):
+    """ Render a registered matplotlib visualization to a PNG image, without touching pyplot's global state (backend
+    and open figures), so that the figures of an interactive session running next to the service are left alone
+    Args:
+        nlp (Nlp): framework the visualization is registered with
+        name (str): name of the visualization
+        data (Snapshot): snapshot of the framework's data that the visualization is drawn from
+    Returns:
+        png (bytes): the rendered figure
+    """
+    import taylorviz
+
+    vizfunc, args, kwargs = nlp.viz[name]
+    return taylorviz.render_png(vizfunc, data, *args, **kwargs)
+
+
+class _Handler(BaseHTTPRequestHandler):
+    """ Handles the GET requests of the service """
+
+    def do_GET(self):
+        nlp = self.server.nlp
+        url = urlparse(self.path)
+        params = parse_qs(url.query)
+
+        # every response is built from one consistent snapshot, even while documents keep being registered; the
+        # visualizations are versioned first, so a figure is never cached under a newer version than it was drawn at
+        viz_version = nlp.viz_version
+        data = nlp.snapshot()
+
+        if url.path in ENDPOINTS:
+            def build():
+                payload = ENDPOINTS[url.path](data, params)
+                return 'application/json', json.dumps(payload).encode('utf-8')
+
+        elif url.path.startswith('/figures/') and url.path.endswith('.png') and \
+                url.path[len('/figures/'):-len('.png')] in nlp.viz:
+            name = url.path[len('/figures/'):-len('.png')]
+            if not can_render(nlp.viz[name][0]):
+                self.send_error(415, 'The visualization "' + name + '" cannot be rendered as a PNG image')
+                return
+
+            def build():
+                # each figure is drawn on its own off-screen canvas, so requests can render at the same time
+                return 'image/png', render_figure(nlp, name, data)
+
+        else:
+            self.send_error(404, 'Unknown endpoint')
+            return
+
+        try:
+            etag, content_type, body = self.server.cache.get((url.path, url.query), (data.version, viz_version),
+                                                             build)
+        except QueryParameterError as e:
+            self.send_error(400, 'Invalid parameter "' + e.name + '": ' + e.msg)
+            return
+        except Exception as e:
+            self.send_error(500, str(e))
+            return
+
+        # the client already has the current response
+        if self.headers.get('If-None-Match') == etag:
+            self.send_response(304)
+            self.send_header('ETag', etag)
+            self.end_headers()
+            return
+
+        self.send_response(200)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.send_header('ETag', etag)
+        self.send_header('Cache-Control', 'no-cache')
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        # keep the console quiet while dashboards poll the service
+        pass
+
+
+class AnalyticsServer(ThreadingHTTPServer):
+    """ HTTP server exposing the results of a framework
+    Attributes:
+        nlp (Nlp): framework whose results are served
+        cache (ResponseCache): responses computed for the current version of the corpus and visualizations
+    """
+    daemon_threads = True
+
+    def __init__(self, nlp, host='127.0.0.1', port=8000):
+        super().__init__((host, port), _Handler)
+        self.nlp = nlp
+        self.cache = ResponseCache()
+
+    def precompute(self):
+        """ Compute the default response of every JSON endpoint ahead of the first request
+        Returns:
+            None (just fills the cache)
+        """
+        viz_version = self.nlp.viz_version
+        data = self.nlp.snapshot()
+        for path, endpoint in ENDPOINTS.items():
+            def build():
+                return 'application/json', json.dumps(endpoint(data, {})).encode('utf-8')
+            self.cache.get((path, ''), (data.version, viz_version), build)
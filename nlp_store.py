@@ -0,0 +1,503 @@
+"""
+Jethro Lee and Michelle Wang
+DS 3500
+Reusable NLP Library - HW3
+2/27/2023
+
+nlp_store.py: Storage for the framework's data: the vocabulary that documents are encoded with, the lazily computed
+data dictionary, and its disk-backed variant used when a corpus is too large to keep in memory
+"""
+# import necessary libraries
+import pickle
+import sqlite3
+import threading
+import weakref
+from collections import defaultdict
+from collections.abc import Mapping, MutableMapping, KeysView, ValuesView, ItemsView
+from types import MappingProxyType
+import numpy as np
+from exception import StoreError
+
+# number of rows fetched from the store at once when iterating over a statistic
+PAGE_SIZE = 512
+
+
+class Vocabulary:
+    """ Two-way mapping between words and the integer ids that registered documents are stored as
+    Attributes:
+        ids (dict): maps each word (str) to its id (int)
+        words (list): maps each id (int, the list index) to its word (str)
+    """
+
+    def __init__(self, words=None):
+        self.ids = {}
+        self.words = []
+        self._features = {}
+
+        # documents may be encoded by several threads at once, and a word must only get one id
+        self._lock = threading.Lock()
+
+        if words is not None:
+            self.encode(words)
+
+    def __len__(self):
+        return len(self.words)
+
+    def encode(self, words):
+        """ Turn a list of words into an array of ids, adding unseen words to the vocabulary
+        Args:
+            words (list): list of words (str)
+        Returns:
+            tokens (np.ndarray): id (int32) of each word
+        """
+        ids = self.ids
+        tokens = np.empty(len(words), dtype=np.int32)
+        with self._lock:
+            for i, word in enumerate(words):
+                token = ids.get(word)
+                if token is None:
+                    token = ids[word] = len(self.words)
+                    self.words.append(word)
+                tokens[i] = token
+        return tokens
+
+    def decode(self, tokens):
+        """ Turn an array of ids back into a list of words
+        Args:
+            tokens (np.ndarray): ids (int) of words in the vocabulary
+        Returns:
+            words (list): the word (str) of each id
+        """
+        words = self.words
+        return [words[token] for token in tokens.tolist()]
+
+    def feature(self, name, func, dtype):
+        """ Return a per-word value for every word in the vocabulary, indexed by id, so that it can be looked up for
+        whole token arrays at once (e.g., feature(...)[tokens])
+        Args:
+            name (str): name the values are cached under
+            func (function): computes the value of one word (str)
+            dtype (type): NumPy type of the values
+        Returns:
+            values (np.ndarray): value of each word
+        """
+        values = self._features.get(name, np.zeros(0, dtype=dtype))
+
+        # only the words added since the last call need to be looked up
+        if len(values) < len(self.words):
+            new_values = np.fromiter((func(word) for word in self.words[len(values):]), dtype=dtype)
+            values = self._features[name] = np.concatenate([values, new_values])
+        return values
+
+    def lengths(self):
+        """ Return the length of every word in the vocabulary, indexed by id
+        Returns:
+            lengths (np.ndarray): number of characters (int32) in each word
+        """
+        return self.feature('length', len, np.int32)
+
+
+class LazyData(defaultdict):
+    """ The framework's data dictionary, whose statistics are computed the first time they are read
+    Attributes:
+        resolver (function): called with the name of a statistic before it is read, so that the values missing for
+                             some documents can be computed and memoized
+    """
+
+    def __init__(self, resolver=None):
+        super().__init__(dict)
+        self.resolver = resolver
+
+    def __getitem__(self, metric):
+        if self.resolver is not None:
+            self.resolver(metric)
+        return super().__getitem__(metric)
+
+    def peek(self, metric):
+        """ Return the values of a statistic computed so far, without computing the missing ones
+        Args:
+            metric (str): name of the statistic
+        Returns:
+            values (dict): maps the label of each document to its value
+        """
+        return super().__getitem__(metric)
+
+
+class DiskStore:
+    """ Embedded SQLite store holding the pickled statistics of every registered document
+    Attributes:
+        path (str): name of the SQLite file the statistics are spilled to
+        conn (sqlite3.Connection): open connection to the SQLite file
+        snapshot (bool): whether the connection only reads the store as it was when it was opened
+    """
+
+    def __init__(self, path, snapshot=False):
+        assert isinstance(path, str), 'The path of the store must be a string'
+
+        try:
+            self.path = path
+            self.snapshot = snapshot
+
+            # the connection is shared by the threads using the framework, one statement at a time
+            self._lock = threading.RLock()
+
+            if snapshot:
+                # a read transaction keeps seeing the store as of its first read, while the framework's own
+                # connection keeps committing new documents
+                self.conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+                self.conn.execute('BEGIN')
+                self.conn.execute('SELECT COUNT(*) FROM data').fetchone()
+                return
+
+            self.conn = sqlite3.connect(path, check_same_thread=False)
+
+            # write-ahead logging lets snapshots read while new documents are written
+            self.conn.execute('PRAGMA journal_mode=WAL')
+
+            # one row per (statistic, document) pair; seq keeps the order in which documents were registered
+            self.conn.execute('CREATE TABLE IF NOT EXISTS data (seq INTEGER PRIMARY KEY AUTOINCREMENT, '
+                              'metric TEXT NOT NULL, label TEXT NOT NULL, value BLOB NOT NULL, '
+                              'UNIQUE (metric, label))')
+            self.conn.execute('CREATE INDEX IF NOT EXISTS data_metric_seq ON data (metric, seq)')
+
+            # the vocabulary that the token ids of the documents refer to
+            self.conn.execute('CREATE TABLE IF NOT EXISTS vocab (id INTEGER PRIMARY KEY, word TEXT NOT NULL)')
+
+        except Exception as e:
+            # throws an error message if the store cannot be opened
+            raise StoreError(path, str(e))
+
+    def _fetch(self, query, params=()):
+        """ Run a query and return all of its rows
+        Args:
+            query (str): SQL query
+            params (tuple): parameters of the query
+        Returns:
+            rows (list): the rows (tuples) returned by the query
+        """
+        with self._lock:
+            return self.conn.execute(query, params).fetchall()
+
+    def metrics(self):
+        """ Return the names of the statistics already saved in the store
+        Returns:
+            metrics (list): names (str) of the statistics in the store
+        """
+        rows = self._fetch('SELECT metric FROM data GROUP BY metric ORDER BY MIN(seq)')
+        return [row[0] for row in rows]
+
+    def get(self, metric, label):
+        """ Page in the value of one statistic for one document
+        Args:
+            metric (str): name of the statistic (e.g., 'wordcount')
+            label (str): label of the document
+        Returns:
+            value (object): the unpickled value
+        Raises:
+            KeyError: if the document has no value for the statistic
+        """
+        rows = self._fetch('SELECT value FROM data WHERE metric = ? AND label = ?', (metric, label))
+        if not rows:
+            raise KeyError(label)
+        return pickle.loads(rows[0][0])
+
+    def put(self, metric, label, value):
+        """ Spill the value of one statistic for one document to disk
+        Args:
+            metric (str): name of the statistic (e.g., 'wordcount')
+            label (str): label of the document
+            value (object): the value to be pickled into the store
+        Returns:
+            None (just writes to the store)
+        """
+        assert not self.snapshot, 'Snapshots of the store are read-only'
+
+        # overwriting a document keeps its original position in the registration order
+        with self._lock:
+            self.conn.execute('INSERT INTO data (metric, label, value) VALUES (?, ?, ?) '
+                              'ON CONFLICT (metric, label) DO UPDATE SET value = excluded.value',
+                              (metric, label, pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)))
+
+    def delete(self, metric, label):
+        """ Remove one statistic of one document from the store
+        Args:
+            metric (str): name of the statistic
+            label (str): label of the document
+        Returns:
+            deleted (bool): whether a value was removed
+        """
+        assert not self.snapshot, 'Snapshots of the store are read-only'
+
+        with self._lock:
+            cursor = self.conn.execute('DELETE FROM data WHERE metric = ? AND label = ?', (metric, label))
+            return cursor.rowcount > 0
+
+    def _pages(self, columns, metric):
+        """ Iterate over the rows saved for a statistic in registration order, PAGE_SIZE rows at a time, so that no
+        cursor stays open while other threads use the connection
+        Args:
+            columns (str): columns selected after seq (e.g., 'label, value')
+            metric (str): name of the statistic
+        Returns:
+            rows (generator): the selected columns of each row, without seq
+        """
+        seq = -1
+        while True:
+            rows = self._fetch('SELECT seq, ' + columns + ' FROM data WHERE metric = ? AND seq > ? ORDER BY seq '
+                               'LIMIT ?', (metric, seq, PAGE_SIZE))
+            for row in rows:
+                yield row[1:]
+            if len(rows) < PAGE_SIZE:
+                return
+            seq = rows[-1][0]
+
+    def labels(self, metric):
+        """ Lazily iterate over the labels saved for a statistic, in registration order """
+        for label, in self._pages('label', metric):
+            yield label
+
+    def items(self, metric):
+        """ Lazily iterate over the (label, value) pairs saved for a statistic, one page of documents at a time """
+        for label, value in self._pages('label, value', metric):
+            yield label, pickle.loads(value)
+
+    def missing(self, metrics, key='tokens'):
+        """ Find every document that has no value yet for some statistics, with a single query
+        Args:
+            metrics (list): names (str) of the statistics
+            key (str): name of the statistic that every registered document has a value for
+        Returns:
+            rows (list): (label, metric) of each document and statistic it is missing, in registration order
+        """
+        if not metrics:
+            return []
+
+        # pair every document with every statistic, and keep the pairs without a row (using the unique index)
+        wanted = ', '.join(['(?)'] * len(metrics))
+        return self._fetch('WITH wanted (metric) AS (VALUES ' + wanted + ') '
+                           'SELECT documents.label, wanted.metric FROM data AS documents CROSS JOIN wanted '
+                           'WHERE documents.metric = ? AND NOT EXISTS (SELECT 1 FROM data AS computed '
+                           'WHERE computed.metric = wanted.metric AND computed.label = documents.label) '
+                           'ORDER BY documents.seq', tuple(metrics) + (key,))
+
+    def count(self, metric):
+        """ Return the number of documents with a saved value for a statistic """
+        return self._fetch('SELECT COUNT(*) FROM data WHERE metric = ?', (metric,))[0][0]
+
+    def load_words(self):
+        """ Return the words of the saved vocabulary, ordered by id """
+        return [row[0] for row in self._fetch('SELECT word FROM vocab ORDER BY id')]
+
+    def save_words(self, words, start):
+        """ Append the words added to the vocabulary since it was last saved
+        Args:
+            words (list): every word (str) of the vocabulary, ordered by id
+            start (int): number of words that are already saved
+        Returns:
+            None (just writes to the store)
+        """
+        with self._lock:
+            self.conn.executemany('INSERT OR REPLACE INTO vocab (id, word) VALUES (?, ?)',
+                                  ((i, words[i]) for i in range(start, len(words))))
+
+    def commit(self):
+        """ Flush the pending writes to disk """
+        with self._lock:
+            self.conn.commit()
+
+    def close(self):
+        """ Flush the pending writes and close the connection to the SQLite file """
+        with self._lock:
+            self.conn.commit()
+            self.conn.close()
+
+
+class _SpilledKeys(KeysView):
+    """ Keys view that streams the labels from the store """
+    def __iter__(self):
+        return self._mapping.store.labels(self._mapping.metric)
+
+
+class _SpilledValues(ValuesView):
+    """ Values view that streams the values from the store with a single query """
+    def __iter__(self):
+        return (value for _, value in self._mapping.store.items(self._mapping.metric))
+
+
+class _SpilledItems(ItemsView):
+    """ Items view that streams the (label, value) pairs from the store with a single query """
+    def __iter__(self):
+        return self._mapping.store.items(self._mapping.metric)
+
+
+class SpilledMetric(MutableMapping):
+    """ Dictionary-like view mapping document labels to the values of one statistic, paged in from disk on access
+    Attributes:
+        store (DiskStore): store holding the values
+        metric (str): name of the statistic (e.g., 'wordcount')
+    """
+
+    def __init__(self, store, metric):
+        self.store = store
+        self.metric = metric
+
+    def __getitem__(self, label):
+        return self.store.get(self.metric, label)
+
+    def __setitem__(self, label, value):
+        self.store.put(self.metric, label, value)
+
+    def __delitem__(self, label):
+        if not self.store.delete(self.metric, label):
+            raise KeyError(label)
+
+    def __iter__(self):
+        return self.store.labels(self.metric)
+
+    def __len__(self):
+        return self.store.count(self.metric)
+
+    def keys(self):
+        return _SpilledKeys(self)
+
+    def values(self):
+        return _SpilledValues(self)
+
+    def items(self):
+        return _SpilledItems(self)
+
+    def __repr__(self):
+        return 'SpilledMetric({!r}, {} documents)'.format(self.metric, len(self))
+
+
+class FilteredMetric(Mapping):
+    """ Read-only view of the values of one statistic that leaves some documents out (e.g., documents registered
+    again since their value was stored, whose value describes their earlier tokens)
+    Attributes:
+        mapping (Mapping): values of the statistic
+        excluded (frozenset): labels (str) of the documents left out
+    """
+
+    def __init__(self, mapping, excluded):
+        self.mapping = mapping
+        self.excluded = frozenset(excluded)
+
+    def __getitem__(self, label):
+        if label in self.excluded:
+            raise KeyError(label)
+        return self.mapping[label]
+
+    def __contains__(self, label):
+        return label not in self.excluded and label in self.mapping
+
+    def __iter__(self):
+        return (label for label in self.mapping if label not in self.excluded)
+
+    def __len__(self):
+        return len(self.mapping) - sum(1 for label in self.excluded if label in self.mapping)
+
+    def __repr__(self):
+        return 'FilteredMetric({!r}, {} documents left out)'.format(self.mapping, len(self.excluded))
+
+
+class DiskData(LazyData):
+    """ Drop-in replacement for the framework's data dictionary whose per-document values are stored on disk
+    Attributes:
+        store (DiskStore): store that the statistics are spilled to
+    """
+
+    def __init__(self, path, resolver=None):
+        super().__init__(resolver)
+        self.default_factory = None
+        self.store = DiskStore(path)
+
+        # re-attach the statistics of a store that was written by an earlier session
+        for metric in self.store.metrics():
+            self[metric] = SpilledMetric(self.store, metric)
+
+    def __missing__(self, metric):
+        # every new statistic gets its own disk-backed mapping instead of an in-memory dictionary
+        values = self[metric] = SpilledMetric(self.store, metric)
+        return values
+
+    def commit(self):
+        """ Flush the pending writes to disk """
+        self.store.commit()
+
+    def close(self):
+        """ Flush the pending writes and close the store """
+        self.store.close()
+
+
+# statistics that no document has a value for read as an empty mapping from snapshots
+_EMPTY = MappingProxyType({})
+
+
+class Snapshot(defaultdict):
+    """ Read-only view of the framework's data as of one version, which stays consistent while other threads keep
+    registering documents. Each statistic is an immutable mapping. Statistics that were still pending for some
+    documents when the snapshot was taken are filled in the first time they are read by publishing a new, complete
+    mapping (copy-on-write), so readers already holding the old one are not affected
+    Attributes:
+        version (int): version of the framework's data that the snapshot was taken at
+        revisions (dict): maps the label of each document to the number of times its tokens had been registered
+        resolver (function): called with the snapshot and the name of a statistic before it is read, so that the
+                             values missing for some documents can be filled in
+        complete (set): names of the statistics that have a value for every document of the snapshot
+        views (dict): views derived from the snapshot (e.g., group rollups), built once and shared by its readers
+        lock (threading.RLock): serializes the filling in of statistics
+        sample (dict): description of the sample of documents the snapshot holds (see Nlp.sample), None if it holds
+                       every document
+    """
+
+    def __init__(self, version, revisions, resolver=None):
+        super().__init__()
+        self.version = version
+        self.revisions = revisions
+        self.resolver = resolver
+        self.complete = set()
+        self.views = {}
+        self.lock = threading.RLock()
+        self.sample = None
+
+    def __getitem__(self, metric):
+        if self.resolver is not None:
+            self.resolver(self, metric)
+        return super().__getitem__(metric)
+
+    def __missing__(self, metric):
+        return _EMPTY
+
+    def peek(self, metric):
+        """ Return the values of a statistic as of the snapshot, without filling in the missing ones
+        Args:
+            metric (str): name of the statistic
+        Returns:
+            values (Mapping): read-only mapping from the label of each document to its value
+        """
+        return super().__getitem__(metric)
+
+    def publish(self, metric, values):
+        """ Make a new version of a statistic visible to the readers of the snapshot
+        Args:
+            metric (str): name of the statistic
+            values (Mapping): maps the label of each document to its value; it must not be modified afterwards
+        Returns:
+            None
+        """
+        dict.__setitem__(self, metric, MappingProxyType(values))
+
+    def close_with(self, store):
+        """ Close a store snapshot once neither the snapshot nor the statistics read from it (which outlive the
+        snapshot when a reader only keeps them) use it anymore
+        Args:
+            store (DiskStore): store snapshot holding the read transaction
+        Returns:
+            None
+        """
+        weakref.finalize(store, store.conn.close)
+
+    def _read_only(self, *args, **kwargs):
+        raise TypeError('Snapshots are read-only')
+
+    __setitem__ = __delitem__ = pop = popitem = clear = update = setdefault = _read_only
@@ -0,0 +1,164 @@
+"""
+Jethro Lee and Michelle Wang
+DS 3500
+Reusable NLP Library - HW3
+2/27/2023
+
+nlp_topics.py: Topics (themes) of the registered documents, learned by online non-negative matrix factorization over
+sparse document-term counts. The model is trained one minibatch of documents at a time and only keeps a few
+topic-by-vocabulary arrays between batches, so new documents refine it without refitting on the whole corpus
+"""
+# import necessary libraries
+import threading
+import numpy as np
+from scipy import sparse
+
+# number of words describing each topic
+TOPIC_WORDS = 10
+
+# number of documents per minibatch
+BATCH_SIZE = 1024
+
+# share of the statistics of earlier minibatches that is left after training on a number of documents equal to the
+# size of the corpus (older documents matter less, since their topic weights were found with older topics)
+FORGET = 0.7
+
+# number of multiplicative updates of the topic weights of a minibatch, and of the topics, in each round of training
+# on a minibatch
+WEIGHT_ITERATIONS = 50
+TOPIC_ITERATIONS = 5
+
+# number of rounds of alternately updating the weights and the topics on each minibatch
+ROUNDS = 10
+
+# smallest value of a denominator of the multiplicative updates
+EPSILON = 1e-10
+
+
+def count_matrix(batch):
+    """ Build the document-term matrix of a batch of documents, with log-scaled counts and rows of unit length (so
+    that long songs and repeated choruses don't outweigh the other documents)
+    Args:
+        batch (TokenBatch): tokens of the documents
+    Returns:
+        counts (sparse.csr_matrix): weight (float64) of each word id (column) in each document (row)
+    """
+    doc_ids, tokens, counts = batch.counts()
+    values = np.log1p(counts.astype(np.float64))
+    norms = np.sqrt(np.bincount(doc_ids, weights=values ** 2, minlength=len(batch)))
+    values /= np.maximum(norms[doc_ids], EPSILON)
+    return sparse.csr_matrix((values, (doc_ids, tokens)), shape=(len(batch), max(len(batch.vocab), 1)))
+
+
+class TopicModel:
+    """ Online non-negative matrix factorization of the document-term matrix (documents ~ weights x topics), trained
+    one minibatch at a time with multiplicative updates (Lefevre et al., 2011; Mairal et al., 2010)
+    Attributes:
+        n_topics (int): number of topics
+        seed (int): seed of the random initialization of the topics
+        components (np.ndarray): weight (float64) of each word id (column) in each topic (row), or None before the
+                                 first minibatch
+        stats_a (np.ndarray): decayed sum of weights.T @ weights over the minibatches (n_topics x n_topics)
+        stats_b (np.ndarray): decayed sum of weights.T @ counts over the minibatches (n_topics x vocabulary)
+        weights (dict): maps the label of each document the model was trained on to its topic weights (float32)
+        revisions (dict): maps the label of each document the model was trained on to the revision of its tokens
+        lock (threading.Lock): serializes the training
+    """
+
+    def __init__(self, n_topics, seed=0):
+        self.n_topics = n_topics
+        self.seed = seed
+        self.components = None
+        self.stats_a = np.zeros((n_topics, n_topics))
+        self.stats_b = np.zeros((n_topics, 0))
+        self.weights = {}
+        self.revisions = {}
+        self.lock = threading.Lock()
+        self._rng = np.random.default_rng(seed)
+
+    def _grow(self, vocab_size, scale):
+        """ Make room in the topics for the words added to the vocabulary since the last minibatch
+        Args:
+            vocab_size (int): number of words of the vocabulary
+            scale (float): typical size of the entries of the topics
+        Returns:
+            None (just updates components and stats_b)
+        """
+        size = 0 if self.components is None else self.components.shape[1]
+        if vocab_size <= size:
+            return
+
+        # new words start with small random weights, since multiplicative updates cannot move away from 0
+        new = self._rng.uniform(0.5, 1.5, (self.n_topics, vocab_size - size)) * scale
+        self.components = new if self.components is None else np.hstack([self.components, new])
+        self.stats_b = np.hstack([self.stats_b, np.zeros((self.n_topics, vocab_size - size))])
+
+    def transform(self, counts, weights=None):
+        """ Find the topic weights of documents, keeping the topics fixed
+        Args:
+            counts (sparse.csr_matrix): document-term matrix of the documents (see count_matrix)
+            weights (np.ndarray): optional weights to start from (e.g., those of the previous round of training)
+        Returns:
+            weights (np.ndarray): weight (float64) of each topic (column) in each document (row)
+        """
+        components = self.components[:, :counts.shape[1]]
+        counts = counts[:, :components.shape[1]]
+
+        # the numerator and the Gram matrix of the topics are the same for every iteration
+        numerator = np.asarray(counts @ components.T)
+        gram = components @ components.T
+        if weights is None:
+            weights = np.full((counts.shape[0], self.n_topics), np.sqrt(max(counts.mean(), EPSILON) / self.n_topics))
+        else:
+            weights = weights.copy()
+        for _ in range(WEIGHT_ITERATIONS):
+            weights *= numerator / np.maximum(weights @ gram, EPSILON)
+        return weights
+
+    def partial_fit(self, labels, counts, revisions, corpus_size):
+        """ Refine the topics with one minibatch of documents
+        Args:
+            labels (list): labels (str) of the documents
+            counts (sparse.csr_matrix): document-term matrix of the documents (see count_matrix)
+            revisions (list): revision (int) of the tokens of each document
+            corpus_size (int): number of documents in the corpus, which sets how fast earlier minibatches are forgotten
+        Returns:
+            None (just updates the topics and the weights of the documents)
+        """
+        self._grow(counts.shape[1], np.sqrt(max(counts.mean(), EPSILON) / self.n_topics))
+        counts = sparse.csr_matrix((counts.data, counts.indices, counts.indptr),
+                                   shape=(counts.shape[0], self.components.shape[1]))
+        # decay the statistics of the earlier minibatches
+        rho = FORGET ** (counts.shape[0] / max(corpus_size, counts.shape[0]))
+        earlier_a, earlier_b = rho * self.stats_a, rho * self.stats_b
+
+        # alternately fit the weights of the minibatch to the topics and the topics to the decayed reconstruction error
+        # of every minibatch seen so far, replacing the minibatch's statistics in every round
+        weights = None
+        for _ in range(ROUNDS):
+            weights = self.transform(counts, weights)
+            self.stats_a = earlier_a + weights.T @ weights
+            self.stats_b = earlier_b + np.asarray((counts.T @ weights).T)
+            for _ in range(TOPIC_ITERATIONS):
+                self.components *= self.stats_b / np.maximum(self.stats_a @ self.components, EPSILON)
+        weights = self.transform(counts, weights)
+
+        for label, row, revision in zip(labels, weights.astype(np.float32), revisions):
+            self.weights[label] = row
+            self.revisions[label] = revision
+
+    def top_words(self, vocab, top=TOPIC_WORDS):
+        """ Describe each topic with its heaviest words
+        Args:
+            vocab (Vocabulary): vocabulary the word ids refer to
+            top (int): number of words per topic
+        Returns:
+            topics (list): list of (word (str), weight (float)) of each topic, heaviest first
+        """
+        words = vocab.words
+        topics = []
+        for component in self.components:
+            ids = np.argpartition(-component, min(top, len(component)) - 1)[:top]
+            ids = ids[np.argsort(-component[ids], kind='stable')]
+            topics.append([(words[i], float(component[i])) for i in ids.tolist()])
+        return topics
@@ -32,27 +32,24 @@ def _code_mapping(df, src, targ):
     # Get distinct labels
     data_types_dict = {src: str, targ: str}
     df = df.astype(data_types_dict)
-    labels = sorted(list(set(list(df[src]) + list(df[targ]))))
+    labels = sorted(set(df[src]) | set(df[targ]))
 
-    # Get integer codes
-    codes = list(range(len(labels)))
-
-    # Create label to code mapping
-    lc_map = dict(zip(labels, codes))
-
-    # Substitute names for codes in dataframe
-    df = df.replace({src: lc_map, targ: lc_map})
+    # Substitute names for their integer codes (positions in labels) in dataframe, one column at a time
+    df = df.assign(**{src: pd.Categorical(df[src], categories=labels).codes,
+                      targ: pd.Categorical(df[targ], categories=labels).codes})
 
     return df, labels
 
 
-def _prepare_sankey_data(df, src, targ, threshold=None):
+def _prepare_sankey_data(df, src, targ, threshold=None, vals=None):
     """ Adjusts a dataframe so that it is suited for making a Sankey diagram with
     Args:
         df (pd.DataFrame): input Pandas dataframe
         src (str): input name of column containing the source values of the Sankey diagram
         targ (str): input name of column containing the target values of the Sankey diagram
         threshold (int): minimum number of instances that a combination of values must have to be shown on the diagram
+        vals (series): optional thickness of each row; rows with the same combination of values are summed instead
+                       of counted
 
     Returns:
         df (pd.DataFrame): updated version of the inputted Pandas dataframe, which contains no rows where the count
@@ -67,13 +64,18 @@ def _prepare_sankey_data(df, src, targ, threshold=None):
     assert isinstance(threshold, int), 'The minimum number of instances that a combination of values must have to be ' \
                                        'shown on the diagram must be entered as an integer'
 
-    # Aggregation: counts the number of artists grouped by both the source value and target value
-    df = df.groupby([src, targ]).size().reset_index(name="Counts")
+    # Aggregation: counts the number of artists (or sums their values) grouped by both the source value and target
+    # value
+    if vals is None:
+        df = df.groupby([src, targ]).size().reset_index(name="Counts")
+    else:
+        df = df[[src, targ]].assign(Counts=vals.to_numpy()).groupby([src, targ], sort=False)['Counts'].sum() \
+            .reset_index()
 
     # filters out rows where the count is below a certain threshold
     if threshold is not None:
         df = df[df['Counts'] > threshold]
-        df = df.astype(str)
+        df = df.astype({src: str, targ: str})
 
     return df
 
@@ -86,7 +88,8 @@ def make_sankey(df, threshold, *cols, vals=None, **kwargs):
         *cols (tuple): names of columns (str) with the values in df for the Sankey diagram layers. The columns are shown
                        from left to right based on the order they are inputted (1st inputted column = left-most layer)
         vals (series): series for thickness of each bar on the Sankey diagram
-        **kwargs (dict): additional parameters (strings linked to float) to personalize the Sankey chart further
+        **kwargs (dict): additional parameters (strings linked to float, e.g., 'pad', 'width', 'height', or to a str
+                         for 'title') to personalize the Sankey chart further
 
     Returns:
         Nothing, just generates and presents a Sankey diagram
@@ -108,14 +111,15 @@ def make_sankey(df, threshold, *cols, vals=None, **kwargs):
         stacked.columns = ['src', 'targ']
         sankey_data = pd.concat([sankey_data, stacked], axis=0)
 
-    # Removes any rows where the value associated with a combination of items is below a threshold (if specified)
-    sankey_data = _prepare_sankey_data(sankey_data, 'src', 'targ', threshold=threshold)
-
-    # Assigns values to be used on the Sankey chart between two nodes if they aren't given
-    if vals is None:
-        vals = sankey_data['Counts']
-    else:
+    # The thickness of each row applies to every layer it is stacked into
+    if vals is not None:
         assert vals.dtype == 'int64', 'The thickness of the bars must be specified as integers'
+        vals = pd.concat([vals] * (len(cols) - 1))
+
+    # Removes any rows where the value associated with a combination of items is below a threshold (if specified),
+    # after summing the thickness of rows that link the same values
+    sankey_data = _prepare_sankey_data(sankey_data, 'src', 'targ', threshold=threshold, vals=vals)
+    vals = sankey_data['Counts']
 
     # Prepares the aesthetics of the Sankey diagram (e.g. links, labels, optional padding, other specifics in kwargs)
     sankey_data, labels = _code_mapping(sankey_data, 'src', 'targ')
@@ -123,6 +127,7 @@ def make_sankey(df, threshold, *cols, vals=None, **kwargs):
     pad = kwargs.get('pad', 50)
     width = kwargs.get('width', 800)
     height = kwargs.get('height', 800)
+    title = kwargs.get('title')
 
     # Prepares the nodes and generates the Sankey chart
     node = {'label': labels, 'pad': pad}
@@ -131,5 +136,6 @@ def make_sankey(df, threshold, *cols, vals=None, **kwargs):
     fig.update_layout(
         autosize=False,
         width=width,
-        height=height)
+        height=height,
+        title_text=title)
     fig.show()
@@ -10,7 +10,6 @@ user-defined functions from the visualization library (taylorviz)
 
 # import necessary libraries
 from nlp import Nlp
-from exception import LoadStopWordError
 import nltk
 import taylorviz as tviz
 
@@ -32,36 +31,60 @@ def main():
              'TaylorSwiftCardigan.txt', 'TaylorSwiftWillow.txt', 'TaylorSwiftLavenderHaze.txt']
     file_labels = ['Our Song', 'Fearless', 'Dear John', 'Red', 'Welcome to New York', 'Getaway Car', 'Lover',
                    'Cardigan', 'Willow', 'Lavender Haze']
+    file_groups = [{'album': 'Taylor Swift', 'era': '2006'}, {'album': 'Fearless', 'era': '2008'},
+                   {'album': 'Speak Now', 'era': '2010'}, {'album': 'Red', 'era': '2012'},
+                   {'album': '1989', 'era': '2014'}, {'album': 'Reputation', 'era': '2017'},
+                   {'album': 'Lover', 'era': '2019'}, {'album': 'Folklore', 'era': '2020'},
+                   {'album': 'Evermore', 'era': '2020'}, {'album': 'Midnights', 'era': '2022'}]
     vis_funcs = [tviz.wordcount_sankey, tviz.sentiment_scatter, tviz.avgwlength_boxplot, tviz.avgwlength_bar,
-                 tviz.total_wordl_boxplot]
-    vis_names = ['wordcountsankey', 'sentimentscatter', 'avgwlengthboxplot', 'avgwlengthbar', 'totalwordlengthboxplot']
+                 tviz.total_wordl_boxplot, tviz.sentiment_arcs, tviz.sentiment_timeline, tviz.repetition_chart,
+                 tviz.diversity_curves]
+    vis_names = ['wordcountsankey', 'sentimentscatter', 'avgwlengthboxplot', 'avgwlengthbar', 'totalwordlengthboxplot',
+                 'sentimentarcs', 'sentimenttimeline', 'repetition', 'diversity']
 
     # colors used for the word cloud
     word_cloud_colors = ['summer', 'Wistia', 'BuPu', 'Reds', 'Blues', 'bone', 'spring_r', 'gist_yarg', 'copper',
                          'Purples']
 
-    try:
-        # register some text files
-        for i in range(len(files)):
-            ts.load_text(files[i], file_labels[i])
+    # register the text files, carrying on past any file that cannot be registered, and index the spans of at least
+    # 3 words that each song repeats
+    report = ts.load_texts(files, file_labels, groups=file_groups, repeats=3)
 
-    except LoadStopWordError as pe:
-        # indicates whether there was an issue with registering the files
-        print(str(pe))
+    # indicates whether there was an issue with registering some of the files
+    for failure in report.failures:
+        print(failure['filename'], 'could not be registered:', failure['errors'], '-', failure['message'])
 
     # load all the visualization functions that don't require parameters
     for i in range(len(vis_funcs)):
         ts.load_visualization(name=vis_names[i], vizfunc=vis_funcs[i])
 
-    # produces a word cloud that visualizes the distinct word counts from each file
-    ts.load_visualization('wordcloud', tviz.make_word_clouds, colormaps=word_cloud_colors)
+    # produces a word cloud that visualizes the distinct word counts from each file (layouts of unchanged songs are
+    # reused from the cache)
+    ts.load_visualization('wordcloud', tviz.make_word_clouds, colormaps=word_cloud_colors,
+                         cache_dir='.wordcloud_cache')
 
     # makes sentiment analysis bar subplots (positive vs. neutral vs. negative scores) for each of the files passed in
     ts.load_visualization('sentimentbar', tviz.sentiment_analysis_bars, 5, 2)
 
+    # preview the word clouds with a random half of the songs before drawing every visualization
+    ts.visualize('wordcloud', sample=0.5, seed=1)
+
     # display all the loaded visualizations
     ts.visualize()
 
+    # compare the average word length of each era, straight from the running totals of the eras
+    ts.visualize('avgwlengthbar', level='era')
+
+    # compare the vocabulary richness of each album, reading its songs one after the other
+    ts.visualize('diversity', level='album')
+
+    # compare the words that set the early songs apart from the recent ones
+    tviz.keyness_chart(ts.keyness(file_labels[:5], file_labels[5:]))
+
+    # find the themes of the songs, and how much of each era is about each of them
+    tviz.topic_chart(ts.topics(4))
+    tviz.topic_chart(ts.topics(4, level='era'))
+
 
 if __name__ == '__main__':
     main()
@@ -8,13 +8,28 @@ taylorviz.py: different visualization functions to illustrate findings about reg
 """
 # import necessary libraries
 from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+import hashlib
+import io
+from itertools import chain
+import json
+import os
+import tempfile
+import threading
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
 import matplotlib.pyplot as plt
 import sankey as sk
+import nlp_sample
+import nlp_sentiment
 import pandas as pd
 from nltk.sentiment import SentimentIntensityAnalyzer
 import numpy as np
 from wordcloud import WordCloud
 
+# figures drawn by the current thread while it renders visualizations off-screen (see render_png)
+_offscreen = threading.local()
+
 
 def convert_file_to_string(word_count, max_words=None):
     """ Extracts words from a file that have a frequency of one of the top user-defined integer frequencies in each file
@@ -36,7 +51,7 @@ def convert_file_to_string(word_count, max_words=None):
                                            'integer'
         word_count = {word: count for word, count in sorted(word_count.items(), key=lambda item: item[1],
                                                             reverse=True)}
-        word_count = dict(word_count.items()[:max_words])
+        word_count = dict(list(word_count.items())[:max_words])
 
     for word, count in word_count.items():
         # Extract each word in the word count dictionary and repeat them in the returned string based on their
@@ -48,76 +63,338 @@ def convert_file_to_string(word_count, max_words=None):
     return words
 
 
-def wordcount_sankey(data, word_list=None, k=5):
+def preview_note(data, values=None, quantity=None):
+    """ Describes the approximation behind a figure drawn from a sample of the songs (see Nlp.visualize(sample=...))
+    Args:
+        data (dict): data extracted from the file as a dictionary attribute--> raw data
+        values (function): optional function returning the value of a statistic for each sampled song (list), whose
+                           mean is given with its margin of error. It is only called for samples, so that figures of
+                           every song don't compute statistics they don't show
+        quantity (str): name of that statistic
+    Returns:
+        note (str): the size of the sample and the 95% margin of error of the mean of the statistic, or None if the
+                    figure shows every song
+    """
+    sample = getattr(data, 'sample', None)
+    if sample is None:
+        return None
+
+    note = 'Preview: {} of {} songs ({:.0%} sample, seed {})'.format(sample['size'], sample['population'],
+                                                                     sample['fraction'], sample['seed'])
+    if sample['level'] is not None:
+        note += ', stratified by ' + sample['level']
+
+    # the margin of error is about the mean over songs, so it isn't given for figures of groups
+    if values is not None and 'rollup' not in sample:
+        values = values()
+        if len(values) > 0:
+            mean, margin = nlp_sample.mean_bounds(values, sample['population'])
+            note += '; mean {}: {:.3g} \u00b1 {:.2g} (95%)'.format(quantity, mean, margin)
+    return note
+
+
+def _label_preview(fig, data, values=None, quantity=None):
+    """ Writes the preview note of a sampled figure (see preview_note) at the bottom of the figure """
+    note = preview_note(data, values=values, quantity=quantity)
+    if note is not None:
+        fig.text(0.01, 0.005, note, fontsize=8, color='dimgrey')
+
+
+def _figure(**kwargs):
+    """ Creates the figure of a visualization: a pyplot figure, or a standalone figure that pyplot doesn't know about
+    while the current thread renders off-screen (see render_png)
+    Args:
+        **kwargs (dict): parameters of the figure (e.g., figsize)
+    Returns:
+        fig (Figure): the new figure
+    """
+    figures = getattr(_offscreen, 'figures', None)
+    if figures is None:
+        return plt.figure(**kwargs)
+
+    fig = Figure(**kwargs)
+    FigureCanvasAgg(fig)
+    figures.append(fig)
+    return fig
+
+
+def _show(fig):
+    """ Presents a finished figure (off-screen figures are kept for render_png instead) """
+    if getattr(_offscreen, 'figures', None) is None:
+        plt.show()
+
+
+def offscreen(vizfunc):
+    """ Marks a visualization that draws on figures from _figure, so that it can be rendered with render_png
+    Args:
+        vizfunc (function): the visualization
+    Returns:
+        vizfunc (function): the same visualization
+    """
+    vizfunc.offscreen = True
+    return vizfunc
+
+
+def render_png(vizfunc, data, *args, **kwargs):
+    """ Renders a visualization to a PNG image without going through pyplot, so that its global state (backend, open
+    figures) is left alone (e.g., when a server thread renders figures next to an interactive session)
+    Args:
+        vizfunc (function): a visualization marked with offscreen
+        data (dict): data extracted from the file as a dictionary attribute--> raw data
+        *args (tuple): other positional parameters of the visualization
+        **kwargs (dict): other keyword parameters of the visualization
+    Returns:
+        png (bytes): the last figure drawn by the visualization
+    """
+    assert getattr(vizfunc, 'offscreen', False), 'The visualization cannot be rendered off-screen'
+
+    _offscreen.figures = []
+    try:
+        vizfunc(data, *args, **kwargs)
+        figures = _offscreen.figures
+    finally:
+        del _offscreen.figures
+    assert figures, 'The visualization did not draw a figure'
+
+    buffer = io.BytesIO()
+    figures[-1].savefig(buffer, format='png')
+    return buffer.getvalue()
+
+
+def wordcount_links(data, word_list=None, k=5, top_n=None, other=None, groups=None):
+    """ Builds the links of the word count Sankey diagram with array operations over all the word counts at once
+    Args:
+        data (dict): data extracted from the file as a dictionary attribute--> raw data
+        word_list (list): optional list containing a set of words (str) to be shown on the diagram
+        k (int): the union of the k most common words across each file
+        top_n (int): optional number of words with the highest total count across all files to be shown instead
+        other (str): optional name of a node collecting the counts of every word that is not shown, per text
+        groups (dict): optional mapping from the label of each file to a group (e.g., album or era), whose files are
+                       combined into one node
+    Returns:
+        df_word_counts (pd.DataFrame): one row per link, with the columns 'Text', 'Word', and 'Counts'
+    """
+    # obtain the word count dictionary of a file
+    word_count_dict = dict(data['wordcount'].items())
+    texts = list(word_count_dict.keys())
+    word_counts = list(word_count_dict.values())
+
+    # flatten every (text, word, count) triple into parallel arrays
+    sizes = [len(word_count) for word_count in word_counts]
+    doc_ids = np.repeat(np.arange(len(texts)), sizes)
+    word_ids, words = pd.factorize(pd.Series(list(chain.from_iterable(word_counts)), dtype=object))
+    counts = np.fromiter(chain.from_iterable(word_count.values() for word_count in word_counts), dtype=np.int64,
+                         count=len(word_ids))
+
+    # decide which words get their own node
+    if word_list is not None:
+        selected = np.isin(words, word_list)
+    elif top_n is not None:
+        totals = np.bincount(word_ids, weights=counts, minlength=len(words))
+        selected = np.zeros(len(words), dtype=bool)
+        selected[np.argsort(-totals, kind='stable')[:top_n]] = True
+    else:
+        # rank the words of each file by count (ties keep their order in the file) and keep the k most common
+        order = np.lexsort((np.arange(len(word_ids)), -counts, doc_ids))
+        starts = np.concatenate([[0], np.cumsum(sizes)[:-1]]).astype(np.int64)
+        ranks = np.empty(len(order), dtype=np.int64)
+        ranks[order] = np.arange(len(order)) - np.repeat(starts, sizes)
+        selected = np.zeros(len(words), dtype=bool)
+        selected[word_ids[ranks < k]] = True
+
+    shown = selected[word_ids]
+    link_texts = np.asarray(texts, dtype=object)[doc_ids[shown]]
+    df_word_counts = pd.DataFrame({'Word': np.asarray(words, dtype=object)[word_ids[shown]],
+                                   'Counts': counts[shown], 'Text': link_texts})
+
+    # the counts of the words that are not shown flow into one "other" node per text
+    if other is not None:
+        other_counts = np.bincount(doc_ids[~shown], weights=counts[~shown], minlength=len(texts)).astype(np.int64)
+        has_other = other_counts > 0
+        df_other = pd.DataFrame({'Word': other, 'Counts': other_counts[has_other],
+                                 'Text': np.asarray(texts, dtype=object)[has_other]})
+        df_word_counts = pd.concat([df_word_counts, df_other], ignore_index=True)
+
+    # combine the files of each group into one node
+    if groups is not None:
+        df_word_counts['Text'] = df_word_counts['Text'].map(lambda text: groups.get(text, text))
+        df_word_counts = df_word_counts.groupby(['Text', 'Word'], sort=False, as_index=False)['Counts'].sum()
+        df_word_counts = df_word_counts[['Word', 'Counts', 'Text']]
+
+    return df_word_counts
+
+
+def wordcount_sankey(data, word_list=None, k=5, top_n=None, other=None, groups=None, threshold=0):
     """ Maps each text to words on a Sankey diagram, where the thickness of the line is the word's frequency in the text
     Args:
         data (dict): data extracted from the file as a dictionary attribute--> raw data
         word_list (list): optional list containing a set of words (str) to be shown on the diagram
         k (int): the union of the k most common words across each file
+        top_n (int): optional number of words with the highest total count across all files to be shown instead, which
+                     keeps the diagram readable for large corpora
+        other (str): optional name of a node (e.g., 'other') collecting the counts of the words that are not shown
+        groups (dict): optional mapping from the label of each file to a group (e.g., album or era) shown as one node
+        threshold (int): minimum count for a link to be shown on the diagram
     Returns:
         None (just generates a Sankey diagram!)
     """
     # Ensuring the inputted parameters are of a valid type
     assert isinstance(data, defaultdict), 'The data extracted from this file must be stored in a dictionary'
 
+    if top_n is not None:
+        # Ensuring that top_n is an integer and replaces the per-file top k words
+        assert isinstance(top_n, int), 'The number of words shown on the diagram must be an integer'
+        assert word_list is None, 'You cannot specify a list of words to be shown on the diagram while also ' \
+                                  'specifying how many words you want to show'
+        k = None
+
     if k is not None:
         # Ensuring that k is an integer and not inputted with a word list
         assert isinstance(k, int), 'The number of words considered from each file for analysis must be an integer'
         assert word_list is None, 'You cannot specify a list of words to be shown on the diagram while also ' \
                                   'specifying how many words you want to consider across each file'
 
-    # Initializing a list containing a set of words to be shown on the diagram if not specified
-    if word_list is None:
-        word_list = []
-    else:
+    if word_list is not None:
         # Ensuring that word_list is a list of strings and not inputted with a k value
         assert isinstance(word_list, list), 'Must input the words to be shown on the diagram as a list'
         assert all(isinstance(word, str) for word in word_list), 'Word list must only contain strings'
         assert k is None, 'You cannot specify a list of words to be shown on the diagram while also specifying how ' \
                           'many words you want to consider across each file'
 
-    # obtain the word count dictionary of a file
-    word_count_dict = data['wordcount']
-
-    # initialize empty lists
-    texts = []
-    all_words = []
-    all_counts = []
+    if other is not None:
+        assert isinstance(other, str), 'The name of the node collecting the other words must be a string'
+    if groups is not None:
+        assert isinstance(groups, dict), 'The groups of the files must be entered in a dictionary'
+    assert isinstance(threshold, int), 'The minimum count of a link must be an integer'
 
-    for text, word_count in word_count_dict.items():
-        # Sorts the word counts in descending order by counts
-        word_count = {word: count for word, count in sorted(word_count.items(), key=lambda item: item[1],
-                                                            reverse=True)}
-        # get a list of only the keys (words from each file)
-        words = list(word_count.keys())
+    # create a dataframe containing word count information about the texts
+    df_word_counts = wordcount_links(data, word_list=word_list, k=k, top_n=top_n, other=other, groups=groups)
 
-        if k is not None:
-            # get only the top k words from a file and add them to a list of words to be shown on the diagram
-            word_list += [word for word in words[:k]]
+    # use the new dataframe to create a Sankey diagram (titled with the approximation when previewing a sample)
+    note = preview_note(data, values=lambda: list(data['numwords'].values()), quantity='words per song')
+    sk.make_sankey(df_word_counts, threshold, 'Text', 'Word', vals=df_word_counts['Counts'], title=note)
 
-    for text, word_count in word_count_dict.items():
-        # Sorts the word count dictionary in descending order by counts
-        word_count = {word: count for word, count in sorted(word_count.items(), key=lambda item: item[1],
-                                                            reverse=True)}
 
-        for word, count in word_count.items():
-            if word in word_list:
-                # extracts the word, its count in a file, and the name of its file of origin and adds them to lists if
-                # the word is in word_list or part of the k most popular words across each file
-                all_words.append(word)
-                all_counts.append(count)
-                texts += [text]
+def _word_cloud_key(words, params):
+    """ Fingerprint the word string of a file together with the parameters used to render its word cloud
+    Args:
+        words (str): words of a file, repeated based on their frequencies (see convert_file_to_string)
+        params (dict): parameters (str linked to a JSON-serializable value) passed to WordCloud
+    Returns:
+        key (str): hexadecimal digest identifying the rendered word cloud
+    """
+    # the word string already encodes each word's frequency, so sorting its words makes the key independent of the
+    # order in which the Counter was filled
+    fingerprint = json.dumps([sorted(words.split()), params], sort_keys=True)
+    return hashlib.sha256(fingerprint.encode('utf-8')).hexdigest()
 
-    # use all_words, all_counts, and texts to create a dataframe containing word count information about the texts
-    word_count = list(zip(all_words, all_counts, texts))
-    df_word_counts = pd.DataFrame(word_count, columns=['Word', 'Counts', 'Text'])
 
-    # use the new dataframe to create a Sankey diagram
-    sk.make_sankey(df_word_counts, 0, 'Text', 'Word', vals=df_word_counts['Counts'])
+def _render_word_cloud(words, params):
+    """ Lay out a word cloud and return it as an image (run in worker processes for cache misses)
+    Args:
+        words (str): words of a file, repeated based on their frequencies
+        params (dict): parameters passed to WordCloud
+    Returns:
+        image (np.ndarray): RGB image of the word cloud
+    """
+    return WordCloud(**params).generate(words).to_array()
 
 
+def _load_cached(path):
+    """ Load a word cloud from the cache
+    Args:
+        path (str): path of the cached image
+    Returns:
+        image (np.ndarray): the cached RGB image, or None if it isn't cached (or was evicted or left incomplete)
+    """
+    try:
+        image = np.load(path)
+        # mark it as recently used
+        os.utime(path)
+    except (OSError, ValueError, EOFError):
+        return None
+    return image
+
+
+def _save_cached(path, image):
+    """ Save a word cloud to the cache atomically: the image is written to a temporary file in the same directory and
+    then renamed, so that an interrupted write or two processes writing the same word cloud never leave a truncated
+    image behind
+    Args:
+        path (str): path of the cached image
+        image (np.ndarray): RGB image of the word cloud
+    Returns:
+        None
+    """
+    fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as temp_file:
+            np.save(temp_file, image)
+        os.replace(temp_path, path)
+    except BaseException:
+        os.remove(temp_path)
+        raise
+
+
+def _render_word_clouds(word_strings, params_list, cache_dir=None, cache_size=64, n_jobs=None):
+    """ Render the word clouds of several files, reusing the layouts cached on disk for unchanged files
+    Args:
+        word_strings (list): words (str) of each file, repeated based on their frequencies
+        params_list (list): parameters (dict) passed to WordCloud for each file
+        cache_dir (str): optional directory where the rendered word clouds are cached
+        cache_size (int): maximum number of word clouds kept in the cache; the least recently used are evicted
+        n_jobs (int): number of processes used to render cache misses (defaults to the number of CPUs)
+    Returns:
+        images (list): RGB image (np.ndarray) of each word cloud
+    """
+    images = [None] * len(word_strings)
+    keys = [_word_cloud_key(words, params) for words, params in zip(word_strings, params_list)]
+
+    if cache_dir is not None:
+        os.makedirs(cache_dir, exist_ok=True)
+
+        # load the cached layouts (an unreadable one is rendered again)
+        for i, key in enumerate(keys):
+            images[i] = _load_cached(os.path.join(cache_dir, key + '.npy'))
+
+    # lay out only the word clouds that were not cached, in parallel when there is more than one
+    misses = [i for i, image in enumerate(images) if image is None]
+    if len(misses) > 1 and n_jobs != 1:
+        with ProcessPoolExecutor(max_workers=n_jobs) as executor:
+            rendered = list(executor.map(_render_word_cloud, [word_strings[i] for i in misses],
+                                         [params_list[i] for i in misses]))
+    else:
+        rendered = [_render_word_cloud(word_strings[i], params_list[i]) for i in misses]
+
+    for i, image in zip(misses, rendered):
+        images[i] = image
+        if cache_dir is not None:
+            _save_cached(os.path.join(cache_dir, keys[i] + '.npy'), image)
+
+    if cache_dir is not None and misses:
+        # evict the least recently used word clouds once the cache grows past its size (other processes sharing the
+        # cache may evict the same files first)
+        cached = []
+        for name in os.listdir(cache_dir):
+            if name.endswith('.npy'):
+                try:
+                    cached.append((os.path.getmtime(os.path.join(cache_dir, name)), name))
+                except OSError:
+                    pass
+        cached.sort(reverse=True)
+        for _, name in cached[cache_size:]:
+            try:
+                os.remove(os.path.join(cache_dir, name))
+            except FileNotFoundError:
+                pass
+
+    return images
+
+
+@offscreen
 def make_word_clouds(data, colormaps=None, background_color='black', min_font_size=4, normalize_plurals=True,
-                     collocations=False, subplot_rows=4, subplot_columns=3, max_words=None):
+                     collocations=False, subplot_rows=4, subplot_columns=3, max_words=None, cache_dir=None,
+                     cache_size=64, n_jobs=None):
     """ Creates a word cloud that shows the words in a text, with words that appear more frequently appearing larger
         Args:
             data (dict): data extracted from the file as a dictionary attribute--> raw data
@@ -129,6 +406,10 @@ def make_word_clouds(data, colormaps=None, background_color='black', min_font_si
             subplot_rows (int): the number of rows in the sub-plot
             subplot_columns (int): the number of columns in the sub-plot
             max_words (int): The maximum number of words represented on the word cloud
+            cache_dir (str): optional directory where rendered word clouds are cached, keyed by each file's word
+                             frequencies and the rendering parameters, so only changed files are laid out again
+            cache_size (int): maximum number of word clouds kept in the cache (least recently used are evicted)
+            n_jobs (int): number of processes used to lay out the word clouds that are not cached
         Returns:
             None (just generates word clouds)
         """
@@ -144,6 +425,9 @@ def make_word_clouds(data, colormaps=None, background_color='black', min_font_si
     assert isinstance(collocations, bool), 'You must indicate whether bigrams are considered with "True" or "False"'
     assert isinstance(subplot_rows, int), 'The number of rows for the subplot must be an integer'
     assert isinstance(subplot_columns, int), 'The number of columns for the subplot must be an integer'
+    if cache_dir is not None:
+        assert isinstance(cache_dir, str), 'The directory of the word cloud cache must be entered as a string'
+    assert isinstance(cache_size, int), 'The size of the word cloud cache must be entered as an integer'
 
     # initialize empty lists
     texts = []
@@ -161,36 +445,43 @@ def make_word_clouds(data, colormaps=None, background_color='black', min_font_si
         word_strings.append(words)
 
     # initializes the word cloud figure
-    plt.figure()
+    fig = _figure()
 
     # defines the default colormaps based on the number of registered texts
     if colormaps is None:
         colormaps = ['viridis'] * len(texts)
 
+    # lay out the word cloud of each file (or reuse its cached layout)
+    params_list = [{'background_color': background_color, 'colormap': colormaps[i], 'min_font_size': min_font_size,
+                    'normalize_plurals': normalize_plurals, 'collocations': collocations}
+                   for i in range(len(texts))]
+    images = _render_word_clouds(word_strings, params_list, cache_dir=cache_dir, cache_size=cache_size,
+                                 n_jobs=n_jobs)
+
     for i in range(len(texts)):
         # generate a word cloud subplot for each file
-        plt.subplot(subplot_rows, subplot_columns, i + 1)
-        wordcloud = WordCloud(background_color=background_color, colormap=colormaps[i], min_font_size=min_font_size,
-                              normalize_plurals=normalize_plurals, collocations=collocations).generate(word_strings[i])
-        plt.imshow(wordcloud, interpolation='bilinear')
-        plt.axis('off')
+        ax = fig.add_subplot(subplot_rows, subplot_columns, i + 1)
+        ax.imshow(images[i], interpolation='bilinear')
+        ax.axis('off')
 
         # Each subplot is labeled based on the text they are representing
-        plt.gca().title.set_text('Word Cloud For "' + texts[i] + '"')
+        ax.title.set_text('Word Cloud For "' + texts[i] + '"')
 
     # Gives the plot an overarching title
-    plt.suptitle('Overall Word Counts')
+    fig.suptitle('Overall Word Counts')
 
     # resizes the graph to ensure that it can be clearly read
-    plt.gcf().set_size_inches(50, 14)
+    fig.set_size_inches(50, 14)
 
     # adjusts spacing between graphs
-    plt.subplots_adjust(wspace=.8, hspace=.8)
+    fig.subplots_adjust(wspace=.8, hspace=.8)
+    _label_preview(fig, data, values=lambda: list(data['numwords'].values()), quantity='words per song')
 
     # presents the word clouds
-    plt.show()
+    _show(fig)
 
 
+@offscreen
 def sentiment_scatter(data, max_words=None):
     """ Scatter plot with x being the positive score of a file and y being the file's negative score
     Args:
@@ -235,7 +526,8 @@ def sentiment_scatter(data, max_words=None):
         negative_distributions.append(neg_score)
 
     # plot the relationship between the positive score and negative score of a file
-    fig, ax = plt.subplots(figsize=(20, 10))
+    fig = _figure(figsize=(20, 10))
+    ax = fig.add_subplot()
     ax.scatter(positive_distributions, negative_distributions)
 
     # Adds labels to each point on the scatter plot
@@ -247,15 +539,17 @@ def sentiment_scatter(data, max_words=None):
     p = np.poly1d(z)
 
     # add trend line to plot
-    plt.plot(positive_distributions, p(positive_distributions))
+    ax.plot(positive_distributions, p(positive_distributions))
 
     # Adds labels to the scatter plot
-    plt.xlabel('Positive Score')
-    plt.ylabel('Negative Score')
-    plt.title('Negative vs. Positive Score of Different Songs')
-    plt.show()
+    ax.set_xlabel('Positive Score')
+    ax.set_ylabel('Negative Score')
+    ax.set_title('Negative vs. Positive Score of Different Songs')
+    _label_preview(fig, data, values=lambda: positive_distributions, quantity='positive score')
+    _show(fig)
 
 
+@offscreen
 def sentiment_analysis_bars(data, subplot_rows=5, subplot_columns=2, max_words=None):
     """ Creates a bar chart for each file representing their overall sentiments
     # Citation: https://realpython.com/python-nltk-sentiment-analysis/
@@ -296,38 +590,42 @@ def sentiment_analysis_bars(data, subplot_rows=5, subplot_columns=2, max_words=N
 
     # Creates subplots showing the sentiment score distributions (positive vs. neutral vs. negative) of each file as
     # bar charts
+    fig = _figure()
     for i in range(len(texts)):
-        plt.subplot(subplot_rows, subplot_columns, i + 1)
+        ax = fig.add_subplot(subplot_rows, subplot_columns, i + 1)
 
         for sentiment, score in sentiment_distributions[i].items():
             # displays the negative score of a text file
             if sentiment == 'neg':
-                plt.barh('Negative', score, label='Negative', color='firebrick')
+                ax.barh('Negative', score, label='Negative', color='firebrick')
 
             # displays the neutral score of a text file
             elif sentiment == 'neu':
-                plt.barh('Neutral', score, label='Neutral', color='gold')
+                ax.barh('Neutral', score, label='Neutral', color='gold')
 
             # displays the positive score of a text file
             elif sentiment == 'pos':
-                plt.barh('Positive', score, label='Positive', color='limegreen')
+                ax.barh('Positive', score, label='Positive', color='limegreen')
 
             # Each subplot is labeled based on the text they are representing
-            plt.gca().title.set_text('Sentiment Distributions For "' + texts[i] + '"')
+            ax.title.set_text('Sentiment Distributions For "' + texts[i] + '"')
 
     # Gives the plot a title
-    plt.suptitle('Overall Sentiment Distributions')
+    fig.suptitle('Overall Sentiment Distributions')
 
     # resizes the graph to ensure that it can be clearly read
-    plt.gcf().set_size_inches(50, 14)
+    fig.set_size_inches(50, 14)
 
     # adjusts spacing between graphs
-    plt.subplots_adjust(wspace=.8, hspace=.8)
+    fig.subplots_adjust(wspace=.8, hspace=.8)
+    _label_preview(fig, data, values=lambda: [distribution['compound'] for distribution in sentiment_distributions],
+                   quantity='compound score')
 
     # display the bar charts
-    plt.show()
+    _show(fig)
 
 
+@offscreen
 def avgwlength_boxplot(data):
     """ Creates a boxplot summarizing the word length distributions of each registered file
     Citation:
@@ -343,24 +641,24 @@ def avgwlength_boxplot(data):
     # obtain the word length dictionary
     word_length_dict = data['wordlengthlist']
 
-    # set the figure size
-    plt.rcParams['figure.figsize'] = [7.50, 3.50]
-    plt.rcParams['figure.autolayout'] = True
-
-    # initialize a figure for the subplots
-    fig, ax = plt.subplots()
+    # initialize a figure for the subplots, laid out to fit the labels
+    fig = _figure(figsize=(7.50, 3.50), layout='tight')
+    ax = fig.add_subplot()
 
     # plot the box plots summarizing the distribution of the word lengths with labels indicating the song they represent
     ax.boxplot(word_length_dict.values())
     ax.set_xticklabels(word_length_dict.keys(), rotation=90, fontsize=5)
-    plt.xlabel('Name of Song')
-    plt.ylabel('Word Length Distributions')
-    plt.title('Word Length Distributions for the Different Songs')
+    ax.set_xlabel('Name of Song')
+    ax.set_ylabel('Word Length Distributions')
+    ax.set_title('Word Length Distributions for the Different Songs')
+    _label_preview(fig, data, values=lambda: [np.mean(lengths) for lengths in word_length_dict.values()],
+                   quantity='word length')
 
     # make the boxplot show
-    plt.show()
+    _show(fig)
 
 
+@offscreen
 def avgwlength_bar(data):
     """ Creates a bar chart comparing the average word length for each of the files
     Args:
@@ -378,21 +676,23 @@ def avgwlength_bar(data):
     label = list(avg_wordl_dict.keys())
     value = list(avg_wordl_dict.values())
 
-    # set the figure size
-    plt.rcParams['figure.figsize'] = [7.50, 3.50]
-    plt.rcParams['figure.autolayout'] = True
+    # set the figure size, laid out to fit the labels
+    fig = _figure(figsize=(7.50, 3.50), layout='tight')
+    ax = fig.add_subplot()
 
     # plot the bar chart, style the x ticks, label the axes and title
-    plt.bar(range(len(avg_wordl_dict)), value, tick_label=label)
-    plt.xticks(rotation=90, fontsize=5)
-    plt.xlabel('Name of Song')
-    plt.ylabel('Average Word Length')
-    plt.title('Average Word Lengths for the Different Songs')
+    ax.bar(range(len(avg_wordl_dict)), value, tick_label=label)
+    ax.tick_params(axis='x', labelrotation=90, labelsize=5)
+    ax.set_xlabel('Name of Song')
+    ax.set_ylabel('Average Word Length')
+    ax.set_title('Average Word Lengths for the Different Songs')
+    _label_preview(fig, data, values=lambda: value, quantity='word length')
 
     # make the chart show
-    plt.show()
+    _show(fig)
 
 
+@offscreen
 def total_wordl_boxplot(data):
     """ Create a boxplot that presents the distribution of the word lengths for the words from all the files combined
     Args:
@@ -413,12 +713,242 @@ def total_wordl_boxplot(data):
     total_wl_list = [item for sublist in total_wl_list for item in sublist]
 
     # set the figure size
-    plt.figure(figsize=(10, 7))
+    fig = _figure(figsize=(10, 7))
+    ax = fig.add_subplot()
 
     # create the box plot, set the axes and title
-    plt.boxplot(total_wl_list)
-    plt.ylabel('Word Length')
-    plt.title('Word Length Distribution for All Files Combined')
+    ax.boxplot(total_wl_list)
+    ax.set_ylabel('Word Length')
+    ax.set_title('Word Length Distribution for All Files Combined')
+    _label_preview(fig, data, values=lambda: [np.mean(lengths) for lengths in word_length_dict.values()],
+                   quantity='word length')
 
     # show plot
-    plt.show()
+    _show(fig)
+
+
+@offscreen
+def sentiment_arcs(data, labels=None):
+    """ Plots how the sentiment of each song develops from its first line to its last
+    Args:
+        data (dict): data extracted from the file as a dictionary attribute--> raw data
+        labels (list): optional labels (str) of the files to plot (all files by default)
+    Returns:
+        None (just generates a line plot)
+    """
+    # Ensuring the data types of the inputted parameters are valid
+    assert isinstance(data, defaultdict), 'The data extracted from this file must be stored in a dictionary'
+    if labels is not None:
+        assert isinstance(labels, list), 'The labels of the files to plot must be entered in a list'
+
+    # obtain the resampled sentiment arc of each file
+    arc_dict = data['sentimentarc']
+    if labels is None:
+        labels = list(arc_dict.keys())
+
+    # plot one line per file, from the start (0%) to the end (100%) of the song
+    fig = _figure(figsize=(20, 10))
+    ax = fig.add_subplot()
+    points = np.linspace(0, 100, nlp_sentiment.ARC_POINTS)
+    for label in labels:
+        ax.plot(points, arc_dict[label], label=label)
+
+    # Adds labels to the line plot
+    ax.axhline(0, color='grey', linewidth=0.5)
+    ax.set_xlabel('Position in Song (%)')
+    ax.set_ylabel('Line Sentiment (Compound Score)')
+    ax.set_title('Sentiment Arcs of the Different Songs')
+    ax.legend()
+    _label_preview(fig, data, values=lambda: [np.mean(scores) for scores in data['linesentiment'].values()],
+                   quantity='line sentiment')
+    _show(fig)
+
+
+@offscreen
+def sentiment_timeline(data, groups=None):
+    """ Plots the mean line sentiment of each song, or of each group of songs (e.g., era), in the order they were
+    registered, with a band showing one standard deviation of the line scores
+    Args:
+        data (dict): data extracted from the file as a dictionary attribute--> raw data
+        groups (dict): optional mapping from the label of each file to its group (str), e.g., {'Red': '2012'}
+    Returns:
+        None (just generates a timeline)
+    """
+    # Ensuring the data types of the inputted parameters are valid
+    assert isinstance(data, defaultdict), 'The data extracted from this file must be stored in a dictionary'
+    if groups is not None:
+        assert isinstance(groups, dict), 'The groups of the files must be entered in a dictionary'
+
+    # aggregate the line scores of each file (or group) with NumPy
+    names, means, stds, counts = nlp_sentiment.timeline(data['linesentiment'], groups=groups)
+    positions = np.arange(len(names))
+
+    # plot the mean sentiment and its spread over time
+    fig = _figure(figsize=(20, 10))
+    ax = fig.add_subplot()
+    ax.plot(positions, means, marker='o')
+    ax.fill_between(positions, means - stds, means + stds, alpha=0.2)
+    ax.axhline(0, color='grey', linewidth=0.5)
+    ax.set_xticks(positions, names, rotation=90)
+    ax.set_xlabel('Song' if groups is None else 'Group')
+    ax.set_ylabel('Mean Line Sentiment (Compound Score)')
+    ax.set_title('Sentiment Timeline')
+    _label_preview(fig, data, values=lambda: [np.mean(scores) for scores in data['linesentiment'].values()],
+                   quantity='line sentiment')
+    _show(fig)
+
+
+@offscreen
+def repetition_chart(data, max_phrase_length=40):
+    """ Creates a horizontal bar chart of the share of each song's words that belong to a repeated span (e.g., the
+    chorus), labeled with the song's most repeated span and how many times it appears (only songs registered with
+    load_text(..., repeats=k) are shown)
+    Args:
+        data (dict): data extracted from the file as a dictionary attribute--> raw data
+        max_phrase_length (int): number of characters of each phrase shown before it is cut off
+    Returns:
+        None (just generates a bar chart)
+    """
+    # Ensuring the data types of the inputted parameters are valid
+    assert isinstance(data, defaultdict), 'The data extracted from this file must be stored in a dictionary'
+    assert isinstance(max_phrase_length, int), 'The number of characters of each phrase must be an integer'
+
+    # obtain the repetition ratio and the most repeated span of each file
+    ratio_dict = data['repetitionratio']
+    top_repeats = data['toprepeat']
+    labels = list(ratio_dict.keys())
+    ratios = np.array([ratio_dict[label] for label in labels]) * 100
+
+    # plot one bar per file, with the hook and its number of occurrences written next to it
+    fig = _figure(figsize=(12, max(3, 0.5 * len(labels))))
+    ax = fig.add_subplot()
+    positions = np.arange(len(labels))
+    ax.barh(positions, ratios)
+    for position, label, ratio in zip(positions, labels, ratios):
+        repeat = top_repeats[label] if label in top_repeats else None
+        if repeat is not None:
+            phrase, _, occurrences = repeat
+            if len(phrase) > max_phrase_length:
+                phrase = phrase[:max_phrase_length - 3] + '...'
+            ax.text(ratio + 1, position, '"' + phrase + '" x' + str(occurrences), va='center', fontsize=8)
+
+    # Adds labels to the bar chart
+    ax.set_yticks(positions, labels)
+    ax.set_xlim(0, 130)
+    ax.invert_yaxis()
+    ax.set_xlabel('Words in Repeated Spans (%)')
+    ax.set_title('Repetition in the Different Songs')
+    _label_preview(fig, data, values=lambda: ratios.tolist(), quantity='repeated words (%)')
+    _show(fig)
+
+
+@offscreen
+def diversity_curves(data, labels=None):
+    """ Plots how many distinct words each song has used as more of it is read (type-token growth curves), with the
+    song's moving-average type-token ratio (MATTR) and MTLD in the legend
+    Args:
+        data (dict): data extracted from the file as a dictionary attribute--> raw data
+        labels (list): optional labels (str) of the files to plot (all files by default)
+    Returns:
+        None (just generates a line plot)
+    """
+    # Ensuring the data types of the inputted parameters are valid
+    assert isinstance(data, defaultdict), 'The data extracted from this file must be stored in a dictionary'
+    if labels is not None:
+        assert isinstance(labels, list), 'The labels of the files to plot must be entered in a list'
+
+    # obtain the growth curve and the richness measures of each file
+    curve_dict = data['ttrgrowth']
+    mattr_dict = data['mattr']
+    mtld_dict = data['mtld']
+    if labels is None:
+        labels = list(curve_dict.keys())
+
+    # plot one line per file: words read against distinct words among them
+    fig = _figure(figsize=(20, 10))
+    ax = fig.add_subplot()
+    for label in labels:
+        words_read, distinct_words = curve_dict[label]
+        ax.plot(words_read, distinct_words, label='{} (MATTR {:.2f}, MTLD {:.1f})'.format(label, mattr_dict[label],
+                                                                                        mtld_dict[label]))
+
+    # Adds labels to the line plot
+    ax.set_xlabel('Words Read')
+    ax.set_ylabel('Distinct Words')
+    ax.set_title('Vocabulary Growth of the Different Songs')
+    ax.legend()
+    _label_preview(fig, data, values=lambda: [mattr_dict[label] for label in labels], quantity='MATTR')
+    _show(fig)
+
+
+@offscreen
+def keyness_chart(keyness, top=None):
+    """ Creates a diverging horizontal bar chart of the words that distinguish two groups of songs, with the words of
+    the first group extending to the right and the words of the second group extending to the left
+    Args:
+        keyness (dict): comparison of two groups, as returned by Nlp.keyness
+        top (int): optional number of words shown for each group (all the words of the comparison by default)
+    Returns:
+        None (just generates a bar chart)
+    """
+    # Ensuring the data types of the inputted parameters are valid
+    assert isinstance(keyness, dict), 'The comparison of the groups must be stored in a dictionary'
+    if top is not None:
+        assert isinstance(top, int), 'The number of words per group must be an integer'
+
+    # the first group's words (most distinctive on top), then the second group's (most distinctive at the bottom)
+    terms_a, terms_b = keyness['a'][:top], keyness['b'][:top]
+    words = [term[0] for term in terms_a] + [term[0] for term in terms_b[::-1]]
+    scores = [term[1] for term in terms_a] + [-term[1] for term in terms_b[::-1]]
+    name_a, name_b = keyness['groups']
+
+    # plot one bar per word, colored by the group it distinguishes
+    fig = _figure(figsize=(12, max(3, 0.35 * len(words))))
+    ax = fig.add_subplot()
+    positions = np.arange(len(words))
+    ax.barh(positions, scores, color=['tab:blue'] * len(terms_a) + ['tab:orange'] * len(terms_b))
+    ax.axvline(0, color='grey', linewidth=0.5)
+
+    # Adds labels to the bar chart
+    ax.set_yticks(positions, words)
+    ax.invert_yaxis()
+    ax.set_xlabel('Keyness (' + keyness['measure'] + '): ' + name_b + ' <-- --> ' + name_a)
+    ax.set_title('Distinctive Words of ' + name_a + ' vs. ' + name_b)
+    _show(fig)
+
+
+@offscreen
+def topic_chart(topics, words=3):
+    """ Creates a stacked bar chart of the share of each topic in each song (or group of songs), with each topic named
+    after its heaviest words in the legend
+    Args:
+        topics (dict): topics of the songs and their shares, as returned by Nlp.topics
+        words (int): number of words naming each topic in the legend
+    Returns:
+        None (just generates a bar chart)
+    """
+    # Ensuring the data types of the inputted parameters are valid
+    assert isinstance(topics, dict), 'The topics of the songs must be stored in a dictionary'
+    assert isinstance(words, int), 'The number of words naming each topic must be an integer'
+
+    # obtain the share of every topic in each song (or group), one row per song
+    names = list(topics['shares'].keys())
+    shares = np.array([topics['shares'][name] for name in names]).reshape(len(names), len(topics['topics']))
+    positions = np.arange(len(names))
+
+    # stack one bar segment per topic, each starting where the previous topics end
+    fig = _figure(figsize=(20, 10))
+    ax = fig.add_subplot()
+    bottoms = np.zeros(len(names))
+    for i, topic in enumerate(topics['topics']):
+        ax.bar(positions, shares[:, i], bottom=bottoms,
+                label='Topic ' + str(i + 1) + ': ' + ', '.join(word for word, _ in topic[:words]))
+        bottoms += shares[:, i]
+
+    # Adds labels to the bar chart
+    ax.set_xticks(positions, names, rotation=90)
+    ax.set_ylim(0, 1)
+    ax.set_ylabel('Share of Topic')
+    ax.set_title('Topics of the Different Songs')
+    ax.legend(loc='upper left', bbox_to_anchor=(1, 1))
+    _show(fig)
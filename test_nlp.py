@@ -0,0 +1,140 @@
+"""
+Jethro Lee and Michelle Wang
+DS 3500
+Reusable NLP Library - HW3
+2/27/2023
+
+test_nlp.py: Regression tests of the framework, run with pytest from the repository's directory
+"""
+# import necessary libraries
+import urllib.request
+import numpy as np
+import pytest
+import taylorviz
+from exception import MergeError, RegisterMetricError
+from nlp import Nlp
+
+
+@pytest.fixture(params=['memory', 'disk'])
+def framework(request, tmp_path):
+    """ A framework keeping its data in memory or spilling it to a SQLite store """
+    nlp = Nlp(store_path=str(tmp_path / 'store.db') if request.param == 'disk' else None)
+    yield nlp
+    if request.param == 'disk':
+        nlp.close()
+
+
+def test_snapshot_after_registering_a_label_again(framework):
+    """ A snapshot taken after a label is registered again describes the new document, not the earlier one """
+    framework.load_text('TaylorSwiftOurSong.txt', 'A')
+    framework.load_text('TaylorSwiftFearless.txt', 'B')
+    earlier = framework.snapshot()['numwords']['A']
+
+    framework.load_text('TaylorSwiftDearJohn.txt', 'A')
+    snapshot = framework.snapshot()
+    assert snapshot['numwords']['A'] == len(framework.data['tokens']['A']) != earlier
+    assert list(snapshot['numwords'].keys()) == ['A', 'B']
+    assert framework.sample(1.0, data=snapshot)['numwords']['A'] == snapshot['numwords']['A']
+
+
+def test_failed_merge_leaves_the_framework_unchanged():
+    """ A merge that fails on a label collision doesn't merge any document """
+    target = Nlp()
+    target.load_text('TaylorSwiftOurSong.txt', 'A')
+    other = Nlp()
+    other.load_text('TaylorSwiftFearless.txt', 'X')
+    other.load_text('TaylorSwiftDearJohn.txt', 'A')
+
+    version = target.version
+    with pytest.raises(MergeError):
+        target.merge(other)
+    assert target.labels() == ['A'] and target.version == version
+    with pytest.raises(MergeError):
+        target + other
+
+
+def test_failed_registration_keeps_the_earlier_statistic():
+    """ A statistic that cannot be registered doesn't remove the statistic registered under its name """
+    framework = Nlp()
+    framework.load_text('TaylorSwiftOurSong.txt', 'A')
+    with pytest.raises(RegisterMetricError):
+        framework.register_metric('numwords', lambda batch, deps: deps['numwords'], deps=('numwords',))
+    assert framework.data['numwords']['A'] == len(framework.data['tokens']['A'])
+    assert framework.data['avgwordlength']['A'] > 0
+
+
+def test_skipped_duplicates_are_not_reported_as_registered():
+    """ load_texts reports the documents that deduplication skipped apart from the registered ones """
+    framework = Nlp(dedup='skip')
+    report = framework.load_texts(['TaylorSwiftOurSong.txt', 'TaylorSwiftOurSong.txt'], labels=['a', 'b'])
+    assert report.registered == ['a'] and report.skipped == ['b']
+    assert framework.labels() == ['a'] and len(report) == 2
+
+
+def test_full_figures_only_compute_the_statistics_they_show():
+    """ The statistics behind the preview note of a sampled figure aren't computed for a figure of every song """
+    framework = Nlp()
+    framework.load_text('TaylorSwiftOurSong.txt', 'A')
+    data = framework.snapshot()
+    taylorviz.render_png(taylorviz.make_word_clouds, data, subplot_rows=1, subplot_columns=1)
+    assert 'numwords' not in data.complete and framework._pending['numwords']
+
+    preview = framework.sample(1.0)
+    assert 'mean words per song' in taylorviz.preview_note(preview, values=lambda: list(preview['numwords'].values()),
+                                                           quantity='words per song')
+    assert taylorviz.render_png(taylorviz.avgwlength_bar, preview)[:4] == b'\x89PNG'
+
+
+def test_merged_and_shard_documents_are_checked_for_duplicates(tmp_path):
+    """ Documents coming from another framework or a shard are indexed and checked for duplicates """
+    other = Nlp()
+    other.load_text('TaylorSwiftOurSong.txt', 'copy')
+    other.load_text('TaylorSwiftFearless.txt', 'B')
+    other.save_shard(str(tmp_path / 'other.shard'))
+
+    framework = Nlp(dedup='skip')
+    framework.load_text('TaylorSwiftOurSong.txt', 'A')
+    framework.merge(other)
+    assert framework.labels() == ['A', 'B'] and framework.duplicates['copy'][0] == 'A'
+    assert not framework.load_text('TaylorSwiftFearless.txt', 'C')
+
+    shard = Nlp.load_shard(str(tmp_path / 'other.shard'), dedup='flag')
+    assert shard.load_text('TaylorSwiftOurSong.txt', 'again') and shard.duplicates['again'][0] == 'copy'
+
+    other.load_text('TaylorSwiftOurSong.txt', 'second copy')
+    other.save_shard(str(tmp_path / 'copies.shard'))
+    assert Nlp.load_shard(str(tmp_path / 'copies.shard'), dedup='skip').labels() == ['copy', 'B']
+
+
+def test_served_figures_follow_the_registered_visualizations():
+    """ Registering a visualization again under the same name changes the figure the service returns """
+    framework = Nlp()
+    framework.load_text('TaylorSwiftOurSong.txt', 'A')
+    framework.load_visualization('figure', taylorviz.avgwlength_bar)
+    server = framework.serve(port=0, block=False)
+    url = 'http://127.0.0.1:' + str(server.server_address[1]) + '/figures/figure.png'
+    try:
+        first = urllib.request.urlopen(url)
+        framework.load_visualization('figure', taylorviz.avgwlength_boxplot)
+        second = urllib.request.urlopen(url)
+        assert first.headers['ETag'] != second.headers['ETag'] and first.read() != second.read()
+    finally:
+        server.shutdown()
+
+
+def test_truncated_word_cloud_cache_entries_are_rendered_again(tmp_path):
+    """ A word cloud whose cached image was left incomplete is rendered again and cached whole """
+    framework = Nlp()
+    framework.load_text('TaylorSwiftOurSong.txt', 'A')
+    data = framework.snapshot()
+    cache_dir = str(tmp_path / 'clouds')
+    kwargs = {'subplot_rows': 1, 'subplot_columns': 1, 'cache_dir': cache_dir}
+    taylorviz.render_png(taylorviz.make_word_clouds, data, **kwargs)
+
+    paths = [path for path in (tmp_path / 'clouds').iterdir()]
+    assert [path.suffix for path in paths] == ['.npy']
+    paths[0].write_bytes(paths[0].read_bytes()[:100])
+
+    assert taylorviz.render_png(taylorviz.make_word_clouds, data, **kwargs)[:4] == b'\x89PNG'
+    assert [path.suffix for path in (tmp_path / 'clouds').iterdir()] == ['.npy']
+    assert np.load(paths[0]).ndim == 3